@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import stat
+import time
+import errno
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterable, Iterator, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows（reflink は使わずにコピーする）
+    fcntl = None
+
+# Linux の FICLONE（btrfs・XFS などで同じデータブロックを共有する複製）
+FICLONE = 0x40049409
+# reflink できないことを示すエラー（これ以外の容量不足・I/Oエラーはそのまま送出する）
+CLONE_UNSUPPORTED_ERRNOS = {errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOSYS}
+
+
+def _clone(source, dest) -> bool:
+    """source の内容を dest に書く（reflink できれば True、できなければ通常のコピー）"""
+    if fcntl is not None and sys.platform.startswith("linux"):
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in CLONE_UNSUPPORTED_ERRNOS:
+                raise
+    shutil.copyfileobj(source, dest, 1024 * 1024)
+    return False
+
+
+class BlobStore:
+    """契約書本文の内容アドレス保存（SHA-256 -> 読み取り専用ファイル）と参照数
+
+    同じ本文は blob_dir/<先頭2桁>/<SHA-256> の1ファイルだけを持つ。各契約書の本文ファイルはその複製で、
+    reflink に対応したファイルシステム（Linux の btrfs・XFS など）ではデータブロックを共有し、
+    それ以外では通常のコピーになる。契約書ごとに別のファイルのため、1件をその場で編集しても
+    他の契約書や保存先の本文は変わらない。
+    参照は refs.db（SQLite）に「契約書のファイル名 -> SHA-256」として明示的に記録し、
+    どの契約書からも参照されなくなった本文は gc で削除する。
+    """
+
+    def __init__(self, blob_dir: str):
+        self.blob_dir = Path(blob_dir)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        db_path = self.blob_dir / "refs.db"
+        self.created = not db_path.exists()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS refs (
+                    file_name TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_refs_sha256 ON refs (sha256)")
+
+    def path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def put(self, content: bytes) -> Tuple[str, Path]:
+        """本文を保存して (SHA-256, パス) を返す（同じ内容が保存済みなら書かない）"""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+        if path.exists():
+            return digest, path
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o444)
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                # 他のプロセスが同じ内容を先に保存した
+                pass
+        finally:
+            _unlink(tmp_path)
+        return digest, path
+
+    def _copy_to_temp(self, blob_path: Path, directory: Path) -> str:
+        """本文の複製を directory の一時ファイルに作ってパスを返す"""
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            with open(blob_path, 'rb') as source, os.fdopen(fd, 'wb') as dest:
+                _clone(source, dest)
+                dest.flush()
+                os.fsync(dest.fileno())
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path
+
+    def copy_new(self, content: bytes, make_path: Callable[[], Path]) -> Tuple[str, Path]:
+        """本文を保存し、make_path が返す新しいパスにその複製を作って (SHA-256, パス) を返す
+
+        複製は一時ファイルに作ってからリンクするため、読み手が書きかけの本文を見ることはない。
+        パスが既に存在すれば make_path で作り直し、複製の直前に gc で本文が消された場合は保存し直す。
+        作った本文ファイルを参照として記録する。
+        """
+        while True:
+            digest, blob_path = self.put(content)
+            path = make_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                tmp_path = self._copy_to_temp(blob_path, path.parent)
+            except FileNotFoundError:
+                continue
+            try:
+                # link は作成先が存在すると失敗するため、他プロセスの保存と衝突しない
+                os.link(tmp_path, path)
+            except FileExistsError:
+                continue
+            finally:
+                os.unlink(tmp_path)
+            self._set_refs([(path.name, digest)])
+            return digest, path
+
+    def retain(self, file_name: str, content: bytes) -> str:
+        """file_name の本文を content として参照を付け替え、SHA-256 を返す（外部で追加・編集された場合）"""
+        digest, _ = self.put(content)
+        self._set_refs([(file_name, digest)])
+        return digest
+
+    def release(self, file_names: Iterable[str]):
+        """削除・アーカイブした契約書の参照を外す"""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("DELETE FROM refs WHERE file_name = ?", [(name,) for name in file_names])
+
+    def prune(self, file_names: Iterable[str]) -> int:
+        """file_names 以外の参照を外し、外した件数を返す（カタログを通さずに消された契約書の分）"""
+        keep = set(file_names)
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            stale = [(row[0],) for row in self._conn.execute("SELECT file_name FROM refs") if row[0] not in keep]
+            self._conn.executemany("DELETE FROM refs WHERE file_name = ?", stale)
+        return len(stale)
+
+    def _set_refs(self, refs: Iterable[Tuple[str, str]]):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("INSERT OR REPLACE INTO refs (file_name, sha256) VALUES (?, ?)", refs)
+
+    def replace_refs(self, refs: Iterable[Tuple[str, str]]):
+        """参照をすべて refs（ファイル名, SHA-256）に置き換える"""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM refs")
+            self._conn.executemany("INSERT OR REPLACE INTO refs (file_name, sha256) VALUES (?, ?)", refs)
+
+    def refcount(self, digest: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM refs WHERE sha256 = ?", (digest,)).fetchone()[0]
+
+    def privatize(self, file_path: Path) -> bool:
+        """他のファイルとハードリンクで inode を共有している本文ファイルを、自分だけの複製に置き換える
+
+        以前の版は本文ファイルを保存先の本文へのハードリンクにしていた。置き換えた場合 True を返す。
+        """
+        if os.stat(file_path).st_nlink <= 1:
+            return False
+        tmp_path = self._copy_to_temp(file_path, file_path.parent)
+        try:
+            os.replace(tmp_path, file_path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+        return True
+
+    def _iter_blobs(self) -> Iterator[os.DirEntry]:
+        for shard in os.scandir(self.blob_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.startswith(".") and entry.is_file():
+                    yield entry
+
+    def gc(self, grace_seconds: float = 300) -> Dict[str, int]:
+        """どの契約書からも参照されていない本文を削除する
+
+        保存途中（本文を書いてから参照を記録するまで）の本文を消さないよう、
+        書いてから grace_seconds 秒以上たったものだけを対象にする。
+        """
+        with self._lock:
+            referenced = {row[0] for row in self._conn.execute("SELECT DISTINCT sha256 FROM refs")}
+        removed = 0
+        freed_bytes = 0
+        now = time.time()
+        for entry in self._iter_blobs():
+            info = entry.stat()
+            if entry.name not in referenced and now - info.st_mtime >= grace_seconds:
+                _unlink(entry.path)
+                removed += 1
+                freed_bytes += info.st_size
+        return {'removed': removed, 'freed_bytes': freed_bytes}
+
+    def verify(self) -> Dict[str, list]:
+        """本文を読み直してハッシュを計算し、ファイル名と一致しないものを返す"""
+        corrupted = []
+        for entry in self._iter_blobs():
+            digest = hashlib.sha256()
+            with open(entry.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != entry.name:
+                corrupted.append(entry.path)
+        return {'corrupted': sorted(corrupted)}
+
+    def stats(self) -> Dict[str, Any]:
+        """本文数・容量・契約書からの参照数"""
+        blobs = 0
+        size = 0
+        for entry in self._iter_blobs():
+            blobs += 1
+            size += entry.stat().st_size
+        with self._lock:
+            references = self._conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return {'blobs': blobs, 'bytes': size, 'references': references}
+
+
+def _unlink(path):
+    """読み取り専用のファイルも削除する（Windows では読み取り専用属性があると削除できない）"""
+    try:
+        os.unlink(path)
+    except PermissionError:
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        os.unlink(path)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import json
+import time
+import hashlib
+import statistics
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Iterator, Tuple
+
+
+def read_records(input_path: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """入力ファイルを1件ずつ読み、(1始まりの行番号, パラメータ, エラー) を返す（.csv はヘッダー付きCSVでヘッダーを除いて数える、それ以外はJSONL）"""
+    with open(input_path, 'r', encoding='utf-8-sig', newline='') as f:
+        if Path(input_path).suffix.lower() == ".csv":
+            for index, row in enumerate(csv.DictReader(f), 1):
+                yield index, {key: value.strip() for key, value in row.items() if key and value and value.strip()}, None
+            return
+
+        for index, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                params = json.loads(line)
+            except ValueError as e:
+                yield index, None, f"JSONとして読めません: {e}"
+                continue
+            if not isinstance(params, dict):
+                yield index, None, "1行に1つのJSONオブジェクトを指定してください"
+                continue
+            yield index, params, None
+
+
+def params_digest(params: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(params, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class BulkGenerator:
+    """JSONL/CSVの各行のパラメータから契約書を並列に生成して保存する
+
+    1つの DocumentAgent（OpenAIクライアントの接続プールとLangFuse設定）を全件で共有する。
+    結果は1件ごとに results_path へ追記するため、途中で止まっても同じコマンドを再実行すれば
+    生成済みの行（行番号とパラメータが同じもの）を飛ばして続きから再開する。
+    """
+
+    def __init__(self, agent, storage, contract_type: str, concurrency: int = 4):
+        if contract_type not in ("rental", "service"):
+            raise ValueError(f"Unknown contract type: {contract_type}")
+        self.agent = agent
+        self.storage = storage
+        self.contract_type = contract_type
+        self.concurrency = max(1, concurrency)
+
+    def _load_completed(self, results_path: Path) -> set:
+        """生成済みの (行番号, パラメータのハッシュ)。書きかけの最終行は無視し、改行で区切っておく"""
+        completed = set()
+        if not results_path.exists():
+            return completed
+        with open(results_path, 'rb+') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('success'):
+                    completed.add((entry['index'], entry['params_sha256']))
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        return completed
+
+    def _generate_one(self, index: int, params: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            generated = self.agent.generate_with_usage(self.contract_type, params)
+            file_path = self.storage.save_contract(self.contract_type, generated['content'], dict(params))
+            return {
+                'success': True,
+                'file_path': file_path,
+                'usage': generated['usage'],
+                'cached': generated['cached'],
+                'latency_seconds': round(time.perf_counter() - started, 3)
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'latency_seconds': round(time.perf_counter() - started, 3)
+            }
+
+    def run(self, input_path: str, results_path: str, progress=None) -> Dict[str, Any]:
+        """全件を生成し、件数とトークン使用量の合計を返す
+
+        入力は1行ずつ読み、同時に処理中の件数を concurrency の2倍までに抑える。
+        progress には各行の結果を渡して呼ぶ。
+        """
+        results_path = Path(results_path)
+        completed = self._load_completed(results_path)
+        summary = {'succeeded': 0, 'failed': 0, 'skipped': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+        latencies = []
+
+        with open(results_path, 'a', encoding='utf-8') as log, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk") as executor:
+
+            def record(entry: Dict[str, Any]):
+                entry['completed_at'] = datetime.now().isoformat()
+                log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                log.flush()
+                if 'latency_seconds' in entry:
+                    latencies.append(entry['latency_seconds'])
+                if entry['success']:
+                    summary['succeeded'] += 1
+                    summary['prompt_tokens'] += entry['usage'].get('promptTokens', 0)
+                    summary['completion_tokens'] += entry['usage'].get('completionTokens', 0)
+                else:
+                    summary['failed'] += 1
+                if progress:
+                    progress(entry)
+
+            def collect(futures: Dict):
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(dict(futures.pop(future), **future.result()))
+
+            futures = {}
+            for index, params, error in read_records(input_path):
+                if error:
+                    record({'index': index, 'params_sha256': None, 'success': False, 'error': error})
+                    continue
+                digest = params_digest(params)
+                if (index, digest) in completed:
+                    summary['skipped'] += 1
+                    continue
+                futures[executor.submit(self._generate_one, index, params)] = {'index': index, 'params_sha256': digest}
+                if len(futures) >= self.concurrency * 2:
+                    collect(futures)
+            while futures:
+                collect(futures)
+
+        summary['latency_median_seconds'] = statistics.median(latencies) if latencies else None
+        return summary
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import gzip
+import mmap
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows（単一プロセスでのみ使う）
+    fcntl = None
+
+# レコードの先頭: 圧縮形式(1バイト) + 圧縮後の長さ(4バイト)
+RECORD_HEADER = struct.Struct(">BI")
+CODECS = {"gzip": 1, "zstd": 2}
+DELETED_FILE = "deleted.idx"
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(codec_id: int, data: bytes) -> bytes:
+    if codec_id == CODECS["zstd"]:
+        if zstandard is None:
+            raise RuntimeError("zstd で圧縮されたアーカイブの読み込みには zstandard パッケージが必要です")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ContractArchive:
+    """古い契約書をまとめて保存する追記専用のアーカイブ
+
+    archive_dir には次のファイルを置く:
+      - segment-<番号>.pack  圧縮した契約書（本文＋メタデータ）を追記したセグメント
+      - segment-<番号>.idx   ファイル名 -> セグメント内の位置 を1行1件で追記する索引
+      - deleted.idx          削除した契約書のファイル名
+    セグメントにレコードを書いて fsync してから索引に追記するため、索引にある契約書は必ず読める
+    （書きかけの索引行は読み込み時に無視する）。セグメントは mmap で開き、位置を指定して読む。
+    1契約書あたり2ファイルの代わりに数十MBのセグメントにまとまるため、inode とバックアップ時のI/Oが減る。
+    """
+
+    def __init__(self, archive_dir: str, codec: Optional[str] = None, max_segment_bytes: int = 64 * 1024 * 1024):
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        codec = codec or os.getenv("ARCHIVE_CODEC") or ("zstd" if zstandard is not None else "gzip")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown archive codec: {codec}")
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("zstd 圧縮には zstandard パッケージが必要です")
+        self.codec = codec
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._entries = {}  # ファイル名 -> (セグメント名, 位置, 長さ, 契約書の種類)
+        self._deleted = set()
+        self._read_positions = {}  # 索引ファイル -> 読み込み済みバイト数
+        self._maps = {}  # セグメント名 -> (ファイル, mmap)
+        self.refresh()
+
+    def _index_path(self, segment: str) -> Path:
+        return self.archive_dir / f"{segment}.idx"
+
+    def _segments(self) -> List[str]:
+        return sorted(path.stem for path in self.archive_dir.glob("segment-*.pack"))
+
+    def _read_new_lines(self, path: Path) -> List[str]:
+        """索引ファイルの前回以降に追記された完結した行"""
+        position = self._read_positions.get(path, 0)
+        try:
+            with open(path, 'rb') as f:
+                f.seek(position)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        complete = data[:data.rfind(b"\n") + 1]
+        self._read_positions[path] = position + len(complete)
+        return complete.decode('utf-8').splitlines()
+
+    def refresh(self):
+        """他のプロセスが追記した索引を読み込む"""
+        with self._lock:
+            for segment in self._segments():
+                for line in self._read_new_lines(self._index_path(segment)):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 異常終了で書きかけになった行
+                        continue
+                    # 同じ契約書が複数回アーカイブされた場合は後のものを使う
+                    self._entries[entry['name']] = (segment, entry['offset'], entry['length'], entry['type'])
+            for line in self._read_new_lines(self.archive_dir / DELETED_FILE):
+                self._deleted.add(line)
+
+    def __contains__(self, file_name: str) -> bool:
+        with self._lock:
+            if file_name in self._deleted:
+                return False
+            if file_name in self._entries:
+                return True
+        self.refresh()
+        with self._lock:
+            return file_name in self._entries and file_name not in self._deleted
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return [name for name in self._entries if name not in self._deleted]
+
+    def _map(self, segment: str, end: int) -> mmap.mmap:
+        """セグメントの mmap（追記で伸びた部分を読む場合は開き直す）"""
+        with self._lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped[1]) < end:
+                if mapped is not None:
+                    mapped[1].close()
+                    mapped[0].close()
+                f = open(self.archive_dir / f"{segment}.pack", 'rb')
+                mapped = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                self._maps[segment] = mapped
+            return mapped[1]
+
+    def read(self, file_name: str) -> Dict[str, Any]:
+        """アーカイブ済みの契約書（file_name / contract_type / metadata / content）"""
+        if file_name not in self:
+            raise FileNotFoundError(f"アーカイブにありません: {file_name}")
+        with self._lock:
+            segment, offset, length, _ = self._entries[file_name]
+        data = self._map(segment, offset + length)[offset - RECORD_HEADER.size:offset + length]
+        codec_id, _ = RECORD_HEADER.unpack_from(data)
+        return json.loads(_decompress(codec_id, data[RECORD_HEADER.size:]))
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """アーカイブ済みの全契約書（カタログ再構築用）"""
+        for name in self.names():
+            try:
+                yield self.read(name)
+            except FileNotFoundError:
+                continue
+
+    def _current_segment(self) -> str:
+        """追記先のセグメント（最大サイズを超えていれば次の番号）"""
+        segments = self._segments()
+        if segments:
+            last = segments[-1]
+            if (self.archive_dir / f"{last}.pack").stat().st_size < self.max_segment_bytes:
+                return last
+            number = int(last.split("-")[1]) + 1
+        else:
+            number = 1
+        return f"segment-{number:06d}"
+
+    def _exclusive(self):
+        """追記用のロック（複数プロセスが同じセグメントに書かないように）"""
+        lock_file = open(self.archive_dir / ".lock", 'a')
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        """契約書をセグメントに追記し、書き込んだバイト数を返す
+
+        records の各要素は file_name / contract_type / metadata / content を持つ。
+        この関数から戻った時点で、全件が索引に登録され読み出せる。
+        """
+        written = 0
+        pending = iter(records)
+        record = next(pending, None)
+        with self._exclusive():
+            while record is not None:
+                segment = self._current_segment()
+                pack_path = self.archive_dir / f"{segment}.pack"
+                index_lines = []
+                with open(pack_path, 'ab') as pack:
+                    offset = pack.tell()
+                    while record is not None and offset < self.max_segment_bytes:
+                        payload = _compress(self.codec, json.dumps(record, ensure_ascii=False).encode('utf-8'))
+                        pack.write(RECORD_HEADER.pack(CODECS[self.codec], len(payload)) + payload)
+                        offset += RECORD_HEADER.size
+                        index_lines.append(json.dumps({
+                            'name': record['file_name'],
+                            'type': record['contract_type'],
+                            'offset': offset,
+                            'length': len(payload)
+                        }, ensure_ascii=False) + "\n")
+                        offset += len(payload)
+                        written += RECORD_HEADER.size + len(payload)
+                        record = next(pending, None)
+                    pack.flush()
+                    os.fsync(pack.fileno())
+                with open(self._index_path(segment), 'ab+') as index:
+                    # 前回の異常終了で書きかけになった行があれば改行で区切る
+                    if index.tell() > 0:
+                        index.seek(-1, os.SEEK_END)
+                        if index.read(1) != b"\n":
+                            index.write(b"\n")
+                    index.write("".join(index_lines).encode('utf-8'))
+                    index.flush()
+                    os.fsync(index.fileno())
+        self.refresh()
+        return written
+
+    def discard(self, file_name: str):
+        """削除済みとして記録する（セグメント内のデータは残る）"""
+        with self._exclusive():
+            with open(self.archive_dir / DELETED_FILE, 'a', encoding='utf-8') as f:
+                f.write(file_name + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self.refresh()
+
+    def stats(self) -> Dict[str, Any]:
+        segments = self._segments()
+        return {
+            'codec': self.codec,
+            'contracts': len(self.names()),
+            'segments': len(segments),
+            'bytes': sum((self.archive_dir / f"{segment}.pack").stat().st_size for segment in segments)
+        }
+
+    def close(self):
+        with self._lock:
+            for f, mapped in self._maps.values():
+                mapped.close()
+                f.close()
+            self._maps = {}
@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+import json
+import math
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from .text_index import index_terms
+
+
+class ContractCatalog:
+    """契約書メタデータの永続カタログ（SQLite）
+
+    一覧・検索のたびにディレクトリを走査してメタデータJSONを開き直さないよう、
+    保存時に1件ずつ登録し、読み出しはこのカタログから行う。
+    本文とメタデータの文字n-gram転置索引も同じトランザクションで更新する。
+    """
+
+    SCHEMA_VERSION = 5
+
+    TABLES = ["contracts", "texts", "text_postings", "metadata_postings", "catalog_info"]
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.created = not self.db_path.exists()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+    def _write(self):
+        """書き込みトランザクション
+
+        複数プロセスで同じカタログを更新するため、開始時に書き込みロックを取る
+        （読み取りから書き込みへの昇格で他プロセスと衝突しないようにする）。
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def _init_schema(self):
+        """テーブル作成（スキーマが古い場合は作り直して再構築対象にする）"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+
+        with self._lock, self._conn:
+            self._write()
+            if not self.created and self._stored_schema_version() != self.SCHEMA_VERSION:
+                for table in self.TABLES:
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.created = True
+
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS contracts (
+                    id INTEGER PRIMARY KEY,
+                    file_name TEXT NOT NULL UNIQUE,
+                    contract_type TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    metadata_length INTEGER NOT NULL DEFAULT 0,
+                    metadata_mtime REAL NOT NULL DEFAULT 0,
+                    text_id INTEGER,
+                    archived INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # 一覧・ページングは (created_at, file_name) の降順で索引を辿る
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_contracts_order ON contracts (created_at, file_name)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_contracts_text_id ON contracts (text_id)"
+            )
+            # 本文は内容のハッシュで1件にまとめ、同一本文の契約書で索引を共有する
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS texts (
+                    id INTEGER PRIMARY KEY,
+                    sha256 TEXT NOT NULL UNIQUE,
+                    length INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS text_postings (
+                    gram TEXT NOT NULL,
+                    text_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (gram, text_id)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata_postings (
+                    gram TEXT NOT NULL,
+                    contract_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (gram, contract_id)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalog_info (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO catalog_info (key, value) VALUES ('schema_version', ?)",
+                (str(self.SCHEMA_VERSION),)
+            )
+
+    def _stored_schema_version(self) -> Optional[int]:
+        try:
+            row = self._conn.execute(
+                "SELECT value FROM catalog_info WHERE key = 'schema_version'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return int(row['value']) if row else None
+
+    def _row_to_record(self, row: sqlite3.Row) -> Dict[str, Any]:
+        record = {
+            'type': row['contract_type'],
+            'file_path': row['file_path'],
+            'metadata': json.loads(row['metadata'])
+        }
+        if row['archived']:
+            # 本文はアーカイブのセグメントにある（file_path はアーカイブ前の場所）
+            record['archived'] = True
+        return record
+
+    def upsert(self, contract_type: str, file_path: str, metadata: Dict[str, Any],
+               content: str, metadata_mtime: float = 0, archived: bool = False):
+        """契約書を1件登録（既存なら上書き）し、索引を更新する"""
+        with self._lock, self._conn:
+            self._upsert(self._write(), contract_type, file_path, metadata, content, metadata_mtime, archived)
+
+    def _upsert(self, conn: sqlite3.Connection, contract_type: str, file_path: str,
+                metadata: Dict[str, Any], content: str, metadata_mtime: float, archived: bool = False):
+        file_name = Path(file_path).name
+        self._remove(conn, file_name)
+
+        text_id = self._register_text(conn, content)
+        metadata_text = json.dumps(metadata, ensure_ascii=False)
+        cursor = conn.execute(
+            """
+            INSERT INTO contracts
+                (file_name, contract_type, file_path, created_at, metadata, metadata_length,
+                 metadata_mtime, text_id, archived)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                file_name,
+                contract_type,
+                str(file_path),
+                metadata.get('created_at', ''),
+                metadata_text,
+                len(metadata_text),
+                metadata_mtime,
+                text_id,
+                int(archived)
+            )
+        )
+        conn.executemany(
+            "INSERT INTO metadata_postings (gram, contract_id, tf) VALUES (?, ?, ?)",
+            [(gram, cursor.lastrowid, tf) for gram, tf in index_terms(metadata_text.lower()).items()]
+        )
+
+    def _register_text(self, conn: sqlite3.Connection, content: str) -> int:
+        """本文を登録してIDを返す（同一内容が登録済みなら再利用）"""
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        row = conn.execute("SELECT id FROM texts WHERE sha256 = ?", (digest,)).fetchone()
+        if row:
+            return row['id']
+
+        lowered = content.lower()
+        text_id = conn.execute(
+            "INSERT INTO texts (sha256, length) VALUES (?, ?)", (digest, len(lowered))
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO text_postings (gram, text_id, tf) VALUES (?, ?, ?)",
+            [(gram, text_id, tf) for gram, tf in index_terms(lowered).items()]
+        )
+        return text_id
+
+    def _remove(self, conn: sqlite3.Connection, file_name: str):
+        row = conn.execute(
+            "SELECT id, text_id FROM contracts WHERE file_name = ?", (file_name,)
+        ).fetchone()
+        if not row:
+            return
+
+        conn.execute("DELETE FROM metadata_postings WHERE contract_id = ?", (row['id'],))
+        conn.execute("DELETE FROM contracts WHERE id = ?", (row['id'],))
+
+        # どの契約書からも参照されなくなった本文は索引ごと削除
+        still_used = conn.execute(
+            "SELECT 1 FROM contracts WHERE text_id = ? LIMIT 1", (row['text_id'],)
+        ).fetchone()
+        if not still_used:
+            conn.execute("DELETE FROM text_postings WHERE text_id = ?", (row['text_id'],))
+            conn.execute("DELETE FROM texts WHERE id = ?", (row['text_id'],))
+
+    def relocate(self, moves: List[Dict[str, Any]]):
+        """移動した契約書のパスとメタデータを更新する（本文の索引はそのまま使う）
+
+        moves の各要素は file_path / metadata / metadata_mtime を持つ。未登録の契約書は無視する。
+        """
+        with self._lock, self._conn:
+            conn = self._write()
+            for move in moves:
+                row = conn.execute(
+                    "SELECT id FROM contracts WHERE file_name = ?", (Path(move['file_path']).name,)
+                ).fetchone()
+                if not row:
+                    continue
+                metadata_text = json.dumps(move['metadata'], ensure_ascii=False)
+                conn.execute(
+                    """
+                    UPDATE contracts SET file_path = ?, metadata = ?, metadata_length = ?, metadata_mtime = ?
+                    WHERE id = ?
+                    """,
+                    (str(move['file_path']), metadata_text, len(metadata_text), move['metadata_mtime'], row['id'])
+                )
+                conn.execute("DELETE FROM metadata_postings WHERE contract_id = ?", (row['id'],))
+                conn.executemany(
+                    "INSERT INTO metadata_postings (gram, contract_id, tf) VALUES (?, ?, ?)",
+                    [(gram, row['id'], tf) for gram, tf in index_terms(metadata_text.lower()).items()]
+                )
+
+    def mark_archived(self, file_names: List[str]):
+        """アーカイブに移した契約書として記録する（メタデータ更新時刻は 0 にする）"""
+        with self._lock, self._conn:
+            self._write().executemany(
+                "UPDATE contracts SET archived = 1, metadata_mtime = 0 WHERE file_name = ?",
+                [(file_name,) for file_name in file_names]
+            )
+
+    def remove(self, file_name: str):
+        """契約書をカタログから削除"""
+        with self._lock, self._conn:
+            self._remove(self._write(), file_name)
+
+    def replace_all(self, records: List[Dict[str, Any]]):
+        """カタログ全体を置き換える（再構築用）"""
+        with self._lock, self._conn:
+            self._write()
+            for table in ["contracts", "texts", "text_postings", "metadata_postings"]:
+                self._conn.execute(f"DELETE FROM {table}")
+            for record in records:
+                self._upsert(
+                    self._conn,
+                    record['type'],
+                    record['file_path'],
+                    record['metadata'],
+                    record['content'],
+                    record.get('metadata_mtime', 0),
+                    record.get('archived', False)
+                )
+
+    def _filter_clause(self, contract_type: Optional[str], date_from: Optional[str],
+                       date_to: Optional[str], after: Optional[tuple] = None,
+                       archived: Optional[bool] = None) -> tuple:
+        """種類・作成日・ページ位置・アーカイブ済みかの絞り込み条件
+
+        after は直前のページ末尾の (created_at, file_name)。
+        """
+        conditions = []
+        args = []
+        if archived is not None:
+            conditions.append("archived = ?")
+            args.append(int(archived))
+        if after:
+            conditions.append("(created_at, file_name) < (?, ?)")
+            args.extend(after)
+        if contract_type:
+            conditions.append("contract_type = ?")
+            args.append(contract_type)
+        if date_from:
+            conditions.append("substr(created_at, 1, 10) >= ?")
+            args.append(date_from)
+        if date_to:
+            conditions.append("substr(created_at, 1, 10) <= ?")
+            args.append(date_to)
+        return conditions, args
+
+    def list(self, contract_type: Optional[str] = None, date_from: Optional[str] = None,
+             date_to: Optional[str] = None, after: Optional[tuple] = None,
+             limit: Optional[int] = None, archived: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """作成日時の降順で契約書一覧を返す"""
+        conditions, args = self._filter_clause(contract_type, date_from, date_to, after, archived)
+        sql = "SELECT contract_type, file_path, metadata, archived FROM contracts"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC, file_name DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def get(self, file_name: str) -> Optional[Dict[str, Any]]:
+        """ファイル名で契約書を1件返す（なければ None）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT contract_type, file_path, metadata, archived FROM contracts WHERE file_name = ?",
+                (file_name,)
+            ).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def find(self, terms: List[str], contract_type: Optional[str] = None,
+             date_from: Optional[str] = None, date_to: Optional[str] = None,
+             rank: bool = False, after: Optional[tuple] = None,
+             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """全n-gramを本文またはメタデータに含む契約書を返す
+
+        rank=False の場合は作成日時の降順（after/limit でページング可）、
+        rank=True の場合はBM25スコアの降順（各レコードに 'score' を付与）で返す。
+        """
+        if not terms:
+            return self.list(contract_type, date_from, date_to, after, limit)
+
+        placeholders = ", ".join("?" for _ in terms)
+        conditions, args = self._filter_clause(contract_type, date_from, date_to, after)
+        sql = f"""
+            SELECT id, text_id, metadata_length, contract_type, file_path, metadata, archived FROM contracts
+            WHERE (
+                text_id IN (
+                    SELECT text_id FROM text_postings WHERE gram IN ({placeholders})
+                    GROUP BY text_id HAVING COUNT(*) = ?
+                )
+                OR id IN (
+                    SELECT contract_id FROM metadata_postings WHERE gram IN ({placeholders})
+                    GROUP BY contract_id HAVING COUNT(*) = ?
+                )
+            )
+        """
+        if conditions:
+            sql += " AND " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC, file_name DESC"
+        if limit is not None and not rank:
+            sql += " LIMIT ?"
+            args.append(limit)
+
+        params = list(terms) + [len(terms)] + list(terms) + [len(terms)] + args
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            scores = self._bm25_scores(terms, rows) if rank and rows else None
+
+        records = [self._row_to_record(row) for row in rows]
+        if scores is None:
+            return records
+
+        for row, record in zip(rows, records):
+            record['score'] = round(scores.get(row['id'], 0.0), 4)
+        # sortedは安定なので、同点の場合は作成日時の降順が保たれる
+        return sorted(records, key=lambda x: x['score'], reverse=True)
+
+    def _bm25_scores(self, terms: List[str], rows: List[sqlite3.Row]) -> Dict[int, float]:
+        """本文とメタデータの2フィールドでBM25スコアを計算する（ロック取得済みで呼ぶこと）"""
+        placeholders = ", ".join("?" for _ in terms)
+        text_ids = {row['text_id'] for row in rows}
+        contract_ids = {row['id'] for row in rows}
+
+        text_count, text_avg = self._conn.execute(
+            "SELECT COUNT(*), AVG(length) FROM texts"
+        ).fetchone()
+        metadata_count, metadata_avg = self._conn.execute(
+            "SELECT COUNT(*), AVG(metadata_length) FROM contracts"
+        ).fetchone()
+
+        text_tf = {}
+        text_df = {}
+        for gram, text_id, tf in self._conn.execute(
+            f"SELECT gram, text_id, tf FROM text_postings WHERE gram IN ({placeholders})", terms
+        ):
+            text_df[gram] = text_df.get(gram, 0) + 1
+            if text_id in text_ids:
+                text_tf.setdefault(text_id, {})[gram] = tf
+
+        metadata_tf = {}
+        metadata_df = {}
+        for gram, contract_id, tf in self._conn.execute(
+            f"SELECT gram, contract_id, tf FROM metadata_postings WHERE gram IN ({placeholders})", terms
+        ):
+            metadata_df[gram] = metadata_df.get(gram, 0) + 1
+            if contract_id in contract_ids:
+                metadata_tf.setdefault(contract_id, {})[gram] = tf
+
+        text_lengths = {}
+        if text_ids:
+            id_placeholders = ", ".join("?" for _ in text_ids)
+            text_lengths = dict(self._conn.execute(
+                f"SELECT id, length FROM texts WHERE id IN ({id_placeholders})", list(text_ids)
+            ).fetchall())
+
+        scores = {}
+        for row in rows:
+            scores[row['id']] = (
+                bm25(text_tf.get(row['text_id'], {}), text_df, text_count,
+                     text_lengths.get(row['text_id'], 0), text_avg or 1)
+                + bm25(metadata_tf.get(row['id'], {}), metadata_df, metadata_count,
+                       row['metadata_length'], metadata_avg or 1)
+            )
+        return scores
+
+    def snapshot(self, include_archived: bool = True) -> Dict[str, float]:
+        """ファイル名 -> メタデータ更新時刻 の対応（整合性チェック用。アーカイブ済みは 0）"""
+        sql = "SELECT file_name, metadata_mtime FROM contracts"
+        if not include_archived:
+            sql += " WHERE archived = 0"
+        with self._lock:
+            rows = self._conn.execute(sql).fetchall()
+        return {row['file_name']: row['metadata_mtime'] for row in rows}
+
+    def fingerprint(self, file_name: str) -> Optional[tuple]:
+        """登録済みの (メタデータ更新時刻, 本文のSHA-256)。未登録なら None（差分反映用）"""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT contracts.metadata_mtime, texts.sha256 FROM contracts
+                LEFT JOIN texts ON texts.id = contracts.text_id
+                WHERE contracts.file_name = ?
+                """,
+                (file_name,)
+            ).fetchone()
+        return (row['metadata_mtime'], row['sha256']) if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM contracts").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def bm25(term_freqs: Dict[str, int], doc_freqs: Dict[str, int], doc_count: int,
+         doc_length: int, avg_length: float, k1: float = 1.2, b: float = 0.75) -> float:
+    """1文書・1フィールド分のBM25スコア"""
+    score = 0.0
+    for gram, tf in term_freqs.items():
+        df = doc_freqs.get(gram, 0)
+        idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_length / avg_length))
+    return score
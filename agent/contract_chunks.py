@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import re
+from typing import List, Dict, Any
+
+# 行頭の「第N条」（算用数字・全角数字・漢数字）を条の始まりとみなす
+ARTICLE_HEADING = re.compile(r"^[ \t　]*第[0-9０-９一二三四五六七八九十百千]+条", re.MULTILINE)
+
+
+def split_articles(content: str) -> List[Dict[str, Any]]:
+    """契約書を条ごとに分ける（前文・末尾の署名欄は最初・最後の条に含める）
+
+    各要素は heading（「第N条」、前文のみの場合は空）と text を持つ。条が見つからなければ全体を1要素で返す。
+    """
+    starts = [match.start() for match in ARTICLE_HEADING.finditer(content)]
+    if not starts:
+        return [{'heading': "", 'text': content}]
+    bounds = [0] + starts[1:] + [len(content)]
+    articles = []
+    for start, end in zip(bounds, bounds[1:]):
+        text = content[start:end]
+        match = ARTICLE_HEADING.search(text)
+        articles.append({'heading': match.group().strip() if match else "", 'text': text})
+    return articles
+
+
+def group_articles(articles: List[Dict[str, Any]], max_chars: int) -> List[Dict[str, Any]]:
+    """連続する条を max_chars 文字以内のチャンクにまとめる（1条だけで超える場合はその条だけのチャンクにする）
+
+    各チャンクは label（「第1条〜第5条」）と text を持つ。
+    """
+    chunks = []
+    current = []
+    size = 0
+    for article in articles:
+        if current and size + len(article['text']) > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(article)
+        size += len(article['text'])
+    if current:
+        chunks.append(current)
+
+    grouped = []
+    for chunk in chunks:
+        headings = [article['heading'] for article in chunk if article['heading']]
+        if not headings:
+            label = "前文"
+        elif len(headings) == 1:
+            label = headings[0]
+        else:
+            label = f"{headings[0]}〜{headings[-1]}"
+        grouped.append({'label': label, 'text': "".join(article['text'] for article in chunk)})
+    return grouped
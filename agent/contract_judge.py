@@ -1,49 +1,202 @@
 # -*- coding: utf-8 -*-
 import os
 import json
-import requests
+import uuid
+import hashlib
 from datetime import datetime
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 from openai import OpenAI
 
+from .rate_limit import RateLimiter, call_with_retry
+from .contract_chunks import split_articles, group_articles
+from .contract_screen import screen_contract, missing_items
+from .disk_cache import DiskCache, cache_key
+from .telemetry import get_exporter
+from .metrics import stage_timer, openai_call, record_usage, PRESCREEN_DECISIONS
+
+JUDGE_MODEL = "gpt-4o"
+JUDGE_MAX_TOKENS = 2000
+JUDGE_TEMPERATURE = 0.1
+
+# 評価基準・プロンプトを変更したら上げる（評価キャッシュのキーに含まれる）
+RUBRIC_VERSION = 1
+
+# メトリクスのコンポーネント名
+METRICS_COMPONENT = "judge"
+
+# 評価モード: single は全文を1回で評価、chunked は条ごとのチャンクに分けて並列に評価して統合、
+# auto は JUDGE_CHUNK_THRESHOLD_CHARS 文字を超える契約書だけ chunked にする
+EVALUATION_MODES = ("single", "chunked", "auto")
+CHUNK_MAX_CHARS = int(os.getenv("JUDGE_CHUNK_MAX_CHARS", "6000"))
+# 1件の契約書のチャンクを同時に評価する数（全体の送信量はレート制限で抑える）
+CHUNK_CONCURRENCY = int(os.getenv("JUDGE_CHUNK_CONCURRENCY", "8"))
+CHUNK_THRESHOLD_CHARS = int(os.getenv("JUDGE_CHUNK_THRESHOLD_CHARS", "8000"))
+CHUNK_MAX_TOKENS = 600
+# チャンクの評価に使うモデル（gpt-4o-mini などにすると費用を抑えられる）
+CHUNK_MODEL = os.getenv("JUDGE_CHUNK_MODEL", JUDGE_MODEL)
+
+# 評価プロンプトの「評価項目」と、その項目を扱う条を見分けるキーワード
+CHECKLIST_KEYWORDS = {
+    "rental": {
+        "物件詳細情報の記載": ("物件", "所在地"),
+        "賃料・敷金・礼金の明記": ("賃料", "敷金", "礼金"),
+        "契約期間と更新条件": ("期間", "更新"),
+        "修繕責任の明確化": ("修繕",),
+        "解約条件の適切性": ("解約", "解除")
+    },
+    "service": {
+        "業務内容の具体的記載": ("業務内容", "委託", "本業務"),
+        "成果物・納期の明確化": ("成果物", "納期", "納品"),
+        "報酬額と支払方法": ("報酬", "支払"),
+        "知的財産権の取扱い": ("知的財産", "著作権"),
+        "秘密保持義務": ("秘密",)
+    }
+}
+
+# チャンクごとに採点する観点（網羅性はチャンク単位では判断できないため、評価項目の記載有無から求める）
+CHUNK_CRITERIA = {
+    "legal_compliance": "法的適合性: {laws}への準拠度",
+    "clarity": "明瞭性: 条文の明確性・理解しやすさ",
+    "risk_management": "リスク管理: 当事者双方のリスク・責任の適切な分担",
+    "practicality": "実用性: 実際の運用における有効性"
+}
+APPLICABLE_LAWS = {"rental": "日本の借地借家法・民法", "service": "日本の民法・労働法"}
+
+# 総合点数（100点満点）から評価ランクへの換算
+GRADE_THRESHOLDS = ((85, "A"), (70, "B"), (55, "C"), (40, "D"), (0, "F"))
+
+
+def grade_for(overall_score: int) -> str:
+    return next(grade for threshold, grade in GRADE_THRESHOLDS if overall_score >= threshold)
+
+
 class ContractJudge:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.langfuse_base_url = "http://localhost:3000"
-        self.langfuse_public_key = os.getenv("LANGFUSE_PUBLIC_KEY", "pk-lf-1234567890abcdef")
-        self.langfuse_secret_key = os.getenv("LANGFUSE_SECRET_KEY", "sk-lf-1234567890abcdef")
+    def __init__(self, max_concurrency: Optional[int] = None, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, max_retries: Optional[int] = None,
+                 evaluation_cache: Optional[DiskCache] = None, storage=None,
+                 evaluation_mode: Optional[str] = None):
+        # 再試行はこちらで制御するため、クライアント内蔵の再試行は無効にする
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        
+        # 一括評価の並列度とレート制限（gpt-4oの利用枠に合わせて調整）
+        self.max_concurrency = max_concurrency or int(os.getenv("JUDGE_MAX_CONCURRENCY", "4"))
+        self.max_retries = max_retries or int(os.getenv("JUDGE_MAX_RETRIES", "5"))
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=requests_per_minute or float(os.getenv("JUDGE_REQUESTS_PER_MINUTE", "60")),
+            tokens_per_minute=tokens_per_minute or float(os.getenv("JUDGE_TOKENS_PER_MINUTE", "30000")),
+            window_seconds=float(os.getenv("JUDGE_RATE_LIMIT_WINDOW_SECONDS", "60")),
+            margin_seconds=float(os.getenv("JUDGE_RATE_LIMIT_MARGIN_SECONDS", "1"))
+        )
         
-    def evaluate_contract_quality(self, contract_content: str, contract_type: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        # 評価結果キャッシュ（内容・メタデータ・評価基準・モデルが同じなら再評価しない）
+        self.evaluation_cache = evaluation_cache or DiskCache(
+            os.getenv("EVALUATION_CACHE_DIR", "contracts/evaluations"),
+            max_bytes=int(float(os.getenv("EVALUATION_CACHE_MAX_MB", "200")) * 1024 * 1024)
+        )
+        
+        # LangFuseへの記録は共通のエクスポーターに積むだけで、評価は送信を待たない
+        self.telemetry = get_exporter()
+        
+        # 指定があれば契約書は DocumentStorage 経由で読む（アーカイブ済みの契約書も評価できる）
+        self.storage = storage
+        
+        self.evaluation_mode = evaluation_mode or os.getenv("JUDGE_EVALUATION_MODE", "single")
+        if self.evaluation_mode not in EVALUATION_MODES:
+            raise ValueError(f"Unknown evaluation mode: {self.evaluation_mode}")
+        
+    def _evaluation_cache_key(self, contract_content: str, contract_type: str, metadata: Dict[str, Any],
+                              chunked: bool = False) -> str:
+        key = {
+            "content_sha256": hashlib.sha256(contract_content.encode('utf-8')).hexdigest(),
+            "contract_type": contract_type,
+            "metadata": metadata,
+            "rubric_version": RUBRIC_VERSION,
+            "model": JUDGE_MODEL,
+            "temperature": JUDGE_TEMPERATURE
+        }
+        if chunked:
+            # 全文評価の保存済み結果のキーは変えない
+            key.update({"evaluation_mode": "chunked", "chunk_max_chars": CHUNK_MAX_CHARS, "chunk_model": CHUNK_MODEL})
+        return cache_key(key)
+    
+    def _plan_chunks(self, contract_content: str, mode: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """分割して評価する場合はチャンクの一覧、全文を1回で評価する場合は None"""
+        mode = mode or self.evaluation_mode
+        if mode not in EVALUATION_MODES:
+            raise ValueError(f"Unknown evaluation mode: {mode}")
+        if mode == "single" or (mode == "auto" and len(contract_content) <= CHUNK_THRESHOLD_CHARS):
+            return None
+        chunks = group_articles(split_articles(contract_content), CHUNK_MAX_CHARS)
+        # 1チャンクに収まるなら分ける意味がない
+        return chunks if len(chunks) > 1 else None
+    
+    def evaluate_contract_quality(self, contract_content: str, contract_type: str, metadata: Dict[str, Any],
+                                  force: bool = False, mode: Optional[str] = None) -> Dict[str, Any]:
         """
         LLM-as-a-Judgeによる契約書品質評価
+        
+        同じ内容の評価結果が保存されていればそれを返す（force=True で再評価）。
+        mode（省略時は JUDGE_EVALUATION_MODE）が chunked / auto の場合、長い契約書は条ごとに分けて評価する。
         """
-        trace_id = f"judge_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        chunks = self._plan_chunks(contract_content, mode)
+        key = self._evaluation_cache_key(contract_content, contract_type, metadata, chunked=chunks is not None)
+        if not force:
+            with stage_timer(METRICS_COMPONENT, "cache_lookup"):
+                cached = self.evaluation_cache.get(key)
+            if cached is not None:
+                cached["cached"] = True
+                return cached
+        
+        # 並列評価で同一秒に複数のトレースが作られても衝突しないようにする
+        trace_id = f"judge_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
         
         # LangFuseトレース開始
-        self._start_trace(trace_id, "contract_quality_evaluation")
+        with stage_timer(METRICS_COMPONENT, "telemetry_export"):
+            self._start_trace(trace_id, "contract_quality_evaluation")
         
         try:
-            # 評価プロンプトの構築
-            evaluation_prompt = self._build_evaluation_prompt(contract_content, contract_type, metadata)
-            
-            # LLM評価実行
-            evaluation_result = self._execute_llm_evaluation(evaluation_prompt, trace_id)
-            
-            # 評価結果の解析
-            parsed_result = self._parse_evaluation_result(evaluation_result)
-            
-            # LangFuseに評価結果を記録
-            self._log_evaluation_to_langfuse(trace_id, evaluation_prompt, evaluation_result, parsed_result)
+            if chunks is not None:
+                parsed_result, evaluation_result, usage = self._evaluate_chunks(
+                    chunks, contract_type, metadata, trace_id
+                )
+            else:
+                # 評価プロンプトの構築
+                with stage_timer(METRICS_COMPONENT, "prompt_build"):
+                    evaluation_prompt = self._build_evaluation_prompt(contract_content, contract_type, metadata)
+                
+                # LLM評価実行
+                evaluation_result, usage = self._execute_llm_evaluation(evaluation_prompt, trace_id)
+                
+                # 評価結果の解析
+                with stage_timer(METRICS_COMPONENT, "parse"):
+                    parsed_result = self._parse_evaluation_result(evaluation_result)
+                
+                # LangFuseに評価結果を記録
+                with stage_timer(METRICS_COMPONENT, "telemetry_export"):
+                    self._log_evaluation_to_langfuse(trace_id, evaluation_prompt, evaluation_result, parsed_result)
             
-            return {
+            result = {
                 "success": True,
                 "trace_id": trace_id,
                 "evaluation": parsed_result,
-                "raw_response": evaluation_result
+                "raw_response": evaluation_result,
+                "mode": "chunked" if chunks is not None else "single",
+                "usage": usage,
+                "evaluated_at": datetime.now().isoformat(),
+                "cached": False
             }
             
+            # 解析に失敗した評価は保存せず、次回は再評価する
+            if "parse_error" not in parsed_result:
+                with stage_timer(METRICS_COMPONENT, "storage_write"):
+                    self.evaluation_cache.set(key, result)
+            
+            return result
+            
         except Exception as e:
-            self._log_error_to_langfuse(trace_id, str(e))
+            with stage_timer(METRICS_COMPONENT, "telemetry_export"):
+                self._log_error_to_langfuse(trace_id, str(e))
             return {
                 "success": False,
                 "error": str(e),
@@ -136,19 +289,37 @@ class ContractJudge:
 """
         return prompt
     
-    def _execute_llm_evaluation(self, prompt: str, trace_id: str) -> str:
-        """LLM評価の実行"""
-        response = self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "あなたは法務専門家として契約書の品質を客観的に評価します。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=2000
-        )
+    def _execute_llm_evaluation(self, prompt: str, trace_id: str, model: str = JUDGE_MODEL,
+                                max_tokens: int = JUDGE_MAX_TOKENS) -> tuple:
+        """LLM評価の実行（レート制限の予算内で送信し、429・5xxは再試行）。(応答, トークン使用量) を返す"""
+        messages = [
+            {"role": "system", "content": "あなたは法務専門家として契約書の品質を客観的に評価します。"},
+            {"role": "user", "content": prompt}
+        ]
+        # 日本語はおおむね1文字1トークン以下なので、文字数＋最大出力で多めに見積もる
+        estimated_tokens = sum(len(message["content"]) for message in messages) + max_tokens
         
-        return response.choices[0].message.content
+        def create():
+            # 再試行も予算を使うため、送信のたびに予算を確保する
+            with stage_timer(METRICS_COMPONENT, "rate_limit_wait"):
+                self.rate_limiter.acquire(estimated_tokens)
+            return self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=JUDGE_TEMPERATURE,
+                max_tokens=max_tokens
+            )
+        
+        # 再試行を含めた所要時間を記録する
+        with openai_call(METRICS_COMPONENT, model):
+            response = call_with_retry(create, max_attempts=self.max_retries)
+        record_usage(METRICS_COMPONENT, model, response.usage)
+        
+        usage = {
+            "prompt_tokens": getattr(response.usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(response.usage, "completion_tokens", 0) or 0
+        }
+        return response.choices[0].message.content, usage
     
     def _parse_evaluation_result(self, result: str) -> Dict[str, Any]:
         """評価結果の解析"""
@@ -186,95 +357,241 @@ class ContractJudge:
                 "parse_error": str(e)
             }
     
-    def _start_trace(self, trace_id: str, name: str):
-        """LangFuseトレース開始"""
+    def _build_chunk_prompt(self, chunk: Dict[str, Any], contract_type: str, metadata: Dict[str, Any],
+                            items: List[str]) -> str:
+        """チャンク評価用プロンプトの構築（評価項目はこのチャンクに関係するものだけを渡す）"""
+        laws = APPLICABLE_LAWS[contract_type]
+        criteria = "\n".join(
+            f"- {key}: {description.format(laws=laws)} (1-10点)" for key, description in CHUNK_CRITERIA.items()
+        )
+        checklist = "\n".join(f"- {item}" for item in items) or "- （なし）"
+        scores = ", ".join(f'"{key}": <1-10>' for key in CHUNK_CRITERIA)
+        return f"""あなたは法務の専門家として、{contract_type}契約書の一部（{chunk['label']}）の品質を評価してください。
+契約書の他の部分は別に評価するため、この部分に書かれていないことは減点しないでください。
+
+【メタデータ】
+{json.dumps(metadata, ensure_ascii=False, separators=(',', ':'))}
+
+【契約書（{chunk['label']}）】
+{chunk['text']}
+
+【採点の観点】
+{criteria}
+
+【評価項目】次のうち、この部分で十分に定められているものを covered_items に挙げてください。
+{checklist}
+
+次のJSON形式でのみ回答してください（各リストは2件まで）：
+{{"scores": {{{scores}}}, "covered_items": [], "strengths": [], "weaknesses": [], "recommendations": [], "legal_issues": []}}
+"""
+    
+    def _evaluate_chunks(self, chunks: List[Dict[str, Any]], contract_type: str, metadata: Dict[str, Any],
+                         trace_id: str) -> tuple:
+        """チャンクを並列に評価して1つの評価結果に統合し、(評価結果, 応答, トークン使用量) を返す"""
+        checklist = CHECKLIST_KEYWORDS[contract_type]
+        
+        def evaluate(index: int) -> Dict[str, Any]:
+            chunk = chunks[index]
+            items = [item for item, keywords in checklist.items() if any(word in chunk['text'] for word in keywords)]
+            with stage_timer(METRICS_COMPONENT, "prompt_build"):
+                prompt = self._build_chunk_prompt(chunk, contract_type, metadata, items)
+            response, usage = self._execute_llm_evaluation(prompt, trace_id, CHUNK_MODEL, CHUNK_MAX_TOKENS)
+            with stage_timer(METRICS_COMPONENT, "parse"):
+                parsed = self._parse_chunk_result(response, items)
+            with stage_timer(METRICS_COMPONENT, "telemetry_export"):
+                self._log_evaluation_to_langfuse(trace_id, prompt, response, parsed, f"chunk{index + 1}",
+                                                 CHUNK_MODEL, CHUNK_MAX_TOKENS)
+            return {"label": chunk['label'], "length": len(chunk['text']), "parsed": parsed,
+                    "response": response, "usage": usage}
+        
+        workers = max(1, min(CHUNK_CONCURRENCY, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="judge-chunk") as executor:
+            evaluated = list(executor.map(evaluate, range(len(chunks))))
+        
+        with stage_timer(METRICS_COMPONENT, "parse"):
+            merged = self._merge_chunk_results(evaluated, list(checklist))
+        usage = {
+            "prompt_tokens": sum(chunk["usage"]["prompt_tokens"] for chunk in evaluated),
+            "completion_tokens": sum(chunk["usage"]["completion_tokens"] for chunk in evaluated)
+        }
+        raw_response = "\n\n".join(f"[{chunk['label']}]\n{chunk['response']}" for chunk in evaluated)
+        return merged, raw_response, usage
+    
+    def _parse_chunk_result(self, result: str, items: List[str]) -> Dict[str, Any]:
+        """チャンク評価の解析（評価項目は渡したものだけを有効にする）"""
         try:
-            trace_data = {
-                "id": trace_id,
-                "name": name,
-                "metadata": {
-                    "type": "contract_evaluation",
-                    "timestamp": datetime.now().isoformat()
-                },
-                "tags": ["llm-as-a-judge", "contract-quality"]
+            parsed = json.loads(result[result.find('{'):result.rfind('}') + 1])
+            scores = parsed.get("scores") or {}
+            return {
+                "scores": {key: max(1, min(10, int(scores.get(key, 5)))) for key in CHUNK_CRITERIA},
+                "covered_items": [item for item in parsed.get("covered_items") or [] if item in items],
+                **{key: [str(value) for value in parsed.get(key) or []]
+                   for key in ("strengths", "weaknesses", "recommendations", "legal_issues")}
+            }
+        except (json.JSONDecodeError, ValueError, TypeError, AttributeError) as e:
+            return {
+                "scores": {key: 5 for key in CHUNK_CRITERIA},
+                "covered_items": [],
+                "strengths": [], "weaknesses": [], "recommendations": [], "legal_issues": [],
+                "parse_error": str(e)
             }
-            
-            response = requests.post(
-                f"{self.langfuse_base_url}/api/public/traces",
-                json=trace_data,
-                headers={"Content-Type": "application/json"},
-                auth=(self.langfuse_public_key, self.langfuse_secret_key)
-            )
-            
-        except Exception as e:
-            print(f"LangFuse trace start error: {e}")
     
-    def _log_evaluation_to_langfuse(self, trace_id: str, prompt: str, response: str, parsed_result: Dict[str, Any]):
-        """評価結果をLangFuseに記録"""
-        try:
-            generation_data = {
-                "id": f"{trace_id}_evaluation",
-                "traceId": trace_id,
-                "name": "contract_quality_evaluation",
-                "startTime": datetime.now().isoformat(),
-                "endTime": datetime.now().isoformat(),
-                "model": "gpt-4o",
-                "modelParameters": {
-                    "temperature": 0.1,
-                    "maxTokens": 2000
-                },
-                "input": prompt,
-                "output": response,
-                "metadata": {
-                    "evaluation_scores": parsed_result.get("scores", {}),
-                    "overall_score": parsed_result.get("overall_score", 0),
-                    "grade": parsed_result.get("grade", "N/A")
-                },
+    def _merge_chunk_results(self, evaluated: List[Dict[str, Any]], checklist: List[str]) -> Dict[str, Any]:
+        """チャンクの評価を全文評価と同じ形式（overall_score / scores / grade など）にまとめる
+
+        各観点の点数はチャンクの文字数で重み付けした平均、網羅性は評価項目のうち
+        いずれかのチャンクで定められていた割合、総合点数は5観点の合計を100点満点に換算したもの。
+        """
+        total_length = sum(chunk["length"] for chunk in evaluated) or 1
+        scores = {
+            key: max(1, min(10, round(sum(chunk["parsed"]["scores"][key] * chunk["length"] for chunk in evaluated)
+                                      / total_length)))
+            for key in CHUNK_CRITERIA
+        }
+        covered = {item for chunk in evaluated for item in chunk["parsed"]["covered_items"]}
+        missing = [item for item in checklist if item not in covered]
+        scores["completeness"] = max(1, round(10 * (len(checklist) - len(missing)) / len(checklist)))
+        overall_score = sum(scores.values()) * 2
+        
+        def collect(key: str) -> List[str]:
+            values = []
+            for chunk in evaluated:
+                for value in chunk["parsed"][key]:
+                    if value not in values:
+                        values.append(value)
+            return values[:5]
+        
+        labels = "、".join(chunk["label"] for chunk in evaluated)
+        summary = f"{len(evaluated)}分割（{labels}）で評価。"
+        summary += f"定めが不十分な項目: {'、'.join(missing)}" if missing else "評価項目はすべて定められている"
+        merged = {
+            "overall_score": overall_score,
+            "scores": {key: scores[key] for key in
+                       ("legal_compliance", "completeness", "clarity", "risk_management", "practicality")},
+            "strengths": collect("strengths"),
+            "weaknesses": collect("weaknesses"),
+            "recommendations": collect("recommendations"),
+            "legal_issues": collect("legal_issues"),
+            "grade": grade_for(overall_score),
+            "summary": summary,
+            "chunks": [
+                {"label": chunk["label"], "scores": chunk["parsed"]["scores"],
+                 "covered_items": chunk["parsed"]["covered_items"]}
+                for chunk in evaluated
+            ]
+        }
+        errors = [f"{chunk['label']}: {chunk['parsed']['parse_error']}" for chunk in evaluated
+                  if "parse_error" in chunk["parsed"]]
+        if errors:
+            merged["parse_error"] = "; ".join(errors)
+        return merged
+    
+    def _start_trace(self, trace_id: str, name: str):
+        """LangFuseトレース開始"""
+        self.telemetry.trace(
+            trace_id,
+            name,
+            metadata={
+                "type": "contract_evaluation",
+                "timestamp": datetime.now().isoformat()
+            },
+            tags=["llm-as-a-judge", "contract-quality"]
+        )
+    
+    def _log_evaluation_to_langfuse(self, trace_id: str, prompt: str, response: str, parsed_result: Dict[str, Any],
+                                    suffix: str = "evaluation", model: str = JUDGE_MODEL,
+                                    max_tokens: int = JUDGE_MAX_TOKENS):
+        """評価結果をLangFuseに記録（チャンクごとの評価は suffix で区別する）"""
+        self.telemetry.generation(
+            trace_id,
+            f"{trace_id}_{suffix}",
+            "contract_quality_evaluation",
+            startTime=datetime.now().isoformat(),
+            endTime=datetime.now().isoformat(),
+            model=model,
+            modelParameters={
+                "temperature": JUDGE_TEMPERATURE,
+                "maxTokens": max_tokens
+            },
+            input=prompt,
+            output=response,
+            metadata={
+                "evaluation_scores": parsed_result.get("scores", {}),
+                "overall_score": parsed_result.get("overall_score", 0),
+                "grade": parsed_result.get("grade", "N/A"),
                 "tags": ["evaluation", "llm-judge"]
             }
-            
-            response = requests.post(
-                f"{self.langfuse_base_url}/api/public/generations",
-                json=generation_data,
-                headers={"Content-Type": "application/json"},
-                auth=(self.langfuse_public_key, self.langfuse_secret_key)
-            )
-            
-        except Exception as e:
-            print(f"LangFuse logging error: {e}")
+        )
     
     def _log_error_to_langfuse(self, trace_id: str, error_message: str):
         """エラーをLangFuseに記録"""
-        try:
-            error_data = {
-                "id": f"{trace_id}_error",
-                "traceId": trace_id,
-                "name": "evaluation_error",
-                "startTime": datetime.now().isoformat(),
-                "endTime": datetime.now().isoformat(),
-                "level": "ERROR",
-                "message": error_message,
-                "metadata": {
-                    "type": "contract_evaluation_error"
-                }
+        self.telemetry.event(
+            trace_id,
+            f"{trace_id}_error",
+            "evaluation_error",
+            level="ERROR",
+            statusMessage=error_message,
+            metadata={
+                "type": "contract_evaluation_error"
             }
-            
-            requests.post(
-                f"{self.langfuse_base_url}/api/public/events",
-                json=error_data,
-                headers={"Content-Type": "application/json"},
-                auth=(self.langfuse_public_key, self.langfuse_secret_key)
-            )
-            
-        except Exception as e:
-            print(f"LangFuse error logging failed: {e}")
+        )
     
-    def batch_evaluate_contracts(self, contract_files: List[str]) -> List[Dict[str, Any]]:
-        """複数契約書の一括評価"""
-        results = []
-        
-        for file_path in contract_files:
-            try:
+    def prescreen_contract(self, contract_content: str, contract_type: str,
+                           metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """ルールによる事前確認（LLMは呼ばない）。振り分けはメトリクスに記録する"""
+        with stage_timer(METRICS_COMPONENT, "prescreen"):
+            screen = screen_contract(contract_content, contract_type, metadata)
+        PRESCREEN_DECISIONS.inc(contract_type, screen["decision"])
+        return screen
+    
+    def _prescreen_result(self, screen: Dict[str, Any]) -> Dict[str, Any]:
+        """事前確認だけで結論が出た契約書の評価結果（全文評価と同じ形式）
+
+        条項の有無を確かめただけで品質は評価していないため、overall_score・grade・scores は空にし、
+        AIの評価と取り違えないようにする。事前確認の点数と振り分けは prescreen に入る。
+        """
+        missing = missing_items(screen)
+        weaknesses = [f"{item}: {'、'.join(labels)}の記載が見当たらない" for item, labels in missing]
+        weaknesses += screen["amount_mismatches"]
+        if screen["decision"] == "pass":
+            summary = "ルールによる事前確認で評価項目の条項と金額がすべて確認できたため、AI評価は省略した"
+        else:
+            summary = "ルールによる事前確認で必要な条項の不足が見つかったため、AI評価は行っていない"
+        return {
+            "success": True,
+            "trace_id": None,
+            "evaluation": {
+                "overall_score": None,
+                "scores": {},
+                "strengths": [] if missing else ["評価項目の条項がすべて記載されている"],
+                "weaknesses": weaknesses,
+                "recommendations": [f"「{item}」に関する条項を追加する" for item, _ in missing],
+                "legal_issues": [],
+                "grade": None,
+                "summary": summary
+            },
+            "mode": "prescreen",
+            "prescreen": screen,
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0},
+            "evaluated_at": datetime.now().isoformat(),
+            "cached": False
+        }
+    
+    def evaluate_contract_file(self, file_path: str, force: bool = False, prescreen: bool = False) -> Dict[str, Any]:
+        """契約書ファイル1件を評価（内容が変わっていなければ保存済みの評価を返す）
+
+        prescreen=True の場合は先にルールによる事前確認を行い、明らかな不備がある（fail）か
+        必要な条項が揃っている（pass）契約書はLLMを呼ばずに結果を返す。境界上（borderline）の契約書だけをLLMで評価する。
+        """
+        try:
+            if self.storage is not None:
+                contract = self.storage.get_contract(os.path.basename(file_path))
+                if contract is None:
+                    raise FileNotFoundError(f"契約書が見つかりません: {file_path}")
+                content = self.storage.read_content(contract)
+                metadata = contract['metadata']
+                contract_type = contract['type']
+            else:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     content = f.read()
                 
@@ -287,18 +604,31 @@ class ContractJudge:
                 
                 # 契約書タイプを判定
                 contract_type = "rental" if "rental" in file_path else "service"
-                
+            
+            screen = self.prescreen_contract(content, contract_type, metadata) if prescreen else None
+            if screen is not None and screen["decision"] != "borderline":
+                evaluation = self._prescreen_result(screen)
+            else:
                 # 評価実行
-                evaluation = self.evaluate_contract_quality(content, contract_type, metadata)
-                evaluation["file_path"] = file_path
-                
-                results.append(evaluation)
-                
-            except Exception as e:
-                results.append({
-                    "success": False,
-                    "error": str(e),
-                    "file_path": file_path
-                })
+                evaluation = self.evaluate_contract_quality(content, contract_type, metadata, force=force)
+                if screen is not None:
+                    evaluation["prescreen"] = screen
+            evaluation["file_path"] = file_path
+            
+            return evaluation
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "file_path": file_path
+            }
+    
+    def batch_evaluate_contracts(self, contract_files: List[str], max_concurrency: Optional[int] = None,
+                                 force: bool = False, prescreen: bool = False) -> List[Dict[str, Any]]:
+        """複数契約書の一括評価（並列実行、結果は入力と同じ順序。未変更の契約書は保存済みの評価を返す）"""
+        workers = max(1, min(max_concurrency or self.max_concurrency, len(contract_files) or 1))
         
-        return results
\ No newline at end of file
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="judge") as executor:
+            return list(executor.map(lambda path: self.evaluate_contract_file(path, force=force, prescreen=prescreen),
+                                     contract_files))
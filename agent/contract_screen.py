@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# 事前確認の点数（100点満点）がこれ未満なら、LLMで評価するまでもなく不備がある契約書とみなす
+PRESCREEN_FAIL_BELOW = int(os.getenv("JUDGE_PRESCREEN_FAIL_BELOW", "60"))
+# これ以上で金額の食い違いもなければ、必要な条項が揃った契約書とみなす（101以上にするとLLM評価に回す）
+PRESCREEN_PASS_AT = int(os.getenv("JUDGE_PRESCREEN_PASS_AT", "100"))
+
+# \d は全角数字にも一致するため、本文は変換せずに照合する（全角カンマも桁区切りとして扱う）
+_NUMBER = r"\d[\d,，]*(?:[.．]\d+)?"
+
+# 金額（「金80,000円」「8万円」「賃料の1か月分」）と、定めがないことを明記した表現
+_AMOUNT = rf"(?:{_NUMBER}\s*万?\s*円|[一二三四五六七八九十百千万]+円|\d+\s*[かヶカケ箇]?月分|なし|無し|不要)"
+_MONTHS = r"\d+\s*(?:年|[かヶカケ箇]?月)"
+
+
+def _near(keyword: str, value: str, distance: int = 30) -> str:
+    """keyword の後ろ distance 文字以内（同じ文の中）に value があるか、value の直後に keyword がある（「3万円の敷金」）"""
+    return rf"(?:{keyword})[^。\n]{{0,{distance}}}?{value}|{value}[^。\n]{{0,4}}?(?:{keyword})"
+
+
+# 評価プロンプトの「評価項目」ごとの確認（ラベル, 正規表現）。項目の点数は満たした確認の割合
+SCREEN_RULES = {
+    "rental": {
+        "物件詳細情報の記載": (
+            ("物件の特定", r"物件|建物|居室|号室"),
+            ("所在地", r"所在地|所在|住所|[都道府県][^。\n]{0,12}?[市区町村郡]"),
+        ),
+        "賃料・敷金・礼金の明記": (
+            ("賃料の金額", _near("賃料|家賃", _AMOUNT)),
+            ("敷金の金額", _near("敷金|保証金", _AMOUNT)),
+            ("礼金の金額", _near("礼金", _AMOUNT)),
+        ),
+        "契約期間と更新条件": (
+            ("契約期間", _near("期間", rf"(?:{_MONTHS}|\d+年\d+月\d+日)", 40)),
+            ("更新条件", r"更新"),
+        ),
+        "修繕責任の明確化": (
+            ("修繕", r"修繕|修理"),
+        ),
+        "解約条件の適切性": (
+            ("解約・解除", r"解約|解除"),
+            ("解約の予告期間", rf"(?:{_MONTHS}|\d+日)[^。\n]{{0,4}}?前"),
+        ),
+    },
+    "service": {
+        "業務内容の具体的記載": (
+            ("業務内容", r"業務内容|委託業務|本業務|業務の内容"),
+        ),
+        "成果物・納期の明確化": (
+            ("成果物", r"成果物|納品物"),
+            ("納期", r"納期|納品|期日|期限"),
+        ),
+        "報酬額と支払方法": (
+            ("報酬の金額", _near("報酬|委託料|対価", _AMOUNT, 40)),
+            ("支払方法", r"支払|支払い|振込|振り込"),
+        ),
+        "知的財産権の取扱い": (
+            ("知的財産権", r"知的財産|著作権|特許"),
+        ),
+        "秘密保持義務": (
+            ("秘密保持", r"秘密保持|秘密情報|機密|守秘"),
+        ),
+    }
+}
+
+# メタデータの金額が本文に書かれているかを確認する項目（メタデータのキー, 表示名）
+SCREEN_AMOUNTS = {
+    "rental": (("rent", "賃料"), ("deposit", "敷金"), ("key_money", "礼金")),
+    "service": (("compensation", "報酬"),)
+}
+
+_COMPILED = {
+    contract_type: {item: tuple((label, re.compile(pattern)) for label, pattern in checks)
+                    for item, checks in rules.items()}
+    for contract_type, rules in SCREEN_RULES.items()
+}
+_YEN = re.compile(rf"({_NUMBER})\s*(万?)\s*円")
+
+
+def _to_number(text: str) -> float:
+    # float は全角数字も読める
+    return float(text.replace(",", "").replace("，", "").replace("．", "."))
+
+
+def _amounts_in(text: str) -> set:
+    """本文中の円建ての金額（「8万円」は80000として扱う）"""
+    amounts = set()
+    for number, man in _YEN.findall(text):
+        try:
+            value = _to_number(number)
+        except ValueError:
+            continue
+        amounts.add(round(value * 10000) if man else round(value))
+    return amounts
+
+
+def _metadata_amount(value: Any) -> Optional[int]:
+    """メタデータの金額（"80000"・"80,000円"・"8万円"）を円単位の整数に（読めなければ None）"""
+    match = re.fullmatch(rf"({_NUMBER})\s*(万?)\s*円?", str(value).strip())
+    if not match:
+        return None
+    value = _to_number(match.group(1))
+    return round(value * 10000) if match.group(2) else round(value)
+
+
+def screen_contract(contract_content: str, contract_type: str,
+                    metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """正規表現の表で評価項目の条項と金額の記載を確かめ、100点満点の部分点と振り分けを返す
+
+    LLMを呼ばず、1件あたり数百マイクロ秒以内で終わる。decision は
+    fail（PRESCREEN_FAIL_BELOW 未満）/ pass（PRESCREEN_PASS_AT 以上で金額の食い違いなし）/ borderline（それ以外）。
+    """
+    if contract_type not in _COMPILED:
+        raise ValueError(f"Unknown contract type: {contract_type}")
+    items = {}
+    missing = []
+    for item, checks in _COMPILED[contract_type].items():
+        results = {label: pattern.search(contract_content) is not None for label, pattern in checks}
+        items[item] = results
+        missing += [label for label, found in results.items() if not found]
+
+    # 0円（敷金なしなど）は本文に「なし」と書かれることが多いため確認しない
+    mismatches = []
+    found_amounts = None
+    for key, label in SCREEN_AMOUNTS[contract_type]:
+        expected = _metadata_amount((metadata or {}).get(key, ""))
+        if not expected:
+            continue
+        if found_amounts is None:
+            found_amounts = _amounts_in(contract_content)
+        if expected not in found_amounts:
+            mismatches.append(f"{label}（{expected:,}円）が本文に見当たらない")
+
+    score = round(100 * sum(sum(results.values()) / len(results) for results in items.values()) / len(items))
+    if score < PRESCREEN_FAIL_BELOW:
+        decision = "fail"
+    elif score >= PRESCREEN_PASS_AT and not mismatches:
+        decision = "pass"
+    else:
+        decision = "borderline"
+    return {
+        "score": score,
+        "decision": decision,
+        "items": items,
+        "missing": missing,
+        "amount_mismatches": mismatches
+    }
+
+
+def missing_items(screen: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+    """記載が確認できなかった評価項目と、その項目で満たしていない確認のラベル"""
+    return [(item, [label for label, found in results.items() if not found])
+            for item, results in screen["items"].items() if not all(results.values())]
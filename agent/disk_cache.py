@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """キャッシュキー（キー順に依存しないJSON表現のSHA-256）"""
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """ローカルディスク上のJSONキャッシュ
+
+    1エントリ1ファイルで保存し、有効期限（TTL）と合計サイズの上限で古いものから削除する。
+    エントリは最終アクセスの古い順に管理し、書き込みのたびに先頭から削除対象の分だけを見るため、
+    削除の手間はエントリ数によらない。ヒット・ミスの回数はプロセス内で数える。
+    """
+
+    def __init__(self, cache_dir: str, ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        # キー -> (サイズ, 最終アクセス時刻)。最終アクセスの古い順に並べる。起動時に一度だけ走査する
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            stat = path.stat()
+            entries.append((path.stem, (stat.st_size, stat.st_mtime)))
+        self._entries = OrderedDict(sorted(entries, key=lambda item: item[1][1]))
+        self._total_bytes = sum(size for size, _ in self._entries.values())
+        with self._lock:
+            self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """値を返す（なければ、または期限切れなら None）"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            with self._lock:
+                self.misses += 1
+                self._forget(key)
+            return None
+
+        if self.ttl_seconds is not None and time.time() - entry['stored_at'] > self.ttl_seconds:
+            with self._lock:
+                self.misses += 1
+                self._delete(key)
+            return None
+
+        # 最終アクセス時刻を更新し、サイズ超過時はアクセスの古い順に削除する
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries[key] = (self._entries[key][0], now)
+                self._entries.move_to_end(key)
+        return entry['value']
+
+    def set(self, key: str, value: Any):
+        """値を保存する（一時ファイルに書いてから置き換える）"""
+        data = json.dumps({'stored_at': time.time(), 'value': value}, ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+
+        size = os.path.getsize(self._path(key))
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (size, time.time())
+            self._total_bytes += size
+            self._evict()
+
+    def _forget(self, key: str):
+        """管理情報からのみ削除（ロック取得済みで呼ぶこと）"""
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key)[0]
+
+    def _delete(self, key: str):
+        """ファイルごと削除（ロック取得済みで呼ぶこと）"""
+        self._forget(key)
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """期限切れと容量超過のエントリを最終アクセスの古い順に削除（ロック取得済みで呼ぶこと）
+
+        アクセス時刻が期限より古ければ保存時刻も必ず期限切れのため、先頭から期限内のエントリに
+        当たるまで削除すればよい。最近アクセスされたが保存時刻が期限切れのものは get で削除する。
+        """
+        now = time.time()
+        while self._entries:
+            key, (_, accessed_at) = next(iter(self._entries.items()))
+            expired = self.ttl_seconds is not None and now - accessed_at > self.ttl_seconds
+            over = self.max_bytes is not None and self._total_bytes > self.max_bytes
+            if not (expired or over):
+                break
+            self._delete(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -1,176 +1,183 @@
 # -*- coding: utf-8 -*-
 import os
-from openai import OpenAI
-from typing import Dict, Any
+import threading
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from typing import Dict, Any, Iterator, AsyncIterator, Optional, Union
 import requests
 import json
 from datetime import datetime
 import uuid
 import base64
+import unicodedata
+
+from .disk_cache import DiskCache, cache_key
+from .telemetry import get_exporter
+from .metrics import stage_timer, openai_call, record_usage
+
+MODEL = "gpt-3.5-turbo"
+TEMPERATURE = 0.2
+
+# プロンプトテンプレートを変更したら上げる（生成キャッシュのキーに含まれる）
+PROMPT_TEMPLATE_VERSION = 1
+
+SYSTEM_PROMPTS = {
+    "rental": "あなたは日本の不動産法に精通した法務専門家です。正確で法的に有効な賃貸契約書を作成してください。",
+    "service": "あなたは日本の契約法に精通した法務専門家です。正確で法的に有効な業務委託契約書を作成してください。"
+}
+
+# メトリクスのコンポーネント名
+METRICS_COMPONENT = "generator"
+
+CONTRACT_LABELS = {
+    "rental": "賃貸契約書",
+    "service": "業務委託契約書"
+}
+
+# 非同期クライアントの同時接続数（同時生成数の上限）
+ASYNC_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_TIMEOUT_SECONDS = 120.0
+
+# 起動時のLangFuseプロジェクト問い合わせのタイムアウト
+LANGFUSE_DISCOVERY_TIMEOUT_SECONDS = float(os.getenv("LANGFUSE_DISCOVERY_TIMEOUT_SECONDS", "5"))
+
+def generation_cache_from_env() -> Optional[DiskCache]:
+    """環境変数 GENERATION_CACHE_ENABLED=true のときだけ生成キャッシュを作る"""
+    if os.getenv("GENERATION_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    return DiskCache(
+        os.getenv("GENERATION_CACHE_DIR", ".cache/generations"),
+        ttl_seconds=float(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+        max_bytes=int(float(os.getenv("GENERATION_CACHE_MAX_MB", "100")) * 1024 * 1024)
+    )
+
+def normalize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """キャッシュキー用に入力を正規化する（全角半角・前後空白の揺れを吸収）"""
+    normalized = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = " ".join(unicodedata.normalize("NFKC", value).split())
+            if not value:
+                continue
+        normalized[key] = value
+    return normalized
 
 class DocumentAgent:
-    def __init__(self):
+    def __init__(self, cache: Optional[DiskCache] = None):
         # OpenAI APIキーの確認
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key or api_key == "your_openai_api_key_here":
             raise ValueError("OPENAI_API_KEY環境変数を設定してください。")
         
+        self._api_key = api_key
         self.client = OpenAI(api_key=api_key)
+        self._async_client = None
         
-        # LangFuse設定
+        # 生成キャッシュ（オプトイン）
+        self.cache = cache if cache is not None else generation_cache_from_env()
+        
+        # LangFuse設定（送信は共通のエクスポーターがまとめて行う）
+        self.telemetry = get_exporter()
         self.langfuse_public_key = os.getenv("LANGFUSE_PUBLIC_KEY")
         self.langfuse_secret_key = os.getenv("LANGFUSE_SECRET_KEY")
         self.langfuse_host = os.getenv("LANGFUSE_HOST", "http://localhost:3000")
         
-        # プロジェクトIDを取得
+        # キーが設定されていればトレースを記録する。LangFuseに接続できなくても
+        # イベントはローカルに保存され、復旧後に再送されるため無効にはしない
+        self.langfuse_enabled = self.telemetry.enabled
+        
+        # プロジェクトIDを取得（表示用）。起動を待たせないようバックグラウンドで問い合わせる
         self.project_id = None
         
-        if self.langfuse_public_key and self.langfuse_secret_key:
-            try:
-                # 認証ヘッダー作成
-                auth_string = f"{self.langfuse_public_key}:{self.langfuse_secret_key}"
-                auth_bytes = auth_string.encode('ascii')
-                auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-                self.auth_header = f"Basic {auth_b64}"
-                
-                # プロジェクト情報を取得
-                headers = {
-                    "Authorization": self.auth_header,
-                    "Content-Type": "application/json"
-                }
-                
-                response = requests.get(f"{self.langfuse_host}/api/public/projects", headers=headers)
-                
-                if response.status_code == 200:
-                    projects = response.json()
-                    if projects.get("data") and len(projects["data"]) > 0:
-                        self.project_id = projects["data"][0]["id"]
-                        project_name = projects["data"][0]["name"]
-                        
-                        print(f"✅ LangFuse接続成功")
-                        print(f"📊 プロジェクト: {project_name} (ID: {self.project_id})")
-                        
-                        self.langfuse_enabled = True
-                    else:
-                        print("⚠️ プロジェクトが見つかりません")
-                        self.langfuse_enabled = False
-                else:
-                    print(f"⚠️ LangFuse認証失敗: {response.status_code}")
-                    self.langfuse_enabled = False
-                    
-            except Exception as e:
-                print(f"⚠️ LangFuse初期化エラー: {e}")
-                self.langfuse_enabled = False
+        if self.langfuse_enabled:
+            # 認証ヘッダー作成
+            auth_string = f"{self.langfuse_public_key}:{self.langfuse_secret_key}"
+            auth_bytes = auth_string.encode('ascii')
+            auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
+            self.auth_header = f"Basic {auth_b64}"
+            
+            threading.Thread(target=self._discover_project, name="langfuse-discovery", daemon=True).start()
         else:
             print("⚠️ LangFuse設定不完全")
-            self.langfuse_enabled = False
     
-    def _create_langfuse_trace(self, name: str, metadata: Dict):
-        """LangFuseにトレースを作成"""
-        if not self.langfuse_enabled:
-            return None
-            
-        trace_id = str(uuid.uuid4())
-        
+    def _discover_project(self):
+        """LangFuseのプロジェクト情報を取得（タイムアウト付き、失敗してもトレースは続ける）"""
         try:
             headers = {
                 "Authorization": self.auth_header,
                 "Content-Type": "application/json"
             }
             
-            # LangFuse 2.95の正確なAPI形式
-            trace_data = {
-                "id": trace_id,
-                "name": name,
-                "userId": "system",
-                "metadata": metadata,
-                "public": False,
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            }
-            
-            response = requests.post(
-                f"{self.langfuse_host}/api/public/traces",
+            response = requests.get(
+                f"{self.langfuse_host}/api/public/projects",
                 headers=headers,
-                json=trace_data
+                timeout=LANGFUSE_DISCOVERY_TIMEOUT_SECONDS
             )
             
-            if response.status_code in [200, 201]:
-                print(f"✅ トレース作成成功: {trace_id}")
-                return trace_id
+            if response.status_code == 200:
+                projects = response.json()
+                if projects.get("data") and len(projects["data"]) > 0:
+                    self.project_id = projects["data"][0]["id"]
+                    project_name = projects["data"][0]["name"]
+                    
+                    print(f"✅ LangFuse接続成功")
+                    print(f"📊 プロジェクト: {project_name} (ID: {self.project_id})")
+                else:
+                    print("⚠️ プロジェクトが見つかりません")
             else:
-                print(f"⚠️ トレース作成失敗: {response.status_code}")
-                print(f"📥 エラー詳細: {response.text}")
-                return None
+                print(f"⚠️ LangFuse認証失敗: {response.status_code}")
                 
         except Exception as e:
-            print(f"⚠️ トレース作成エラー: {e}")
+            print(f"⚠️ LangFuseに接続できません（トレースはローカルに保存し、復旧後に送信します）: {e}")
+    
+    def _create_langfuse_trace(self, name: str, metadata: Dict):
+        """LangFuseにトレースを作成（送信はバックグラウンドで行い、待たない）"""
+        if not self.langfuse_enabled:
             return None
+            
+        trace_id = str(uuid.uuid4())
+        with stage_timer(METRICS_COMPONENT, "telemetry_export"):
+            self.telemetry.trace(
+                trace_id,
+                name,
+                userId="system",
+                metadata=metadata,
+                public=False
+            )
+        return trace_id
     
     def _create_langfuse_generation(self, trace_id: str, name: str, model: str, input_data: str, output_data: str, usage: Dict):
-        """LangFuseにgenerationを作成"""
+        """LangFuseにgenerationを作成（送信はバックグラウンドで行い、待たない）"""
         if not self.langfuse_enabled or not trace_id:
             return None
             
         generation_id = str(uuid.uuid4())
-        
-        try:
-            headers = {
-                "Authorization": self.auth_header,
-                "Content-Type": "application/json"
-            }
-            
-            # LangFuseのgeneration API形式
-            generation_data = {
-                "id": generation_id,
-                "traceId": trace_id,
-                "name": name,
-                "startTime": datetime.utcnow().isoformat() + "Z",
-                "endTime": datetime.utcnow().isoformat() + "Z",
-                "model": model,
-                "input": input_data,
-                "output": output_data,
-                "usage": {
+        now = datetime.utcnow().isoformat() + "Z"
+        with stage_timer(METRICS_COMPONENT, "telemetry_export"):
+            self.telemetry.generation(
+                trace_id,
+                generation_id,
+                name,
+                startTime=now,
+                endTime=now,
+                model=model,
+                input=input_data,
+                output=output_data,
+                usage={
                     "promptTokens": usage.get("promptTokens", 0),
                     "completionTokens": usage.get("completionTokens", 0),
                     "totalTokens": usage.get("totalTokens", 0)
                 },
-                "metadata": {}
-            }
-            
-            response = requests.post(
-                f"{self.langfuse_host}/api/public/generations",
-                headers=headers,
-                json=generation_data
+                metadata={}
             )
-            
-            if response.status_code in [200, 201]:
-                print(f"✅ Generation作成成功: {generation_id}")
-                print(f"🔗 トレースURL: {self.langfuse_host}/trace/{trace_id}")
-                return generation_id
-            else:
-                print(f"⚠️ Generation作成失敗: {response.status_code}")
-                print(f"📥 エラー詳細: {response.text}")
-                return None
-                
-        except Exception as e:
-            print(f"⚠️ Generation作成エラー: {e}")
-            return None
+        print(f"🔗 トレースURL: {self.langfuse_host}/trace/{trace_id}")
+        return generation_id
     
-    def generate_rental_contract(self, params: Dict[str, Any]) -> str:
-        """賃貸契約書を生成"""
-        
-        print("📊 賃貸契約書生成開始")
-        
-        # LangFuseトレース作成
-        trace_id = self._create_langfuse_trace(
-            "rental_contract_generation",
-            {
-                "contract_type": "rental",
-                "params": params
-            }
-        )
-        
-        prompt = f"""
+    def _build_rental_prompt(self, params: Dict[str, Any]) -> str:
+        """賃貸契約書生成用プロンプト"""
+        return f"""
         以下の条件で賃貸契約書を作成してください：
         
         物件情報：
@@ -189,95 +196,319 @@ class DocumentAgent:
         
         日本の法律に準拠した正式な賃貸契約書として作成してください。
         """
+    
+    def _build_service_prompt(self, params: Dict[str, Any]) -> str:
+        """業務委託契約書生成用プロンプト"""
+        return f"""
+        以下の条件で業務委託契約書を作成してください：
         
-        # OpenAI API呼び出し
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "あなたは日本の不動産法に精通した法務専門家です。正確で法的に有効な賃貸契約書を作成してください。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2
+        委託業務：
+        - 業務内容: {params.get('service_description', '未指定')}
+        - 委託期間: {params.get('period', '6ヶ月')}
+        - 報酬: {params.get('compensation', '未指定')}
+        - 支払条件: {params.get('payment_terms', '月末締め翌月末支払い')}
+        
+        委託者情報：
+        - 会社名: {params.get('client_company', '株式会社サンプル')}
+        - 代表者: {params.get('client_representative', '山田一郎')}
+        
+        受託者情報：
+        - 氏名/会社名: {params.get('contractor_name', '鈴木二郎')}
+        
+        日本の法律に準拠した正式な業務委託契約書として作成してください。
+        """
+    
+    def _build_messages(self, contract_type: str, prompt: str) -> list:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPTS[contract_type]},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _usage_dict(self, usage) -> Dict[str, int]:
+        return {
+            "promptTokens": usage.prompt_tokens if usage else 0,
+            "completionTokens": usage.completion_tokens if usage else 0,
+            "totalTokens": usage.total_tokens if usage else 0
+        }
+    
+    def _get_async_client(self) -> AsyncOpenAI:
+        """接続プールを共有する非同期クライアント（初回利用時に生成）"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=ASYNC_MAX_CONNECTIONS,
+                        max_keepalive_connections=ASYNC_MAX_CONNECTIONS
+                    ),
+                    timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS)
+                )
+            )
+        return self._async_client
+    
+    def _cache_key(self, contract_type: str, params: Dict[str, Any]) -> Optional[str]:
+        """生成結果を決める要素（モデル・テンプレート版数・正規化した入力）のハッシュ"""
+        if self.cache is None:
+            return None
+        return cache_key({
+            "model": MODEL,
+            "temperature": TEMPERATURE,
+            "template_version": PROMPT_TEMPLATE_VERSION,
+            "contract_type": contract_type,
+            "params": normalize_params(params)
+        })
+    
+    def _cache_lookup(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        with stage_timer(METRICS_COMPONENT, "cache_lookup"):
+            cached = self.cache.get(key)
+        if cached is not None:
+            print("♻️ 生成キャッシュヒット（OpenAI呼び出しを省略）")
+        return cached
+    
+    def _cache_store(self, key: Optional[str], result: str):
+        if key is not None and result:
+            with stage_timer(METRICS_COMPONENT, "storage_write"):
+                self.cache.set(key, result)
+    
+    def _generate(self, contract_type: str, params: Dict[str, Any]) -> str:
+        """契約書を生成（同期版）"""
+        return self.generate_with_usage(contract_type, params)["content"]
+    
+    def generate_with_usage(self, contract_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """契約書を生成し、本文・トークン使用量・キャッシュヒットの有無を返す（同期版）"""
+        label = CONTRACT_LABELS[contract_type]
+        print(f"📊 {label}生成開始")
+        
+        key = self._cache_key(contract_type, params)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            return {"content": cached, "usage": self._usage_dict(None), "cached": True}
+        
+        # LangFuseトレース作成
+        trace_id = self._create_langfuse_trace(
+            f"{contract_type}_contract_generation",
+            {
+                "contract_type": contract_type,
+                "params": params
+            }
         )
         
+        prompt = self._build_prompt(contract_type, params)
+        
+        # OpenAI API呼び出し
+        with openai_call(METRICS_COMPONENT, MODEL):
+            response = self.client.chat.completions.create(
+                model=MODEL,
+                messages=self._build_messages(contract_type, prompt),
+                temperature=TEMPERATURE
+            )
+        record_usage(METRICS_COMPONENT, MODEL, response.usage)
+        
         result = response.choices[0].message.content
+        usage = self._usage_dict(response.usage)
         
         # LangFuseにgeneration記録
         if trace_id:
             self._create_langfuse_generation(
                 trace_id,
-                "openai_rental_contract",
-                "gpt-3.5-turbo",
+                f"openai_{contract_type}_contract",
+                MODEL,
                 prompt,
                 result,
-                {
-                    "promptTokens": response.usage.prompt_tokens if response.usage else 0,
-                    "completionTokens": response.usage.completion_tokens if response.usage else 0,
-                    "totalTokens": response.usage.total_tokens if response.usage else 0
-                }
+                usage
             )
         
-        print("✅ 賃貸契約書生成完了")
-        return result
+        self._cache_store(key, result)
+        print(f"✅ {label}生成完了")
+        return {"content": result, "usage": usage, "cached": False}
     
-    def generate_service_contract(self, params: Dict[str, Any]) -> str:
-        """業務委託契約書を生成"""
+    async def _agenerate(self, contract_type: str, params: Dict[str, Any]) -> str:
+        """契約書を生成（非同期版）。イベントループを塞がないようにOpenAI呼び出しをawaitする"""
+        label = CONTRACT_LABELS[contract_type]
+        print(f"📊 {label}生成開始")
         
-        print("📊 業務委託契約書生成開始")
+        key = self._cache_key(contract_type, params)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            return cached
         
-        # LangFuseトレース作成
         trace_id = self._create_langfuse_trace(
-            "service_contract_generation",
+            f"{contract_type}_contract_generation",
             {
-                "contract_type": "service",
+                "contract_type": contract_type,
                 "params": params
             }
         )
         
-        prompt = f"""
-        以下の条件で業務委託契約書を作成してください：
+        prompt = self._build_prompt(contract_type, params)
         
-        委託業務：
-        - 業務内容: {params.get('service_description', '未指定')}
-        - 委託期間: {params.get('period', '6ヶ月')}
-        - 報酬: {params.get('compensation', '未指定')}
-        - 支払条件: {params.get('payment_terms', '月末締め翌月末支払い')}
+        with openai_call(METRICS_COMPONENT, MODEL):
+            response = await self._get_async_client().chat.completions.create(
+                model=MODEL,
+                messages=self._build_messages(contract_type, prompt),
+                temperature=TEMPERATURE
+            )
+        record_usage(METRICS_COMPONENT, MODEL, response.usage)
         
-        委託者情報：
-        - 会社名: {params.get('client_company', '株式会社サンプル')}
-        - 代表者: {params.get('client_representative', '山田一郎')}
+        result = response.choices[0].message.content
         
-        受託者情報：
-        - 氏名/会社名: {params.get('contractor_name', '鈴木二郎')}
+        if trace_id:
+            self._create_langfuse_generation(
+                trace_id,
+                f"openai_{contract_type}_contract",
+                MODEL,
+                prompt,
+                result,
+                self._usage_dict(response.usage)
+            )
         
-        日本の法律に準拠した正式な業務委託契約書として作成してください。
-        """
+        self._cache_store(key, result)
+        print(f"✅ {label}生成完了")
+        return result
+    
+    def _generate_stream(self, contract_type: str, params: Dict[str, Any]) -> Iterator[str]:
+        """契約書を生成し、トークンを受信した順に返す（同期版）"""
+        label = CONTRACT_LABELS[contract_type]
+        print(f"📊 {label}生成開始（ストリーミング）")
         
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "あなたは日本の契約法に精通した法務専門家です。正確で法的に有効な業務委託契約書を作成してください。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2
+        key = self._cache_key(contract_type, params)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        trace_id = self._create_langfuse_trace(
+            f"{contract_type}_contract_generation",
+            {
+                "contract_type": contract_type,
+                "params": params,
+                "stream": True
+            }
         )
         
-        result = response.choices[0].message.content
+        prompt = self._build_prompt(contract_type, params)
+        
+        chunks = []
+        usage = None
+        with openai_call(METRICS_COMPONENT, MODEL):
+            stream = self.client.chat.completions.create(
+                model=MODEL,
+                messages=self._build_messages(contract_type, prompt),
+                temperature=TEMPERATURE,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            
+            for chunk in stream:
+                # 使用量は最後のチャンクにのみ含まれる
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        record_usage(METRICS_COMPONENT, MODEL, usage)
         
-        # LangFuseにgeneration記録
         if trace_id:
             self._create_langfuse_generation(
                 trace_id,
-                "openai_service_contract",
-                "gpt-3.5-turbo",
+                f"openai_{contract_type}_contract",
+                MODEL,
                 prompt,
-                result,
-                {
-                    "promptTokens": response.usage.prompt_tokens if response.usage else 0,
-                    "completionTokens": response.usage.completion_tokens if response.usage else 0,
-                    "totalTokens": response.usage.total_tokens if response.usage else 0
-                }
+                "".join(chunks),
+                self._usage_dict(usage)
             )
         
-        print("✅ 業務委託契約書生成完了")
-        return result
\ No newline at end of file
+        self._cache_store(key, "".join(chunks))
+        print(f"✅ {label}生成完了")
+    
+    async def _agenerate_stream(self, contract_type: str, params: Dict[str, Any]) -> AsyncIterator[str]:
+        """契約書を生成し、トークンを受信した順に返す（非同期版）"""
+        label = CONTRACT_LABELS[contract_type]
+        print(f"📊 {label}生成開始（ストリーミング）")
+        
+        key = self._cache_key(contract_type, params)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        trace_id = self._create_langfuse_trace(
+            f"{contract_type}_contract_generation",
+            {
+                "contract_type": contract_type,
+                "params": params,
+                "stream": True
+            }
+        )
+        
+        prompt = self._build_prompt(contract_type, params)
+        
+        chunks = []
+        usage = None
+        with openai_call(METRICS_COMPONENT, MODEL):
+            stream = await self._get_async_client().chat.completions.create(
+                model=MODEL,
+                messages=self._build_messages(contract_type, prompt),
+                temperature=TEMPERATURE,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        record_usage(METRICS_COMPONENT, MODEL, usage)
+        
+        if trace_id:
+            self._create_langfuse_generation(
+                trace_id,
+                f"openai_{contract_type}_contract",
+                MODEL,
+                prompt,
+                "".join(chunks),
+                self._usage_dict(usage)
+            )
+        
+        self._cache_store(key, "".join(chunks))
+        print(f"✅ {label}生成完了")
+    
+    def _build_prompt(self, contract_type: str, params: Dict[str, Any]) -> str:
+        with stage_timer(METRICS_COMPONENT, "prompt_build"):
+            if contract_type == "rental":
+                return self._build_rental_prompt(params)
+            return self._build_service_prompt(params)
+    
+    def generate_rental_contract(self, params: Dict[str, Any], stream: bool = False) -> Union[str, Iterator[str]]:
+        """賃貸契約書を生成（stream=True の場合はトークンのイテレータを返す）"""
+        if stream:
+            return self._generate_stream("rental", params)
+        return self._generate("rental", params)
+    
+    def generate_service_contract(self, params: Dict[str, Any], stream: bool = False) -> Union[str, Iterator[str]]:
+        """業務委託契約書を生成（stream=True の場合はトークンのイテレータを返す）"""
+        if stream:
+            return self._generate_stream("service", params)
+        return self._generate("service", params)
+    
+    async def agenerate_rental_contract(self, params: Dict[str, Any], stream: bool = False) -> Union[str, AsyncIterator[str]]:
+        """賃貸契約書を生成（非同期版。stream=True の場合は非同期イテレータを返す）"""
+        if stream:
+            return self._agenerate_stream("rental", params)
+        return await self._agenerate("rental", params)
+    
+    async def agenerate_service_contract(self, params: Dict[str, Any], stream: bool = False) -> Union[str, AsyncIterator[str]]:
+        """業務委託契約書を生成（非同期版。stream=True の場合は非同期イテレータを返す）"""
+        if stream:
+            return self._agenerate_stream("service", params)
+        return await self._agenerate("service", params)
+    
+    async def aclose(self):
+        """非同期クライアントの接続プールを閉じる"""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
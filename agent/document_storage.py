@@ -1,109 +1,671 @@
 # -*- coding: utf-8 -*-
 import os
 import json
-from datetime import datetime
-from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
+import base64
+import hashlib
+import secrets
+import tempfile
+import threading
+import itertools
+from typing import Dict, Any, Optional, List, Iterable, Iterator
 from pathlib import Path
 
+from .contract_catalog import ContractCatalog
+from .contract_archive import ContractArchive
+from .blob_store import BlobStore
+from .metrics import stage_timer
+from .storage_layout import StorageLayout, iter_files
+from .text_index import query_terms, is_exact_lookup, make_snippet
+
+def new_contract_id() -> str:
+    """契約書ID（時刻順に並び、同時刻でも衝突しない）"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{secrets.token_hex(3)}"
+
+def _write_temp(directory: Path, content: str) -> str:
+    """同じディレクトリに一時ファイルを書いてパスを返す"""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+def _write_atomic(path: Path, content: str):
+    """一時ファイル経由でファイルを置き換える"""
+    tmp_path = _write_temp(path.parent, content)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
 class DocumentStorage:
-    def __init__(self, base_dir: str = "contracts"):
+    def __init__(self, base_dir: str = "contracts", layout: Optional[str] = None):
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(exist_ok=True)
         self.rental_dir = self.base_dir / "rental"
         self.service_dir = self.base_dir / "service"
         self.rental_dir.mkdir(exist_ok=True)
         self.service_dir.mkdir(exist_ok=True)
+        self.layout = self._resolve_layout(layout or os.getenv("STORAGE_LAYOUT"))
+        # 古い契約書をまとめたアーカイブ（本文はカタログ経由で通常の契約書と同じように読める）
+        self.archive = ContractArchive(self.base_dir / "archive")
+        # 本文の内容アドレス保存（同じ本文は保存先に1つだけ持ち、契約書ごとの本文ファイルはその複製）
+        self.blobs = BlobStore(self.base_dir / "blobs")
         
-    def save_contract(self, contract_type: str, content: str, metadata: Dict[str, Any]) -> str:
-        """契約書を保存し、ファイルパスを返す"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        if contract_type == "rental":
-            directory = self.rental_dir
-            filename = f"rental_contract_{timestamp}.txt"
-        elif contract_type == "service":
-            directory = self.service_dir
-            filename = f"service_contract_{timestamp}.txt"
+        # 永続カタログ（初回作成時は既存ファイルから構築）
+        self.catalog = ContractCatalog(self.base_dir / "catalog.db")
+        # ファイル名 -> 契約書レコード（保存・削除と同期して更新する）
+        self._records = {}
+        self._records_lock = threading.Lock()
+        if self.catalog.created:
+            self.rebuild_catalog()
         else:
+            self._load_records()
+        if self.blobs.created:
+            # 参照の記録がない保存先（以前の版のハードリンクを含む）は既存の本文ファイルから作る
+            self.dedup_contracts()
+    
+    def _resolve_layout(self, requested: Optional[str]) -> StorageLayout:
+        """保存先に記録された配置を使う（空の保存先なら requested を記録する）
+
+        既存の契約書がある保存先の配置は migrate_layout でのみ変更する。
+        """
+        layout = StorageLayout.load(self.base_dir)
+        if layout is None:
+            is_empty = all(
+                next(StorageLayout().iter_contract_files(directory), None) is None
+                for directory in self._type_dirs().values()
+            )
+            layout = StorageLayout((requested or "flat") if is_empty else "flat")
+            layout.save(self.base_dir)
+        elif requested and layout.name != requested:
+            print(f"⚠️ 保存先の配置は {layout.name} です（STORAGE_LAYOUT={requested} は "
+                  f"`python main.py migrate-layout {requested}` で移行するまで使われません）")
+        return layout
+    
+    def _type_dirs(self) -> Dict[str, Path]:
+        return {"rental": self.rental_dir, "service": self.service_dir}
+    
+    def _contract_type_of(self, file_path: Path) -> Optional[str]:
+        """ファイルの置かれた種類ディレクトリ（シャードのサブディレクトリも含む）"""
+        for contract_type, directory in self._type_dirs().items():
+            if directory in file_path.parents:
+                return contract_type
+        return None
+    
+    def _load_records(self):
+        records = {Path(record['file_path']).name: record for record in self.catalog.list()}
+        with self._records_lock:
+            self._records = records
+        
+    def save_contract(self, contract_type: str, content: str, metadata: Dict[str, Any]) -> str:
+        """契約書を保存し、ファイルパスを返す
+
+        複数プロセスから同時に保存しても上書きしないよう、ファイル名は
+        マイクロ秒までの時刻とランダムな接尾辞で作り、既存ファイルがあれば作り直す。
+        本文・メタデータとも一時ファイルに書いてから置き換えるため、
+        読み手が書きかけのファイルを見ることはない。
+        本文ファイルは内容アドレスの保存先の本文の複製（reflink に対応したファイルシステムではブロックを共有する）にする。
+        所要時間はメトリクスの storage_write に記録する。
+        """
+        with stage_timer("storage", "storage_write"):
+            return self._save_contract(contract_type, content, metadata)
+    
+    def _save_contract(self, contract_type: str, content: str, metadata: Dict[str, Any]) -> str:
+        """save_contract の本体"""
+        directory = self._type_dirs().get(contract_type)
+        if directory is None:
             raise ValueError(f"Unknown contract type: {contract_type}")
-            
-        file_path = directory / filename
-        metadata_path = directory / f"{filename}.metadata.json"
         
-        # 契約書本文を保存
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-            
+        # 契約書本文を保存（同名のファイルがあれば別の名前で作り直す）
+        make_path = lambda: self.layout.path_for(directory, f"{contract_type}_contract_{new_contract_id()}.txt")
+        digest, file_path = self.blobs.copy_new(content.encode('utf-8'), make_path)
+        metadata_path = file_path.with_name(f"{file_path.name}.metadata.json")
+        
         # メタデータを保存
         metadata['created_at'] = datetime.now().isoformat()
         metadata['file_path'] = str(file_path)
         metadata['contract_type'] = contract_type
+        metadata['content_sha256'] = digest
+        
+        _write_atomic(metadata_path, json.dumps(metadata, ensure_ascii=False, indent=2))
         
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        # カタログに登録
+        self.catalog.upsert(contract_type, str(file_path), metadata, content, metadata_path.stat().st_mtime)
+        with self._records_lock:
+            self._records[file_path.name] = {'type': contract_type, 'file_path': str(file_path), 'metadata': metadata}
             
         return str(file_path)
     
-    def list_contracts(self, contract_type: str = None) -> list:
-        """保存された契約書一覧を取得"""
+    def get_contract(self, contract_id: str) -> Optional[Dict[str, Any]]:
+        """ファイル名（契約書ID）で契約書を1件返す（なければ None）
+
+        一覧を走査せずメモリ上の対応表から引く。他のワーカープロセスが保存した契約書は
+        カタログから読み込んで対応表に加える。カタログにもなければ配置から場所を求め、
+        ディスク上にあれば登録する。
+        """
+        with self._records_lock:
+            record = self._records.get(contract_id)
+        if record is not None and self._exists(record):
+            return dict(record)
+        
+        # 対応表にない、または他のプロセスで削除・アーカイブされた場合はカタログから読み直す
+        record = self.catalog.get(contract_id)
+        if record is None or not self._exists(record):
+            with self._records_lock:
+                self._records.pop(contract_id, None)
+            return self._locate(contract_id) if record is None else None
+        with self._records_lock:
+            self._records[contract_id] = record
+        return dict(record)
+    
+    def _exists(self, record: Dict[str, Any]) -> bool:
+        if record.get('archived'):
+            return Path(record['file_path']).name in self.archive
+        return os.path.exists(record['file_path'])
+    
+    def read_content(self, contract: Dict[str, Any]) -> str:
+        """契約書の本文（アーカイブ済みならセグメントから読む）"""
+        if contract.get('archived'):
+            return self.archive.read(Path(contract['file_path']).name)['content']
+        with open(contract['file_path'], 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    def _locate(self, contract_id: str) -> Optional[Dict[str, Any]]:
+        """カタログ未登録の契約書を配置から探して登録する（外部で置かれた直後など）"""
+        if Path(contract_id).name != contract_id or not contract_id.endswith(".txt"):
+            return None
+        for directory in self._type_dirs().values():
+            file_path = self.layout.path_for(directory, contract_id)
+            if file_path.exists() and self.sync_contract(str(file_path)) != 'removed':
+                with self._records_lock:
+                    record = self._records.get(contract_id)
+                return dict(record) if record else None
+        return None
+    
+    def sync_contract(self, file_path: str) -> str:
+        """ディスク上の1件の状態をカタログと対応表に反映する（外部で追加・変更・削除された場合用）
+
+        戻り値は 'added' / 'updated' / 'removed' / 'unchanged'。
+        メタデータのない本文は保存途中とみなし、登録しない。
+        """
+        file_path = Path(file_path)
+        contract_type = self._contract_type_of(file_path)
+        metadata_path = file_path.with_name(f"{file_path.name}.metadata.json")
+        previous = self.catalog.fingerprint(file_path.name)
+        
+        try:
+            metadata_mtime = metadata_path.stat().st_mtime
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            raw = file_path.read_bytes()
+        except (FileNotFoundError, ValueError):
+            metadata = None
+        
+        # 対応表は常にディスクの状態に合わせる（カタログは他のワーカーが反映済みの場合がある）
+        if metadata is None or contract_type is None:
+            with self._records_lock:
+                self._records.pop(file_path.name, None)
+            if previous is None:
+                return 'unchanged'
+            self.blobs.release([file_path.name])
+            if file_path.name in self.archive:
+                # アーカイブに移したため本文ファイルが消えた
+                self.catalog.mark_archived([file_path.name])
+                return 'unchanged'
+            self.catalog.remove(file_path.name)
+            return 'removed'
+        
+        with self._records_lock:
+            self._records[file_path.name] = {'type': contract_type, 'file_path': str(file_path), 'metadata': metadata}
+        
+        try:
+            content = raw.decode('utf-8')
+        except UnicodeDecodeError:
+            # 読めない本文はメタデータのみ索引する（_scan_directories と同じ扱い）
+            content = ""
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        if previous == (metadata_mtime, digest):
+            return 'unchanged'
+        
+        # 外部で追加・編集された本文も保存先に入れ、参照を付け替える（本文ファイルは契約書ごとに別なので他には影響しない）
+        self.blobs.retain(file_path.name, raw)
+        
+        self.catalog.upsert(contract_type, str(file_path), metadata, content, metadata_mtime)
+        return 'added' if previous is None else 'updated'
+    
+    def delete_contract(self, contract_id: str) -> bool:
+        """契約書とメタデータを削除する（存在しなければ False）"""
+        record = self.get_contract(contract_id)
+        if record is None:
+            return False
+        for path in (record['file_path'], f"{record['file_path']}.metadata.json"):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        if contract_id in self.archive:
+            self.archive.discard(contract_id)
+        self.blobs.release([contract_id])
+        self.catalog.remove(contract_id)
+        with self._records_lock:
+            self._records.pop(contract_id, None)
+        return True
+    
+    def archive_contracts(self, older_than_days: int, batch_size: int = 1000, progress=None) -> Dict[str, int]:
+        """作成から older_than_days 日より前の契約書をアーカイブに移す
+
+        セグメントへの書き込みが完了してからカタログをアーカイブ済みにし、最後に元のファイルを消す。
+        途中で止まった場合は元のファイルが残り、次回もう一度アーカイブされる（後の方が使われる）。
+        progress にはアーカイブ済み件数を渡して呼ぶ。
+        """
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).date().isoformat()
+        candidates = [
+            contract for contract in self.catalog.list(archived=False)
+            if contract['metadata'].get('created_at', '')[:10] < cutoff
+        ]
+        archived = 0
+        original_bytes = 0
+        packed_bytes = 0
+        for start in range(0, len(candidates), batch_size):
+            records = []
+            paths = []
+            for contract in candidates[start:start + batch_size]:
+                file_path = Path(contract['file_path'])
+                metadata_path = file_path.with_name(f"{file_path.name}.metadata.json")
+                try:
+                    content = file_path.read_text(encoding='utf-8')
+                    original_bytes += file_path.stat().st_size + metadata_path.stat().st_size
+                except (FileNotFoundError, UnicodeDecodeError):
+                    continue
+                records.append({
+                    'file_name': file_path.name,
+                    'contract_type': contract['type'],
+                    'metadata': contract['metadata'],
+                    'content': content
+                })
+                paths.extend([file_path, metadata_path])
+            if not records:
+                continue
+            
+            packed_bytes += self.archive.append(records)
+            names = [record['file_name'] for record in records]
+            self.catalog.mark_archived(names)
+            self.blobs.release(names)
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            with self._records_lock:
+                for name in names:
+                    if name in self._records:
+                        self._records[name] = dict(self._records[name], archived=True)
+            archived += len(records)
+            if progress:
+                progress(archived)
+        
+        return {'archived': archived, 'original_bytes': original_bytes, 'packed_bytes': packed_bytes}
+    
+    def dedup_contracts(self, progress=None) -> Dict[str, int]:
+        """既存の本文ファイルを内容アドレスの保存先にまとめ、参照を記録し直す
+
+        以前の版で保存先の本文とハードリンクで inode を共有していた本文ファイルは、契約書ごとの複製に置き換える。
+        参照は本文ファイルの現在の内容で作り直すため、保存・削除と同時に実行しないこと。
+        """
+        refs = []
+        digests = set()
+        privatized = 0
+        for directory in self._type_dirs().values():
+            for file_path in self.layout.iter_contract_files(directory):
+                if self.blobs.privatize(file_path):
+                    privatized += 1
+                digest, _ = self.blobs.put(file_path.read_bytes())
+                refs.append((file_path.name, digest))
+                digests.add(digest)
+                if progress and len(refs) % 1000 == 0:
+                    progress(len(refs))
+        self.blobs.replace_refs(refs)
+        return {'checked': len(refs), 'deduplicated': len(refs) - len(digests), 'privatized': privatized}
+    
+    def verify_contents(self) -> Dict[str, list]:
+        """本文を読み直してハッシュを確かめる
+
+        corrupted: 内容がファイル名のハッシュと一致しない本文（保存先の破損）
+        modified:  メタデータの content_sha256 と本文が一致しない契約書（外部での編集を含む）
+        """
+        report = self.blobs.verify()
+        modified = []
+        for contract in self.catalog.list():
+            expected = contract['metadata'].get('content_sha256')
+            if not expected:
+                continue
+            try:
+                content = self.read_content(contract)
+            except (IOError, UnicodeDecodeError):
+                continue
+            if hashlib.sha256(content.encode('utf-8')).hexdigest() != expected:
+                modified.append(Path(contract['file_path']).name)
+        report['modified'] = sorted(modified)
+        return report
+    
+    def _scan_directories(self, contract_type: str = None) -> list:
+        """ディレクトリを走査して契約書とメタデータを読み込む"""
         contracts = []
         
-        directories = []
-        if contract_type == "rental" or contract_type is None:
-            directories.append(("rental", self.rental_dir))
-        if contract_type == "service" or contract_type is None:
-            directories.append(("service", self.service_dir))
+        directories = [
+            (ctype, directory) for ctype, directory in self._type_dirs().items()
+            if contract_type is None or contract_type == ctype
+        ]
             
         for ctype, directory in directories:
-            for file_path in directory.glob("*.txt"):
+            for file_path in self.layout.iter_contract_files(directory):
                 metadata_path = file_path.with_suffix(".txt.metadata.json")
                 if metadata_path.exists():
                     with open(metadata_path, 'r', encoding='utf-8') as f:
                         metadata = json.load(f)
+                    try:
+                        content = file_path.read_text(encoding='utf-8')
+                    except (IOError, UnicodeDecodeError):
+                        # 読めない本文はメタデータのみ索引する
+                        content = ""
                     contracts.append({
                         'type': ctype,
                         'file_path': str(file_path),
-                        'metadata': metadata
+                        'metadata': metadata,
+                        'content': content,
+                        'metadata_mtime': metadata_path.stat().st_mtime
                     })
+        
+        # アーカイブ済みの契約書（同じ名前の本文ファイルが残っていればそちらを使う）
+        # パスは保存先の配置から組み立てる（メタデータの file_path は保存時の値で、別の環境のパスのこともある）
+        hot = {Path(contract['file_path']).name for contract in contracts}
+        type_dirs = self._type_dirs()
+        for record in self.archive.iter_records():
+            if record['file_name'] in hot or (contract_type and record['contract_type'] != contract_type):
+                continue
+            file_path = self.layout.path_for(type_dirs[record['contract_type']], record['file_name'],
+                                             record['metadata'].get('created_at'))
+            contracts.append({
+                'type': record['contract_type'],
+                'file_path': str(file_path),
+                'metadata': record['metadata'],
+                'content': record['content'],
+                'metadata_mtime': 0,
+                'archived': True
+            })
                     
-        return sorted(contracts, key=lambda x: x['metadata']['created_at'], reverse=True)
+        return contracts
     
-    def search_contracts(self, query: str = None, contract_type: str = None, date_from: str = None, date_to: str = None) -> list:
-        """契約書を検索する"""
-        contracts = self.list_contracts(contract_type)
-        
-        if not query and not date_from and not date_to:
-            return contracts
-            
-        filtered_contracts = []
-        
-        for contract in contracts:
-            # 日付フィルタリング
-            if date_from or date_to:
-                contract_date = contract['metadata']['created_at'][:10]  # YYYY-MM-DD形式
-                if date_from and contract_date < date_from:
-                    continue
-                if date_to and contract_date > date_to:
+    def rebuild_catalog(self) -> int:
+        """既存ディレクトリからカタログを再構築し、登録件数を返す"""
+        contracts = self._scan_directories()
+        self.catalog.replace_all(contracts)
+        self.blobs.prune(Path(contract['file_path']).name for contract in contracts if not contract.get('archived'))
+        self._load_records()
+        return len(contracts)
+    
+    def migrate_layout(self, layout: str, batch_size: int = 500, progress=None) -> Dict[str, int]:
+        """契約書を別の配置へ移し、カタログのパスを更新する
+
+        1件ずつ「移動先にメタデータを書く → 本文を移す → 元のメタデータを消す」の順で移すため、
+        途中で止まってもやり直せば続きから移行できる（移行中は保存・削除を行わないこと）。
+        progress には移行済み件数を渡して呼ぶ。
+        """
+        target = StorageLayout(layout)
+        moved = 0
+        skipped = 0
+        moves = []
+        for directory in self._type_dirs().values():
+            for metadata_path in [Path(entry.path) for entry in iter_files(directory)
+                                  if entry.name.endswith(".txt.metadata.json")]:
+                file_path = metadata_path.with_name(metadata_path.name[:-len(".metadata.json")])
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+                new_path = target.path_for(directory, file_path.name, metadata.get('created_at'))
+                if new_path == file_path:
+                    skipped += 1
                     continue
-            
-            # キーワード検索
-            if query:
-                query_lower = query.lower()
-                # ファイル内容を検索
-                try:
-                    with open(contract['file_path'], 'r', encoding='utf-8') as f:
-                        content = f.read().lower()
-                    
-                    # メタデータも検索対象に含める
-                    metadata_text = json.dumps(contract['metadata'], ensure_ascii=False).lower()
-                    
-                    if query_lower in content or query_lower in metadata_text:
-                        filtered_contracts.append(contract)
-                        
-                except (IOError, UnicodeDecodeError):
-                    # ファイル読み込みエラーの場合はスキップ
+                if not file_path.exists():
+                    # 前回の移行で本文だけ移した後に止まった場合の残り
+                    if new_path.exists():
+                        metadata_path.unlink()
                     continue
-            else:
-                filtered_contracts.append(contract)
                 
-        return filtered_contracts
\ No newline at end of file
+                new_path.parent.mkdir(parents=True, exist_ok=True)
+                new_metadata_path = new_path.with_name(metadata_path.name)
+                metadata['file_path'] = str(new_path)
+                _write_atomic(new_metadata_path, json.dumps(metadata, ensure_ascii=False, indent=2))
+                os.replace(file_path, new_path)
+                metadata_path.unlink()
+                moves.append({
+                    'file_path': str(new_path),
+                    'metadata': metadata,
+                    'metadata_mtime': new_metadata_path.stat().st_mtime
+                })
+                if len(moves) >= batch_size:
+                    self.catalog.relocate(moves)
+                    moved += len(moves)
+                    moves = []
+                    if progress:
+                        progress(moved)
+        
+        self.catalog.relocate(moves)
+        moved += len(moves)
+        target.save(self.base_dir)
+        self.layout = target
+        self._remove_empty_dirs()
+        self._load_records()
+        return {'moved': moved, 'skipped': skipped}
+    
+    def _remove_empty_dirs(self):
+        """移行後に空になったシャードのディレクトリを削除する"""
+        for directory in self._type_dirs().values():
+            for root, _, _ in sorted(os.walk(directory), key=lambda item: len(item[0]), reverse=True):
+                if Path(root) != directory:
+                    try:
+                        os.rmdir(root)
+                    except OSError:
+                        pass
+    
+    def verify_catalog(self) -> Dict[str, list]:
+        """カタログとディスク上のファイルの整合性を確認する"""
+        on_disk = {
+            Path(contract['file_path']).name: contract['metadata_mtime']
+            for contract in self._scan_directories()
+        }
+        cataloged = self.catalog.snapshot()
+        
+        return {
+            'missing': sorted(name for name in on_disk if name not in cataloged),
+            'orphaned': sorted(name for name in cataloged if name not in on_disk),
+            'stale': sorted(
+                name for name, mtime in on_disk.items()
+                if name in cataloged and cataloged[name] != mtime
+            )
+        }
+    
+    def list_contracts(self, contract_type: str = None) -> list:
+        """保存された契約書一覧を取得"""
+        return self.catalog.list(contract_type)
+    
+    def list_contracts_page(self, contract_type: str = None, limit: int = 50, cursor: str = None,
+                            fields: List[str] = None) -> Dict[str, Any]:
+        """保存された契約書一覧を1ページ分取得"""
+        return self.search_contracts_page(contract_type=contract_type, limit=limit, cursor=cursor, fields=fields)
+    
+    def search_contracts(self, query: str = None, contract_type: str = None, date_from: str = None, date_to: str = None,
+                         sort: str = "date", snippets: bool = False) -> list:
+        """契約書を検索する
+
+        sort="relevance" の場合はBM25スコアの降順（各結果に 'score' を付与）、
+        sort="date" の場合は作成日時の降順で返す。
+        snippets=True の場合は各結果に一致箇所の抜粋 'snippet' を付与する。
+        """
+        if sort not in ("relevance", "date"):
+            raise ValueError(f"Unknown sort order: {sort}")
+        
+        if not query:
+            return self.catalog.list(contract_type, date_from, date_to)
+        
+        # 転置索引で候補を絞り込む
+        candidates = self.catalog.find(
+            query_terms(query.lower()), contract_type, date_from, date_to,
+            rank=(sort == "relevance")
+        )
+        return list(self._filter_matches(candidates, query, snippets))
+    
+    def search_contracts_page(self, query: str = None, contract_type: str = None, date_from: str = None,
+                              date_to: str = None, sort: str = "date", snippets: bool = False,
+                              limit: int = 50, cursor: str = None, fields: List[str] = None) -> Dict[str, Any]:
+        """契約書を検索し、1ページ分の結果と次ページのカーソルを返す
+
+        日付順はカタログの (created_at, file_name) 索引をカーソル位置から辿るため、
+        後ろのページでも先頭から読み飛ばすことはない。
+        関連度順は全候補のスコアが必要なため、カーソルは順位のオフセットを保持する。
+        """
+        if sort not in ("relevance", "date"):
+            raise ValueError(f"Unknown sort order: {sort}")
+        if limit < 1:
+            raise ValueError(f"limit must be positive: {limit}")
+        position = decode_cursor(cursor)
+        
+        if query and sort == "relevance":
+            offset = position.get('offset', 0)
+            ranked = self.search_contracts(query, contract_type, date_from, date_to, sort="relevance")
+            page = ranked[offset:offset + limit + 1]
+            if snippets:
+                page = list(self._filter_matches(page, query, snippets=True))
+            next_position = {'offset': offset + limit}
+        else:
+            matches = self._iter_by_date(
+                query_terms(query.lower()) if query else [],
+                contract_type, date_from, date_to, position.get('after'), limit + 1
+            )
+            if query:
+                matches = self._filter_matches(matches, query, snippets)
+            page = list(itertools.islice(matches, limit + 1))
+            next_position = {'after': list(self._order_key(page[limit - 1]))} if len(page) > limit else None
+        
+        has_more = len(page) > limit
+        page = page[:limit]
+        if fields:
+            page = [project_fields(contract, fields) for contract in page]
+        
+        return {
+            'contracts': page,
+            'next_cursor': encode_cursor(next_position) if has_more else None
+        }
+    
+    def _iter_by_date(self, terms: List[str], contract_type: Optional[str], date_from: Optional[str],
+                      date_to: Optional[str], after: Optional[list], batch_size: int) -> Iterator[Dict[str, Any]]:
+        """作成日時の降順に候補をバッチ単位で読み出す"""
+        while True:
+            batch = self.catalog.find(
+                terms, contract_type, date_from, date_to,
+                after=tuple(after) if after else None, limit=batch_size
+            )
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = self._order_key(batch[-1])
+    
+    def _order_key(self, contract: Dict[str, Any]) -> tuple:
+        """カタログの並び順キー (created_at, file_name)"""
+        return (contract['metadata'].get('created_at', ''), Path(contract['file_path']).name)
+    
+    def _filter_matches(self, candidates: Iterable[Dict[str, Any]], query: str,
+                        snippets: bool) -> Iterator[Dict[str, Any]]:
+        """索引の候補から実際にクエリを部分一致で含むものだけを返す"""
+        query_lower = query.lower()
+        exact = is_exact_lookup(query_lower)
+        
+        for contract in candidates:
+            if exact and not snippets:
+                yield contract
+                continue
+            
+            # 長いクエリはn-gramの並びまでは保証されないため、候補のみ部分一致を確認する
+            # メタデータも検索対象に含める
+            metadata_text = json.dumps(contract['metadata'], ensure_ascii=False).lower()
+            metadata_match = query_lower in metadata_text
+            if metadata_match and not snippets:
+                yield contract
+                continue
+            
+            # ファイル内容を検索
+            try:
+                content = self.read_content(contract)
+            except (IOError, UnicodeDecodeError):
+                # ファイル読み込みエラーの場合はスキップ
+                content = None
+            
+            content_match = content is not None and query_lower in content.lower()
+            if not (content_match or metadata_match):
+                continue
+            
+            if snippets:
+                contract['snippet'] = self._build_snippet(contract, content, query, content_match)
+            yield contract
+    
+    def _build_snippet(self, contract: Dict[str, Any], content: Optional[str], query: str,
+                       content_match: bool) -> Dict[str, Any]:
+        """検索結果に表示する抜粋を作る（本文優先、なければ一致したメタデータ項目）"""
+        if content_match:
+            snippet = make_snippet(content, query)
+            snippet['field'] = 'content'
+            return snippet
+        
+        query_lower = query.lower()
+        for key, value in contract['metadata'].items():
+            if isinstance(value, str) and query_lower in value.lower():
+                snippet = make_snippet(value, query)
+                snippet['field'] = key
+                return snippet
+        
+        # キー名などJSON表現上でのみ一致した場合は本文の冒頭を返す
+        snippet = make_snippet(content or "", "")
+        snippet['field'] = 'content'
+        return snippet
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """ページ位置を不透明なカーソル文字列にする"""
+    raw = json.dumps(position, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: Optional[str]) -> Dict[str, Any]:
+    """カーソル文字列をページ位置に戻す"""
+    if not cursor:
+        return {}
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(position, dict):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    # 日付順は (created_at, file_name)、関連度順は0以上の順位
+    after = position.get('after')
+    if after is not None and not (isinstance(after, list) and len(after) == 2
+                                  and all(isinstance(value, str) for value in after)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    offset = position.get('offset', 0)
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position
+
+
+def project_fields(contract: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """指定したフィールドだけを残す（'metadata.rent' のようにメタデータの項目も指定可）"""
+    projected = {}
+    for field in fields:
+        if field.startswith('metadata.'):
+            key = field[len('metadata.'):]
+            if key in contract.get('metadata', {}):
+                projected.setdefault('metadata', {})[key] = contract['metadata'][key]
+        elif field in contract:
+            projected[field] = contract[field]
+    return projected
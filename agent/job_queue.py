@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows（単一プロセスでのみ使う）
+    fcntl = None
+
+# 完了・失敗したジョブのファイルを残す日数（0以下なら削除しない）
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+# 実行中のジョブの件数をジョブファイルに書き出す間隔（他のプロセスから見える進捗の遅れ）
+PROGRESS_SAVE_INTERVAL_SECONDS = float(os.getenv("JOB_PROGRESS_SAVE_INTERVAL_SECONDS", "1.0"))
+
+
+class EvaluationJobQueue:
+    """一括評価のバックグラウンドジョブ管理
+
+    ジョブごとに2つのファイルを jobs_dir に置く:
+      - <job_id>.json          ジョブ定義と状態（対象ファイル一覧など）
+      - <job_id>.results.jsonl 評価済み項目を1行1件で追記するログ
+    結果は1件ごとに追記するため、サーバーが再起動しても評価済みの項目は再評価せず、
+    未完了の項目だけを再開する。
+    進捗の件数（counts）はジョブ定義に書き出すため、一覧や進捗の確認では結果のログを読まない。
+    結果のログを読むのは get(include_results=True) とジョブの再開のときだけ。
+    複数のワーカープロセスで jobs_dir を共有する場合、ジョブを実行するのは
+    <job_id>.lock のロックを取れた1プロセスだけで、他のプロセスはファイルから状態を読む。
+    完了・失敗から retention_days 日たったジョブは起動時とジョブの終了時に削除する。
+    """
+
+    def __init__(self, judge, jobs_dir: str = "jobs", max_concurrency: Optional[int] = None,
+                 retention_days: float = JOB_RETENTION_DAYS):
+        self.judge = judge
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(exist_ok=True)
+        self.max_concurrency = max_concurrency
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._jobs = {}
+        # 読み込んだジョブファイルの (更新時刻, inode)（変わっていなければ読み直さない）
+        self._mtimes = {}
+        # このプロセスで実行中のジョブ（それ以外はファイルから読み直す）
+        self._owned = set()
+
+        # 前回のプロセスで終わらなかったジョブを読み込んで再開する
+        for job_path in sorted(self.jobs_dir.glob("*.json")):
+            with self._lock:
+                if not self._refresh(job_path.stem):
+                    continue
+                job = self._jobs[job_path.stem]
+            if job['status'] in ("pending", "running"):
+                print(f"🔁 未完了の評価ジョブを再開します: {job['id']}")
+                self._start(job['id'])
+        self.cleanup()
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _results_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.results.jsonl"
+
+    def _acquire(self, job_id: str):
+        """ジョブの実行ロックを取る（他のプロセスが実行中なら None）。プロセス終了で自動的に外れる"""
+        lock_file = open(self.jobs_dir / f"{job_id}.lock", 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _refresh(self, job_id: str) -> bool:
+        """他のプロセスが実行しているジョブの状態をファイルから読み直す（ロック取得済みで呼ぶこと）
+
+        ファイルが更新されていなければ読み直さない。削除されていれば False を返す。
+        """
+        if job_id in self._owned:
+            return True
+        try:
+            info = self._job_path(job_id).stat()
+        except FileNotFoundError:
+            self._jobs.pop(job_id, None)
+            self._mtimes.pop(job_id, None)
+            return False
+        # 置き換えると inode も変わるため、更新時刻の分解能が粗くても更新を見逃さない
+        mtime = (info.st_mtime_ns, info.st_ino)
+        if self._mtimes.get(job_id) == mtime:
+            return True
+        job = self._load_job(self._job_path(job_id))
+        if job is None:
+            return job_id in self._jobs
+        if 'counts' not in job:
+            # 件数を記録していなかった以前の版のジョブは、結果のログから一度だけ数える
+            job['counts'] = self._count_results(self._load_results(job_id).values())
+        self._jobs[job_id] = job
+        self._mtimes[job_id] = mtime
+        return True
+
+    @staticmethod
+    def _count_results(results) -> Dict[str, int]:
+        counts = {'completed': 0, 'failed': 0, 'cached': 0, 'prescreened': 0}
+        for result in results:
+            EvaluationJobQueue._count(counts, result)
+        return counts
+
+    @staticmethod
+    def _count(counts: Dict[str, int], result: Dict[str, Any]):
+        counts['completed'] += 1
+        counts['failed'] += not result.get('success')
+        counts['cached'] += bool(result.get('cached'))
+        # 事前確認だけで結論が出てLLMを呼ばなかった件数
+        counts['prescreened'] += result.get('mode') == "prescreen"
+
+    def _load_job(self, job_path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(job_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"⚠️ ジョブファイルを読み込めません: {job_path} ({e})")
+            return None
+
+    def _load_results(self, job_id: str) -> Dict[int, Dict[str, Any]]:
+        """評価済み項目（項目番号 -> 結果）。書きかけの最終行は無視する"""
+        results = {}
+        path = self._results_path(job_id)
+        if not path.exists():
+            return results
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                results[entry['index']] = entry['result']
+        return results
+
+    def _terminate_partial_line(self, job_id: str):
+        """前回の異常終了で書きかけになった行があれば改行で区切る"""
+        path = self._results_path(job_id)
+        if not path.exists() or path.stat().st_size == 0:
+            return
+        with open(path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def _save_job(self, job: Dict[str, Any]):
+        """ジョブ定義を一時ファイル経由で置き換える（ロック取得済みで呼ぶこと）"""
+        job['updated_at'] = datetime.now().isoformat()
+        fd, tmp_path = tempfile.mkstemp(dir=self.jobs_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._job_path(job['id']))
+        info = self._job_path(job['id']).stat()
+        self._mtimes[job['id']] = (info.st_mtime_ns, info.st_ino)
+
+    def submit(self, file_paths: List[str], contract_type: Optional[str] = None,
+               max_concurrency: Optional[int] = None, force: bool = False, prescreen: bool = False) -> str:
+        """評価ジョブを登録してすぐにジョブIDを返す（prescreen=True なら境界上の契約書だけをLLMで評価）"""
+        job_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        job = {
+            'id': job_id,
+            'status': "pending",
+            'contract_type': contract_type,
+            'file_paths': file_paths,
+            'total': len(file_paths),
+            'max_concurrency': max_concurrency,
+            'force': force,
+            'prescreen': prescreen,
+            'counts': self._count_results([]),
+            'created_at': datetime.now().isoformat()
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._save_job(job)
+
+        self._start(job_id)
+        return job_id
+
+    def _start(self, job_id: str):
+        threading.Thread(target=self._run, args=(job_id,), name=f"eval-job-{job_id}", daemon=True).start()
+
+    def _run(self, job_id: str):
+        """未評価の項目だけを並列に評価し、1件ごとに結果を追記する"""
+        lock_file = self._acquire(job_id)
+        if lock_file is None:
+            # 別のワーカープロセスが実行中
+            return
+        try:
+            self._run_locked(job_id)
+        finally:
+            with self._lock:
+                self._owned.discard(job_id)
+            lock_file.close()
+
+    def _run_locked(self, job_id: str):
+        with self._lock:
+            # ロックを取る前に他のプロセスが進めた分を読み直してから引き継ぐ
+            if not self._refresh(job_id):
+                return
+            self._owned.add(job_id)
+            job = self._jobs[job_id]
+            if job['status'] not in ("pending", "running"):
+                return
+        # 再開する場合は評価済みの項目を読み、件数も記録済みの結果から数え直す
+        results = self._load_results(job_id)
+        done = set(results)
+        with self._lock:
+            job['counts'] = self._count_results(results.values())
+            job['status'] = "running"
+            self._save_job(job)
+        # 実行中は結果そのものを持たない
+        del results
+
+        remaining = [i for i in range(job['total']) if i not in done]
+        concurrency = job.get('max_concurrency') or self.max_concurrency or self.judge.max_concurrency
+        workers = max(1, min(concurrency, len(remaining) or 1))
+        self._terminate_partial_line(job_id)
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"eval-{job_id}") as executor:
+                futures = {
+                    executor.submit(self.judge.evaluate_contract_file, job['file_paths'][i], job.get('force', False),
+                                    job.get('prescreen', False)): i
+                    for i in remaining
+                }
+                saved_at = time.monotonic()
+                with open(self._results_path(job_id), 'a', encoding='utf-8') as log:
+                    for future in as_completed(futures):
+                        index = futures[future]
+                        result = future.result()
+                        with self._lock:
+                            log.write(json.dumps({'index': index, 'result': result}, ensure_ascii=False) + "\n")
+                            log.flush()
+                            self._count(job['counts'], result)
+                            # ジョブ定義は対象ファイル一覧を含むため、1件ごとではなく一定間隔で書き出す
+                            if time.monotonic() - saved_at >= PROGRESS_SAVE_INTERVAL_SECONDS:
+                                self._save_job(job)
+                                saved_at = time.monotonic()
+
+            with self._lock:
+                job['status'] = "completed"
+                job['completed_at'] = datetime.now().isoformat()
+                self._save_job(job)
+            print(f"✅ 評価ジョブ完了: {job_id} ({job['total']}件)")
+            self.cleanup()
+
+        except Exception as e:
+            with self._lock:
+                job['status'] = "failed"
+                job['error'] = str(e)
+                self._save_job(job)
+            print(f"❌ 評価ジョブ失敗: {job_id} ({e})")
+
+    def get(self, job_id: str, include_results: bool = True) -> Optional[Dict[str, Any]]:
+        """ジョブの進捗と（include_results=True なら途中までの）結果を返す"""
+        with self._lock:
+            if not self._refresh(job_id):
+                return None
+            job = self._jobs[job_id]
+            counts = dict(job['counts'])
+            status = {
+                'id': job['id'],
+                'status': job['status'],
+                'contract_type': job.get('contract_type'),
+                'total': job['total'],
+                'completed': counts['completed'],
+                'failed': counts['failed'],
+                'cached': counts['cached'],
+                # 事前確認だけで結論が出てLLMを呼ばなかった件数
+                'prescreened': counts['prescreened'],
+                'created_at': job['created_at'],
+                'updated_at': job.get('updated_at'),
+                'completed_at': job.get('completed_at'),
+                'error': job.get('error')
+            }
+        if include_results:
+            # 入力と同じ順序で、評価済みの項目だけを返す
+            results = self._load_results(job_id)
+            status['results'] = [results[i] for i in sorted(results)]
+            # 書き出し間隔の間に進んだ分も含め、返す結果と件数を揃える
+            if len(results) > status['completed']:
+                status.update(self._count_results(results.values()))
+        return status
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        # 他のプロセスが登録したジョブも含める（ジョブ定義だけを読み、結果のログは読まない）
+        with self._lock:
+            job_ids = set(self._jobs) | {path.stem for path in self.jobs_dir.glob("*.json")}
+        jobs = [job for job in (self.get(job_id, include_results=False) for job_id in job_ids) if job]
+        return sorted(jobs, key=lambda x: x['created_at'], reverse=True)
+
+    def cleanup(self) -> int:
+        """完了・失敗から retention_days 日たったジョブのファイルを削除し、削除した件数を返す"""
+        if self.retention_days <= 0:
+            return 0
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['status'] in ("completed", "failed")
+                       and (job.get('completed_at') or job.get('updated_at') or job['created_at']) < cutoff]
+        removed = 0
+        for job_id in expired:
+            lock_file = self._acquire(job_id)
+            if lock_file is None:
+                # 別のワーカープロセスが扱っている
+                continue
+            try:
+                with self._lock:
+                    for path in (self._job_path(job_id), self._results_path(job_id)):
+                        try:
+                            path.unlink()
+                        except FileNotFoundError:
+                            pass
+                    self._jobs.pop(job_id, None)
+                    self._mtimes.pop(job_id, None)
+            finally:
+                lock_file.close()
+            try:
+                # Windows では開いたままのファイルは削除できないため、ロックを外してから消す
+                (self.jobs_dir / f"{job_id}.lock").unlink()
+            except OSError:
+                pass
+            removed += 1
+        if removed:
+            print(f"🧹 保存期間を過ぎた評価ジョブを{removed}件削除しました")
+        return removed
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Any, Optional, List, Tuple, Callable
+
+# 秒単位のレイテンシ用バケット（OpenAI呼び出しの数十秒まで）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """単調増加するカウンター（ラベルの組ごと）"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, value: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(values.items())]
+
+
+class Histogram:
+    """固定バケットのヒストグラム（observe は二分探索と加算のみ）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # ラベル -> [バケットごとの件数..., 合計値, 件数]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = []
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-2]!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class CallbackGauge:
+    """出力時に関数を呼んで値を求めるゲージ（他のコンポーネントの統計を公開する用）"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], Optional[float]]):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+
+class MetricsRegistry:
+    """Prometheusのテキスト形式で出力するメトリクスの登録先"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, callback: Callable[[], Optional[float]]) -> CallbackGauge:
+        """同じ名前で登録し直した場合は新しい関数を使う"""
+        gauge = CallbackGauge(name, help_text, callback)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTPリクエスト数", ("method", "route", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTPリクエストの処理時間（レスポンス本文の送信完了まで）", ("method", "route")
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "生成・評価パイプラインの段階ごとの処理時間", ("component", "stage")
+)
+OPENAI_TOKENS = REGISTRY.counter(
+    "openai_tokens_total", "OpenAI APIの使用トークン数（response.usage）", ("component", "model", "kind")
+)
+OPENAI_REQUESTS = REGISTRY.counter(
+    "openai_requests_total", "OpenAI APIの呼び出し数", ("component", "model", "outcome")
+)
+PRESCREEN_DECISIONS = REGISTRY.counter(
+    "prescreen_decisions_total", "評価前のルールによる事前確認の振り分け数", ("contract_type", "decision")
+)
+
+
+@contextmanager
+def stage_timer(component: str, stage: str):
+    """ブロックの所要時間を段階ごとのヒストグラムに記録する（例外で抜けた場合も記録する）"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, component, stage)
+
+
+@contextmanager
+def openai_call(component: str, model: str):
+    """OpenAI呼び出し（ストリーミングは受信完了まで）の所要時間と結果を記録する"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except GeneratorExit:
+        # ストリーミングの途中で受信側が切断した
+        outcome = "cancelled"
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, component, "openai_call")
+        OPENAI_REQUESTS.inc(component, model, outcome)
+
+
+def record_usage(component: str, model: str, usage: Any):
+    """response.usage のトークン数を加算する（usage がなければ何もしない）"""
+    if usage is None:
+        return
+    OPENAI_TOKENS.inc(component, model, "prompt", value=usage.prompt_tokens or 0)
+    OPENAI_TOKENS.inc(component, model, "completion", value=usage.completion_tokens or 0)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import time
+import random
+import threading
+from collections import deque
+from typing import Callable, Any, Optional
+
+import openai
+
+
+class RateLimiter:
+    """直近 window_seconds 秒に送ったリクエスト数・トークン数が予算を超えないようにする（スレッドセーフ）
+
+    予算は1分あたりで指定し、窓の長さに換算する（window_seconds=10 なら1分の予算の1/6）。
+    OpenAI は1分より短い単位でも制限をかけることがあるため、窓を短くすると送信がならされる。
+    送信から相手に届くまでの時間はリクエストごとに違う（新しい接続は遅れて届く）ため、
+    送信は window_seconds + margin_seconds 秒のあいだ数え、相手の窓で予算を超えないようにする。
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 window_seconds: float = 60, margin_seconds: float = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window_seconds = window_seconds
+        self.margin_seconds = margin_seconds
+        # 窓内の送信（送信時刻, トークン数）と、そのトークン数の合計
+        self._sent = deque()
+        self._sent_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_requests(self) -> int:
+        """窓あたりのリクエスト数の上限（1件は必ず通す）"""
+        return max(1, int(self.requests_per_minute * self.window_seconds / 60))
+
+    @property
+    def max_tokens(self) -> float:
+        """窓あたりのトークン数の上限"""
+        return self.tokens_per_minute * self.window_seconds / 60
+
+    def _expire(self, now: float):
+        while self._sent and self._sent[0][0] <= now - self.window_seconds - self.margin_seconds:
+            self._sent_tokens -= self._sent.popleft()[1]
+
+    def _wait_seconds(self, now: float, tokens: float) -> float:
+        """tokens を送れるようになるまでの秒数（窓から古い送信が外れるのを待つ）"""
+        wait = 0.0
+        if self.requests_per_minute and len(self._sent) >= self.max_requests:
+            wait = self._sent[len(self._sent) - self.max_requests][0] + self.window_seconds + self.margin_seconds - now
+        if self.tokens_per_minute and self._sent_tokens + tokens > self.max_tokens:
+            excess = self._sent_tokens + tokens - self.max_tokens
+            for sent_at, sent_tokens in self._sent:
+                excess -= sent_tokens
+                if excess <= 0:
+                    wait = max(wait, sent_at + self.window_seconds + self.margin_seconds - now)
+                    break
+        return wait
+
+    def acquire(self, tokens: int = 0):
+        """予算が空くまで待ってから1リクエスト分（tokens トークン分）を消費する"""
+        if self.tokens_per_minute:
+            # 1件で予算を超える場合は窓が空になるまで待てば通す
+            tokens = min(tokens, self.max_tokens)
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_seconds(now, tokens)
+                if wait <= 0:
+                    self._sent.append((now, tokens))
+                    self._sent_tokens += tokens
+                    return
+            time.sleep(wait)
+
+
+def is_retryable(error: Exception) -> bool:
+    """429・5xx・接続エラー・タイムアウトは再試行する"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After ヘッダーがあれば待機秒数を返す"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retry(func: Callable[[], Any], max_attempts: int = 5, base_delay: float = 1.0,
+                    max_delay: float = 60.0) -> Any:
+    """再試行可能なエラーのとき、ジッター付き指数バックオフで func を呼び直す"""
+    for attempt in range(max_attempts):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            # Full Jitter: 同時に失敗した呼び出しが一斉に再送しないよう待機時間を散らす
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            delay = max(delay, retry_after_seconds(e) or 0)
+            print(f"⚠️ OpenAI API一時エラーのため再試行します ({attempt + 1}/{max_attempts - 1}, {delay:.1f}秒後): {e}")
+            time.sleep(delay)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+from typing import Optional, Iterator, Tuple
+
+LAYOUTS = ("flat", "month", "hash")
+LAYOUT_FILE = "layout.json"
+
+# 契約書IDの先頭の日付（rental_contract_20250101_120000_... の 2025 / 01）
+_ID_MONTH = re.compile(r"_(\d{4})(\d{2})\d{2}_\d{6}_")
+
+
+def iter_files(directory: Path) -> Iterator[os.DirEntry]:
+    """ディレクトリ以下のファイルを再帰的に列挙する（"." で始まるディレクトリ・一時ファイルは除く）"""
+    stack = [str(directory)]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file():
+                yield entry
+
+
+class StorageLayout:
+    """契約書ファイルの配置（種類ディレクトリの下のどこに置くか）
+
+      - flat:  contracts/rental/<name>
+      - month: contracts/rental/<年>/<月>/<name>（契約書IDの日付、なければ作成日時）
+      - hash:  contracts/rental/<ab>/<name>（ファイル名のSHA-1の先頭2桁、256分割）
+    1ディレクトリあたりのファイル数を抑え、数十万件でもディレクトリ操作が遅くならないようにする。
+    配置はファイル名（と作成日時）だけで決まるため、カタログを引かなくても場所を求められる。
+    """
+
+    def __init__(self, name: str = "flat"):
+        if name not in LAYOUTS:
+            raise ValueError(f"Unknown storage layout: {name}")
+        self.name = name
+
+    def shard(self, file_name: str, created_at: Optional[str] = None) -> Tuple[str, ...]:
+        """種類ディレクトリからの相対サブディレクトリ"""
+        if self.name == "month":
+            match = _ID_MONTH.search(file_name)
+            if match:
+                return match.groups()
+            if created_at and len(created_at) >= 7:
+                return (created_at[:4], created_at[5:7])
+            return ("undated",)
+        if self.name == "hash":
+            digest = hashlib.sha1(file_name.encode('utf-8')).hexdigest()
+            return (digest[:2],)
+        return ()
+
+    def path_for(self, type_dir: Path, file_name: str, created_at: Optional[str] = None) -> Path:
+        """契約書本文の置き場所"""
+        return type_dir.joinpath(*self.shard(file_name, created_at), file_name)
+
+    def iter_contract_files(self, type_dir: Path) -> Iterator[Path]:
+        """種類ディレクトリ以下の契約書本文（移行途中で配置が混在していても全て列挙する）"""
+        for entry in iter_files(type_dir):
+            if entry.name.endswith(".txt"):
+                yield Path(entry.path)
+
+    @classmethod
+    def load(cls, base_dir: Path) -> Optional["StorageLayout"]:
+        """保存先に記録された配置（未記録なら None）"""
+        try:
+            with open(base_dir / LAYOUT_FILE, 'r', encoding='utf-8') as f:
+                return cls(json.load(f)['layout'])
+        except FileNotFoundError:
+            return None
+
+    def save(self, base_dir: Path):
+        tmp_path = base_dir / f".{LAYOUT_FILE}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'layout': self.name}, f)
+        os.replace(tmp_path, base_dir / LAYOUT_FILE)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from .storage_layout import iter_files
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+METADATA_SUFFIX = ".metadata.json"
+
+# 読み取りだけのイベント（opened / closed_no_write）は無視する（反映時の読み込みで再通知されないように）
+CHANGE_EVENTS = ("created", "modified", "deleted", "moved", "closed")
+
+
+def contract_path_for(path: str) -> Optional[Path]:
+    """変更されたファイルに対応する契約書本文のパス（契約書に関係しないファイルなら None）"""
+    path = Path(path)
+    if path.name.startswith("."):
+        # 保存途中の一時ファイル
+        return None
+    if path.name.endswith(METADATA_SUFFIX):
+        return path.with_name(path.name[:-len(METADATA_SUFFIX)])
+    if path.suffix == ".txt":
+        return path
+    return None
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "StorageWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in CHANGE_EVENTS:
+            return
+        self.watcher.notify(event.src_path)
+        dest_path = getattr(event, "dest_path", None)
+        if dest_path:
+            self.watcher.notify(dest_path)
+
+
+class StorageWatcher:
+    """契約書ディレクトリの変更を監視し、カタログ・検索索引に差分を反映する
+
+    watchdog がインストールされていれば inotify 等のOS通知を使い、
+    なければ一定間隔でディレクトリの更新時刻を比較するポーリングで検出する。
+    検出した変更は DocumentStorage.sync_contract で1件ずつ反映する。
+    シャード配置（年月・ハッシュ）のサブディレクトリも再帰的に監視する。
+    """
+
+    def __init__(self, storage, mode: str = "auto", poll_interval: float = 5.0, debounce: float = 0.2):
+        if mode not in ("auto", "inotify", "polling"):
+            raise ValueError(f"Unknown watch mode: {mode}")
+        if mode == "inotify" and Observer is None:
+            raise ValueError("inotify モードには watchdog パッケージが必要です")
+        self.storage = storage
+        self.mode = "inotify" if mode != "polling" and Observer is not None else "polling"
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.applied = 0
+        self.errors = 0
+        self.last_applied_at = None
+        self._pending = {}  # 契約書パス -> (最初に変更を検出した時刻, 最後の変更の通番)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+        self._mtimes = {}
+
+    def _directories(self):
+        return [self.storage.rental_dir, self.storage.service_dir]
+
+    def start(self):
+        """停止中に変わった分を反映してから監視を始める"""
+        self._reconcile()
+        if self.mode == "inotify":
+            self._observer = Observer()
+            handler = _EventHandler(self)
+            for directory in self._directories():
+                self._observer.schedule(handler, str(directory), recursive=True)
+            self._observer.start()
+        else:
+            self._mtimes = self._scan_mtimes()
+        self._thread = threading.Thread(target=self._run, name="storage-watcher", daemon=True)
+        self._thread.start()
+        print(f"👀 契約書ディレクトリの監視を開始しました（{self.mode}）")
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
+
+    def notify(self, path: str):
+        """変更されたファイルを反映待ちに加える"""
+        contract_path = contract_path_for(path)
+        if contract_path is None:
+            return
+        with self._lock:
+            self._seq += 1
+            detected_at = self._pending.get(contract_path, (time.time(), 0))[0]
+            self._pending[contract_path] = (detected_at, self._seq)
+
+    def _reconcile(self):
+        """カタログとディスクのファイル名・メタデータ更新時刻を比べ、差分を反映待ちにする"""
+        # アーカイブ済みの契約書は本文ファイルがないのが正しい状態なので比べない
+        cataloged = self.storage.catalog.snapshot(include_archived=False)
+        on_disk = {}
+        for directory in self._directories():
+            for entry in iter_files(directory):
+                if entry.name.endswith(METADATA_SUFFIX):
+                    on_disk[entry.name[:-len(METADATA_SUFFIX)]] = (Path(entry.path).parent, entry.stat().st_mtime)
+        for name, (directory, mtime) in on_disk.items():
+            if cataloged.get(name) != mtime:
+                self.notify(str(directory / name))
+        for name in cataloged.keys() - on_disk.keys():
+            record = self.storage.catalog.get(name)
+            if record:
+                self.notify(record['file_path'])
+
+    def _scan_mtimes(self) -> Dict[str, float]:
+        """ポーリング用: ファイルパス -> 更新時刻（本文は読まない）"""
+        mtimes = {}
+        for directory in self._directories():
+            for entry in iter_files(directory):
+                if contract_path_for(entry.path) is not None:
+                    mtimes[entry.path] = entry.stat().st_mtime_ns
+        return mtimes
+
+    def _poll(self):
+        mtimes = self._scan_mtimes()
+        for path in mtimes.keys() | self._mtimes.keys():
+            if mtimes.get(path) != self._mtimes.get(path):
+                self.notify(path)
+        self._mtimes = mtimes
+
+    def _run(self):
+        interval = self.debounce if self.mode == "inotify" else self.poll_interval
+        while not self._stop.wait(interval):
+            if self.mode == "polling":
+                self._poll()
+            self._apply_pending()
+
+    def _apply_pending(self):
+        """検出順に反映する。反映中に再度変更された契約書は次の周期でもう一度反映する"""
+        with self._lock:
+            pending = sorted(self._pending.items(), key=lambda item: item[1])
+        for contract_path, (_, seq) in pending:
+            try:
+                result = self.storage.sync_contract(str(contract_path))
+            except Exception as e:
+                print(f"⚠️ 契約書の変更を反映できません: {contract_path} ({e})")
+                result = None
+            with self._lock:
+                if self._pending.get(contract_path, (None, None))[1] == seq:
+                    del self._pending[contract_path]
+                if result is None:
+                    self.errors += 1
+                    continue
+                self.applied += 1
+                self.last_applied_at = time.time()
+            if result != 'unchanged':
+                print(f"🔄 外部での変更を反映しました: {contract_path.name} ({result})")
+
+    def stats(self) -> Dict[str, Any]:
+        """反映状況（index_lag_seconds は最も古い未反映の変更からの経過秒数）"""
+        with self._lock:
+            oldest = min((detected_at for detected_at, _ in self._pending.values()), default=None)
+            return {
+                'mode': self.mode,
+                'pending': len(self._pending),
+                'index_lag_seconds': round(time.time() - oldest, 3) if oldest is not None else 0.0,
+                'applied': self.applied,
+                'errors': self.errors,
+                'last_applied_at': self.last_applied_at
+            }
+
+
+def watcher_from_env(storage) -> Optional[StorageWatcher]:
+    """環境変数 STORAGE_WATCH（auto / inotify / polling / off）から監視を作る"""
+    mode = os.getenv("STORAGE_WATCH", "auto").lower()
+    if mode == "off":
+        return None
+    return StorageWatcher(storage, mode=mode, poll_interval=float(os.getenv("STORAGE_WATCH_INTERVAL_SECONDS", "5")))
@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:  # Windows（単一プロセスでのみ使う）
+    fcntl = None
+
+INGESTION_PATH = "/api/public/ingestion"
+
+# 再送の間隔（LangFuseが停止している間は倍々に延ばす）
+REPLAY_MIN_INTERVAL = 5.0
+REPLAY_MAX_INTERVAL = 300.0
+
+
+def utc_timestamp() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+class TelemetrySpool:
+    """送信できなかったテレメトリを保存するセグメントファイル群
+
+    イベントは1行1件のJSON Linesで書き込み中のセグメント（<連番>_<pid>.active）に追記し、
+    一定サイズを超えたら閉じて <連番>_<pid>.jsonl に改名する。再送する側は閉じたセグメントを
+    .replaying に改名して取得するため、複数プロセスで同じディレクトリを共有しても二重送信しない。
+    書き込み中・再送中のセグメントは、持ち主のプロセスが同じ名前の .lock のロックを持ち続ける
+    （プロセスが終了すると自動的に外れる）。ロックを取れたセグメントは持ち主が終了したものとして再送対象に戻す。
+    合計サイズが上限を超えたら古いセグメントから削除する。
+    """
+
+    def __init__(self, spool_dir: str, max_segment_bytes: int = 1024 * 1024,
+                 max_total_bytes: int = 50 * 1024 * 1024):
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_total_bytes = max_total_bytes
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._active = None
+        # このプロセスが持っているセグメントのロック（セグメント名 -> ロックファイル）
+        self._segment_locks = {}
+        self._recover()
+
+    def _lock_segment(self, stem: str) -> bool:
+        """セグメントのロックを取る（他のプロセスが持っていれば False）"""
+        lock_file = open(self.spool_dir / f"{stem}.lock", 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self._segment_locks[stem] = lock_file
+        return True
+
+    def _unlock_segment(self, stem: str):
+        lock_file = self._segment_locks.pop(stem, None)
+        if lock_file is None:
+            return
+        # Windows では開いたままのファイルを削除できないため、先に閉じる
+        lock_file.close()
+        try:
+            (self.spool_dir / f"{stem}.lock").unlink()
+        except FileNotFoundError:
+            pass
+
+    def _recover(self):
+        """終了したプロセスが残した書き込み中・再送中のセグメントを再送対象に戻す"""
+        for path in list(self.spool_dir.glob("*.active")) + list(self.spool_dir.glob("*.replaying")):
+            if path.stem in self._segment_locks or not self._lock_segment(path.stem):
+                # 持ち主のプロセスが書き込み・再送している
+                continue
+            self._close_segment(path)
+            self._unlock_segment(path.stem)
+        # セグメントを閉じた直後に終了したプロセスのロックファイル
+        for path in self.spool_dir.glob("*.lock"):
+            if path.stem not in self._segment_locks and self._lock_segment(path.stem):
+                self._unlock_segment(path.stem)
+
+    def _close_segment(self, path: Path):
+        try:
+            if path.stat().st_size == 0:
+                path.unlink()
+            else:
+                os.replace(path, path.with_suffix(".jsonl"))
+        except FileNotFoundError:
+            pass
+
+    def append(self, events: List[Dict[str, Any]]):
+        """イベントを追記する（必要ならセグメントを切り替え、容量超過分を削除する）"""
+        data = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+        with self._lock:
+            if self._active is None:
+                active = self.spool_dir / f"{time.time_ns():020d}_{os.getpid()}.active"
+                # セグメントを作る前にロックを取り、他のプロセスに持ち主のいないセグメントと見なされないようにする
+                self._lock_segment(active.stem)
+                self._active = active
+            with open(self._active, 'a', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            if self._active.stat().st_size >= self.max_segment_bytes:
+                self._rotate()
+            self._enforce_limit()
+
+    def _rotate(self):
+        """書き込み中のセグメントを閉じる（ロック取得済みで呼ぶこと）"""
+        if self._active is not None:
+            self._close_segment(self._active)
+            self._unlock_segment(self._active.stem)
+            self._active = None
+
+    def _enforce_limit(self):
+        """合計サイズが上限を超えたら古い閉じたセグメントから削除する（ロック取得済みで呼ぶこと）"""
+        segments = sorted(self.spool_dir.glob("*.jsonl"))
+        total = sum(path.stat().st_size for path in segments)
+        if self._active is not None and self._active.exists():
+            total += self._active.stat().st_size
+        for path in segments:
+            if total <= self.max_total_bytes:
+                break
+            try:
+                size = path.stat().st_size
+                with open(path, 'rb') as f:
+                    lines = sum(1 for _ in f)
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.evicted += lines
+            print(f"⚠️ テレメトリの保存容量を超えたため古いイベント{lines}件を削除しました")
+
+    def claim(self) -> Optional[Path]:
+        """最も古い閉じたセグメントを再送用に取得する（なければ None）"""
+        with self._lock:
+            # 自プロセスの書き込み中セグメントも閉じて再送対象にする
+            self._rotate()
+            for path in sorted(self.spool_dir.glob("*.jsonl")):
+                claimed = path.with_name(f"{path.stem.rsplit('_', 1)[0]}_{os.getpid()}.replaying")
+                if not self._lock_segment(claimed.stem):
+                    continue
+                try:
+                    os.replace(path, claimed)
+                except FileNotFoundError:
+                    # 他のプロセスが先に取得した
+                    self._unlock_segment(claimed.stem)
+                    continue
+                return claimed
+        return None
+
+    def read(self, path: Path) -> List[Dict[str, Any]]:
+        """セグメントのイベントを返す。書きかけで壊れた行は読み飛ばす"""
+        events = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events
+
+    def release(self, path: Path, events: Optional[List[Dict[str, Any]]] = None):
+        """再送に失敗したセグメントを戻す（events を渡すと未送信分だけを残す）"""
+        if events is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._close_segment(path)
+        with self._lock:
+            self._unlock_segment(path.stem)
+
+    def done(self, path: Path):
+        """再送が終わったセグメントを削除する"""
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._unlock_segment(path.stem)
+
+    def close(self):
+        """書き込み中のセグメントを閉じ、次回起動時の再送対象にする"""
+        with self._lock:
+            self._rotate()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            paths = [path for pattern in ("*.jsonl", "*.active", "*.replaying")
+                     for path in self.spool_dir.glob(pattern)]
+            sizes = []
+            for path in paths:
+                try:
+                    sizes.append(path.stat().st_size)
+                except FileNotFoundError:
+                    pass
+            return {
+                'segments': len(sizes),
+                'bytes': sum(sizes),
+                'evicted': self.evicted
+            }
+
+
+class LangfuseExporter:
+    """LangFuseへのテレメトリ送信（非同期・バッチ）
+
+    呼び出し側はイベントをメモリ上の有界キューに積むだけで、送信を待たない。
+    バックグラウンドのスレッドがキューからまとめて取り出し、
+    バッチ取り込みAPI（/api/public/ingestion）へ接続を使い回して送る。
+    キュー満杯や送信失敗で送れなかったイベントは spool に保存し、LangFuseが復旧したら再送する
+    （spool がなければ破棄する）。
+    """
+
+    def __init__(self, host: str, public_key: Optional[str], secret_key: Optional[str],
+                 max_queue_size: int = 10000, batch_size: int = 100, flush_interval: float = 1.0,
+                 timeout: float = 5.0, max_retries: int = 3, spool: Optional[TelemetrySpool] = None,
+                 replay_min_interval: float = REPLAY_MIN_INTERVAL):
+        self.host = host.rstrip("/")
+        self.enabled = bool(public_key and secret_key)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.spool = spool
+        self.replay_min_interval = replay_min_interval
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+        # 送信できない間は新しいバッチも直接 spool に回し、再送で復旧を確認する
+        self._offline = False
+        self._replay_interval = replay_min_interval
+        self._next_replay = time.monotonic()
+
+        # 送信は1スレッドのみなので接続プールは小さくてよい
+        self._session = requests.Session()
+        self._session.auth = (public_key or "", secret_key or "")
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="langfuse-exporter", daemon=True)
+                    self._thread.start()
+
+    def start(self):
+        """前回までに保存されたイベントの再送を始める"""
+        if self.enabled:
+            self._ensure_started()
+
+    def enqueue(self, event_type: str, body: Dict[str, Any]):
+        """取り込みイベントをキューに積む（ブロックしない）"""
+        if not self.enabled or self._closed.is_set():
+            return
+        event = {
+            "id": str(uuid.uuid4()),
+            "type": event_type,
+            "timestamp": utc_timestamp(),
+            "body": body
+        }
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._overflow([event])
+
+    def trace(self, trace_id: str, name: str, **fields):
+        self.enqueue("trace-create", {"id": trace_id, "name": name, "timestamp": utc_timestamp(), **fields})
+
+    def generation(self, trace_id: str, generation_id: str, name: str, **fields):
+        self.enqueue("generation-create", {"id": generation_id, "traceId": trace_id, "name": name, **fields})
+
+    def event(self, trace_id: str, event_id: str, name: str, **fields):
+        self.enqueue("event-create", {"id": event_id, "traceId": trace_id, "name": name,
+                                      "startTime": utc_timestamp(), **fields})
+
+    def _overflow(self, events: List[Dict[str, Any]]):
+        """送れないイベントを spool に保存する（spool がなければ破棄）"""
+        if self.spool is not None:
+            try:
+                self.spool.append(events)
+                with self._lock:
+                    self.spilled += len(events)
+                return
+            except OSError as e:
+                print(f"⚠️ テレメトリの保存に失敗しました: {e}")
+        with self._lock:
+            self.dropped += len(events)
+
+    def _take_batch(self, wait: float) -> List[Dict[str, Any]]:
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=wait))
+        except queue.Empty:
+            return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            batch = self._take_batch(self.flush_interval)
+            if batch:
+                if self._offline:
+                    self._overflow(batch)
+                else:
+                    self._send(batch)
+                for _ in batch:
+                    self._queue.task_done()
+            if self.spool is not None and not self._closed.is_set() and time.monotonic() >= self._next_replay:
+                self._replay()
+
+    def _post(self, batch: List[Dict[str, Any]]) -> requests.Response:
+        return self._session.post(f"{self.host}{INGESTION_PATH}", json={"batch": batch}, timeout=self.timeout)
+
+    def _post_once(self, batch: List[Dict[str, Any]]) -> Optional[str]:
+        """1回だけ送信する。成功なら None、再送すべき失敗ならエラー内容を返す"""
+        try:
+            response = self._post(batch)
+        except requests.RequestException as e:
+            return str(e)
+        if response.status_code < 300:
+            with self._lock:
+                self.sent += len(batch)
+            return None
+        if response.status_code < 500 and response.status_code != 429:
+            # 認証エラーや形式エラーは再送しても通らない
+            print(f"⚠️ LangFuseへの送信を破棄しました (HTTP {response.status_code}): {response.text[:200]}")
+            with self._lock:
+                self.failed += len(batch)
+            return None
+        return f"HTTP {response.status_code}"
+
+    def _send(self, batch: List[Dict[str, Any]]) -> bool:
+        """バッチを送信する。一時的な失敗は数回まで再送し、それでも駄目なら spool に保存する"""
+        for attempt in range(self.max_retries):
+            error = self._post_once(batch)
+            if error is None:
+                return True
+            if self._closed.is_set() or attempt == self.max_retries - 1:
+                break
+            time.sleep(min(30.0, 0.5 * 2 ** attempt))
+
+        print(f"⚠️ LangFuseに{len(batch)}件を送信できませんでした ({error})")
+        with self._lock:
+            self.failed += len(batch)
+        self._overflow(batch)
+        if self.spool is not None:
+            # 以降は復旧を確認するまで spool に保存する
+            self._go_offline()
+        return False
+
+    def _go_offline(self):
+        if not self._offline:
+            print(f"📦 LangFuse停止中のため、テレメトリをローカルに保存します: {self.spool.spool_dir}")
+        self._offline = True
+        self._next_replay = time.monotonic() + self._replay_interval
+        self._replay_interval = min(REPLAY_MAX_INTERVAL, self._replay_interval * 2)
+
+    def _replay(self):
+        """保存済みのセグメントを古い順にまとめて再送する"""
+        while not self._closed.is_set():
+            path = self.spool.claim()
+            if path is None:
+                break
+            try:
+                events = self.spool.read(path)
+            except OSError as e:
+                print(f"⚠️ テレメトリのセグメントを読み込めません: {path} ({e})")
+                self.spool.release(path)
+                break
+            for start in range(0, len(events), self.batch_size):
+                error = self._post_once(events[start:start + self.batch_size])
+                if error is not None:
+                    self.spool.release(path, events[start:])
+                    self._go_offline()
+                    return
+                with self._lock:
+                    self.replayed += len(events[start:start + self.batch_size])
+            self.spool.done(path)
+
+        if self._offline:
+            print("✅ LangFuseへの送信が復旧しました")
+        self._offline = False
+        self._replay_interval = self.replay_min_interval
+        self._next_replay = time.monotonic() + self.replay_min_interval
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """キューが空になるまで待つ（テスト・終了時用）"""
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """残りを送信してから停止する（送れなかった分は spool に残る）"""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.spool is not None:
+            self.spool.close()
+        self._session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'enabled': self.enabled,
+                'offline': self._offline,
+                'queued': self._queue.qsize(),
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+                'replayed': self.replayed
+            }
+        if self.spool is not None:
+            stats['spool'] = self.spool.stats()
+        return stats
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def spool_from_env() -> Optional[TelemetrySpool]:
+    """環境変数 TELEMETRY_SPOOL_DIR（空なら保存しない）から spool を作る"""
+    spool_dir = os.getenv("TELEMETRY_SPOOL_DIR", ".cache/telemetry")
+    if not spool_dir:
+        return None
+    return TelemetrySpool(
+        spool_dir,
+        max_segment_bytes=int(float(os.getenv("TELEMETRY_SPOOL_SEGMENT_KB", "1024")) * 1024),
+        max_total_bytes=int(float(os.getenv("TELEMETRY_SPOOL_MAX_MB", "50")) * 1024 * 1024)
+    )
+
+
+def get_exporter() -> LangfuseExporter:
+    """プロセス共通のエクスポーターを返す（初回呼び出し時に環境変数から作る）"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                public_key = os.getenv("LANGFUSE_PUBLIC_KEY")
+                secret_key = os.getenv("LANGFUSE_SECRET_KEY")
+                _exporter = LangfuseExporter(
+                    os.getenv("LANGFUSE_HOST", "http://localhost:3000"),
+                    public_key,
+                    secret_key,
+                    max_queue_size=int(os.getenv("TELEMETRY_QUEUE_SIZE", "10000")),
+                    batch_size=int(os.getenv("TELEMETRY_BATCH_SIZE", "100")),
+                    flush_interval=float(os.getenv("TELEMETRY_FLUSH_INTERVAL_SECONDS", "1.0")),
+                    timeout=float(os.getenv("TELEMETRY_TIMEOUT_SECONDS", "5.0")),
+                    spool=spool_from_env() if public_key and secret_key else None
+                )
+                # 前回停止中に保存されたイベントがあれば再送する
+                _exporter.start()
+                atexit.register(_exporter.close)
+    return _exporter
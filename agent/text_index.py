@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+from typing import Dict, Any, List
+
+# 日本語は分かち書きされないため、文字単位のn-gramで索引を作る。
+# 1〜2文字のクエリにも索引で答えられるよう、1-gramも併せて登録する。
+NGRAM_SIZES = (1, 2, 3)
+MAX_NGRAM = max(NGRAM_SIZES)
+
+
+def char_ngrams(text: str, n: int) -> Counter:
+    """文字n-gramの出現回数を数える"""
+    return Counter(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def index_terms(text: str) -> Counter:
+    """索引に登録する全n-gramとその出現回数（textは小文字化済みであること）"""
+    terms = Counter()
+    for n in NGRAM_SIZES:
+        terms.update(char_ngrams(text, n))
+    return terms
+
+
+def query_terms(query: str) -> List[str]:
+    """クエリを索引引き用のn-gramに分解する（queryは小文字化済みであること）
+
+    クエリ長が MAX_NGRAM 以下ならn-gramそのものが索引の語と一致するため、
+    索引の結果だけで部分一致判定が確定する。それより長い場合は候補の絞り込みにのみ使う。
+    """
+    n = min(len(query), MAX_NGRAM)
+    if n == 0:
+        return []
+    return sorted(set(char_ngrams(query, n)))
+
+
+def is_exact_lookup(query: str) -> bool:
+    """索引の結果だけで部分一致判定が確定するか"""
+    return len(query) <= MAX_NGRAM
+
+
+def make_snippet(text: str, query: str, width: int = 60, max_highlights: int = 5) -> Dict[str, Any]:
+    """最初の一致箇所の前後を切り出した抜粋と、抜粋内の一致位置を返す
+
+    highlights は抜粋文字列内の [開始, 終了) の組。offset は抜粋の元テキスト上の開始位置。
+    """
+    lowered = text.lower()
+    query_lower = query.lower()
+    first = lowered.find(query_lower) if query_lower else -1
+    if first < 0:
+        return {'text': text[:width * 2], 'offset': 0, 'highlights': []}
+
+    start = max(0, first - width)
+    end = min(len(text), first + len(query_lower) + width)
+
+    highlights = []
+    pos = first
+    while pos >= 0 and pos + len(query_lower) <= end and len(highlights) < max_highlights:
+        highlights.append([pos - start, pos - start + len(query_lower)])
+        pos = lowered.find(query_lower, pos + len(query_lower))
+
+    return {'text': text[start:end], 'offset': start, 'highlights': highlights}
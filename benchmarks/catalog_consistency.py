@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""契約書カタログとディスク上のファイルの整合性の確認
+
+一時ディレクトリの保存先（--layout ごと）で次の操作を順に行い、各操作の後に verify_catalog() が
+不整合なし（missing / orphaned / stale が空）を返すこと、一覧・get_contract の結果が保存した契約書と一致することを確かめる。
+  - save:     save_contract で --count 件保存する
+  - inplace:  同じ本文の契約書を1件増やし、片方の本文ファイルをその場で編集しても、もう片方と保存先の本文が変わらないこと
+  - delete:   そのうち一部を delete_contract で削除する
+  - drift:    カタログを通さずに本文とメタデータを消し、verify_catalog() が orphaned として検出すること
+  - rebuild:  rebuild_catalog で作り直す
+  - reopen:   DocumentStorage を開き直す
+  - archive:  メタデータの file_path を別環境の形式（contracts\\rental\\...）に書き換えてから全件アーカイブし、
+              verify_catalog → rebuild_catalog → get_contract で全件を読めること
+1つでも失敗すれば終了コード1で終わる。
+
+    python benchmarks/catalog_consistency.py --count 200
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.document_storage import DocumentStorage
+from agent.storage_layout import LAYOUTS
+from benchmarks.corpus import rental_contract, service_contract
+
+
+class Checker:
+    """確認結果を1行ずつ出力し、失敗の件数を数える"""
+
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, label: str, ok: bool, detail=None):
+        if ok:
+            click.echo(f"  ✅ {label}")
+        else:
+            self.failures += 1
+            click.echo(f"  ❌ {label}" + (f": {detail}" if detail else ""))
+
+    def clean(self, label: str, storage: DocumentStorage):
+        report = storage.verify_catalog()
+        self.check(f"{label}: verify_catalog に不整合なし", not any(report.values()), report)
+
+
+def check_listing(checker: Checker, label: str, storage: DocumentStorage, expected: dict):
+    """一覧と get_contract が expected（ファイル名 → 本文）と一致する"""
+    listed = {Path(contract['file_path']).name for contract in storage.list_contracts()}
+    checker.check(f"{label}: 一覧が{len(expected)}件と一致", listed == set(expected),
+                  f"余分 {sorted(listed - set(expected))[:3]} / 不足 {sorted(set(expected) - listed)[:3]}")
+    wrong = []
+    for name, content in expected.items():
+        contract = storage.get_contract(name)
+        if contract is None or storage.read_content(contract) != content:
+            wrong.append(name)
+    checker.check(f"{label}: get_contract で全件の本文を読める", not wrong, wrong[:3])
+
+
+def run_layout(checker: Checker, base_dir: str, layout: str, count: int, seed: int):
+    rng = random.Random(seed)
+    storage = DocumentStorage(base_dir, layout=layout)
+    expected = {}
+
+    for i in range(count):
+        contract_type = "rental" if i % 2 == 0 else "service"
+        content, params = rental_contract(rng) if contract_type == "rental" else service_contract(rng)
+        expected[Path(storage.save_contract(contract_type, content, params)).name] = content
+    checker.clean("save", storage)
+    check_listing(checker, "save", storage, expected)
+
+    # 同じ本文の契約書の1件をその場で編集しても、もう1件と保存先の本文は変わらない
+    edited, content = next(iter(expected.items()))
+    contract = storage.get_contract(edited)
+    twin = Path(storage.save_contract(contract['type'], content, {})).name
+    expected[twin] = content
+    digest = contract['metadata']['content_sha256']
+    checker.check("inplace: 同じ本文の参照数が2", storage.blobs.refcount(digest) == 2, storage.blobs.refcount(digest))
+    with open(contract['file_path'], 'a', encoding='utf-8') as f:
+        f.write("\n（手作業で追記）")
+    expected[edited] = content + "\n（手作業で追記）"
+    storage.sync_contract(contract['file_path'])
+    checker.check("inplace: 編集していない契約書の本文は元のまま",
+                  storage.read_content(storage.get_contract(twin)) == content)
+    checker.check("inplace: 保存先の本文は元のまま",
+                  storage.blobs.path(digest).read_text(encoding='utf-8') == content)
+    checker.check("inplace: 参照が編集後の本文に付け替わる", storage.blobs.refcount(digest) == 1,
+                  storage.blobs.refcount(digest))
+    checker.clean("inplace", storage)
+    check_listing(checker, "inplace", storage, expected)
+
+    deleted = rng.sample(sorted(expected), count // 4)
+    for name in deleted:
+        storage.delete_contract(name)
+        del expected[name]
+    checker.clean("delete", storage)
+    checker.check("delete: 削除した契約書は get_contract で見つからない",
+                  all(storage.get_contract(name) is None for name in deleted))
+    check_listing(checker, "delete", storage, expected)
+
+    # カタログを通さない削除（手作業での削除など）を検出できること
+    removed = rng.choice(sorted(expected))
+    file_path = Path(storage.get_contract(removed)['file_path'])
+    file_path.unlink()
+    file_path.with_name(f"{file_path.name}.metadata.json").unlink()
+    del expected[removed]
+    report = storage.verify_catalog()
+    checker.check("drift: カタログにだけ残った契約書を orphaned として検出", report['orphaned'] == [removed], report)
+
+    rebuilt = storage.rebuild_catalog()
+    checker.check(f"rebuild: {len(expected)}件を登録", rebuilt == len(expected), rebuilt)
+    checker.clean("rebuild", storage)
+    check_listing(checker, "rebuild", storage, expected)
+    storage.catalog.close()
+
+    storage = DocumentStorage(base_dir)
+    checker.check(f"reopen: 配置 {layout} を引き継ぐ", storage.layout.name == layout, storage.layout.name)
+    checker.clean("reopen", storage)
+    check_listing(checker, "reopen", storage, expected)
+
+    # 保存済みのメタデータの file_path は保存時の環境のパス（サンプルは Windows 形式）で、場所の手がかりにならない
+    for name in expected:
+        contract = storage.get_contract(name)
+        metadata = dict(contract['metadata'], file_path=f"contracts\\{contract['type']}\\{name}")
+        Path(contract['file_path']).with_name(f"{name}.metadata.json").write_text(
+            json.dumps(metadata, ensure_ascii=False, indent=2), encoding='utf-8'
+        )
+    storage.rebuild_catalog()
+    result = storage.archive_contracts(-1)
+    checker.check(f"archive: {len(expected)}件をアーカイブ", result['archived'] == len(expected), result)
+    checker.clean("archive", storage)
+    checker.check("archive: 本文の参照がすべて外れる", storage.blobs.stats()['references'] == 0, storage.blobs.stats())
+    storage.rebuild_catalog()
+    checker.clean("archive→rebuild", storage)
+    check_listing(checker, "archive→rebuild", storage, expected)
+    checker.check("archive→rebuild: get_contract がアーカイブ済みとして返す",
+                  all((storage.get_contract(name) or {}).get('archived') for name in expected))
+    storage.catalog.close()
+
+
+@click.command()
+@click.option('--count', default=100, show_default=True, help='保存する契約書の件数')
+@click.option('--layout', 'layouts', multiple=True, type=click.Choice(LAYOUTS), help='確認する配置（省略時は全て）')
+@click.option('--seed', default=0, show_default=True, help='乱数の種')
+def main(count, layouts, seed):
+    """保存・削除・再構築・開き直し・アーカイブの後にカタログがディスク上のファイルと一致することを確認します"""
+    checker = Checker()
+    root = Path(tempfile.mkdtemp(prefix="catalog_consistency_"))
+    try:
+        for layout in layouts or LAYOUTS:
+            click.echo(f"📦 {layout}")
+            run_layout(checker, str(root / layout), layout, count, seed)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if checker.failures:
+        click.echo(f"❌ {checker.failures}件の確認に失敗しました")
+        sys.exit(1)
+    click.echo("✅ カタログはディスク上のファイルと一致しています")
+
+
+if __name__ == '__main__':
+    main()
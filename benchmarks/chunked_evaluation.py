@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""全文評価（single）と条ごとの分割評価（chunked）のトークン数と所要時間の比較
+
+合成コーパス（corpus.py）の業務委託契約書の条をつなげて --lengths 文字前後の長い契約書を作り、
+同じ契約書を両方のモードで評価して、プロンプト・出力のトークン数と評価1件の所要時間を比べる。
+既定ではスタブサーバー（stub_server.py）を使い、トークン数は文字数で近似する。
+--openai を付けると OPENAI_API_KEY で実際のAPIを呼ぶ（usage の実測値になる）。
+
+    python benchmarks/chunked_evaluation.py --lengths 4000,12000,30000
+    python benchmarks/chunked_evaluation.py --lengths 12000 --openai --runs 1
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import tempfile
+import statistics
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import service_contract
+from benchmarks.stub_server import StubServer, StubConfig
+
+ARTICLE_NUMBER = re.compile(r"^第\d+条", re.MULTILINE)
+
+
+def long_service_contract(target_chars: int, seed: int = 0) -> tuple:
+    """複数の業務委託契約書の条をつなげ、条番号を振り直した target_chars 文字前後の契約書"""
+    rng = random.Random(seed)
+    content, metadata = service_contract(rng)
+    preamble = content[:ARTICLE_NUMBER.search(content).start()]
+    # 前文と最後の条（協議と署名欄）を除いた条の本文
+    articles = ARTICLE_NUMBER.split(content)[1:-1]
+    while sum(len(article) for article in articles) < target_chars:
+        articles += ARTICLE_NUMBER.split(service_contract(rng)[0])[1:-1]
+    parts = []
+    for number, article in enumerate(articles, 1):
+        parts.append(f"第{number}条{article.rstrip()}")
+        if sum(len(part) for part in parts) >= target_chars:
+            break
+    return preamble + "\n\n".join(parts) + "\n", metadata
+
+
+def evaluate(judge, content: str, metadata: dict, mode: str, runs: int) -> dict:
+    latencies = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = judge.evaluate_contract_quality(content, "service", metadata, force=True, mode=mode)
+        latencies.append(time.perf_counter() - started)
+        if not result["success"]:
+            raise click.ClickException(f"{mode} の評価に失敗しました: {result['error']}")
+    evaluation = result["evaluation"]
+    return {
+        'mode': result["mode"],
+        'latency_seconds': round(statistics.median(latencies), 3),
+        'prompt_tokens': result["usage"]["prompt_tokens"],
+        'completion_tokens': result["usage"]["completion_tokens"],
+        'chunks': len(evaluation.get("chunks", [])) or 1,
+        'overall_score': evaluation.get("overall_score"),
+        'grade': evaluation.get("grade")
+    }
+
+
+@click.command()
+@click.option('--lengths', default="4000,12000,30000", show_default=True, help='契約書の文字数（カンマ区切り）')
+@click.option('--runs', default=3, show_default=True, help='1モードあたりの評価回数（所要時間は中央値）')
+@click.option('--latency-ms', default=800.0, show_default=True, help='スタブの応答開始までの待ち時間')
+@click.option('--ms-per-token', default=20.0, show_default=True, help='スタブの出力1トークンあたりの生成時間')
+@click.option('--openai', 'use_openai', is_flag=True, help='スタブではなく実際のOpenAI APIを呼ぶ')
+@click.option('--output', type=click.Path(dir_okay=False), help='結果JSONの保存先')
+def main(lengths, runs, latency_ms, ms_per_token, use_openai, output):
+    """長い契約書で全文評価と分割評価のトークン数・所要時間を比較します"""
+    stub = None
+    if not use_openai:
+        stub = StubServer(StubConfig(latency_ms=latency_ms, jitter_ms=0, output_ms_per_token=ms_per_token)).start()
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-benchmark",
+            "OPENAI_BASE_URL": f"{stub.url}/v1",
+            "LANGFUSE_HOST": stub.url,
+            "LANGFUSE_PUBLIC_KEY": "pk-lf-benchmark",
+            "LANGFUSE_SECRET_KEY": "sk-lf-benchmark",
+            "TELEMETRY_SPOOL_DIR": tempfile.mkdtemp(prefix="chunked_eval_spool_")
+        })
+    # 評価結果は一時ディレクトリに保存し、レート制限は計測の邪魔にならない値にする
+    from agent.contract_judge import ContractJudge
+    from agent.disk_cache import DiskCache
+    judge = ContractJudge(requests_per_minute=10000, tokens_per_minute=10 ** 8,
+                          evaluation_cache=DiskCache(tempfile.mkdtemp(prefix="chunked_eval_")))
+
+    results = []
+    try:
+        for length in (int(value) for value in lengths.split(",")):
+            content, metadata = long_service_contract(length)
+            single = evaluate(judge, content, metadata, "single", runs)
+            chunked = evaluate(judge, content, metadata, "chunked", runs)
+            results.append({'chars': len(content), 'single': single, 'chunked': chunked})
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    click.echo(f"📏 全文評価と分割評価の比較（{'OpenAI API' if use_openai else 'スタブ、トークン数は文字数で近似'}）")
+    click.echo(f"  {'文字数':>8}{'mode':>9}{'分割数':>6}{'入力':>9}{'出力':>8}{'所要時間':>10}{'点数':>6}")
+    for result in results:
+        for mode in ("single", "chunked"):
+            row = result[mode]
+            click.echo(f"  {result['chars']:>8}{row['mode']:>9}{row['chunks']:>6}{row['prompt_tokens']:>9}"
+                       f"{row['completion_tokens']:>8}{row['latency_seconds']:>9.2f}s{row['overall_score']:>6}")
+        single, chunked = result['single'], result['chunked']
+        single_total = single['prompt_tokens'] + single['completion_tokens']
+        chunked_total = chunked['prompt_tokens'] + chunked['completion_tokens']
+        click.echo(f"  {'':>8}{'差':>9}{'':>6}  トークン {(chunked_total / single_total - 1) * 100:+.0f}%"
+                   f"  所要時間 {(chunked['latency_seconds'] / single['latency_seconds'] - 1) * 100:+.0f}%")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'stub': not use_openai, 'results': results}, f, ensure_ascii=False, indent=2)
+        click.echo(f"📁 結果: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""web_app のコールドスタート計測
+
+新しいPythonプロセスで `import web_app` にかかる時間と、起動直後の最初のリクエストの
+応答時間を計測する。LangFuseが応答しない状況を再現するため、既定では
+接続は受け付けるが何も返さないローカルのソケットを LANGFUSE_HOST に設定する。
+
+    python benchmarks/cold_start.py --runs 5
+"""
+import os
+import sys
+import json
+import socket
+import statistics
+import subprocess
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子プロセスで実行する計測コード（結果をJSONで1行出力する）
+PROBE = r"""
+import json, time
+started = time.perf_counter()
+import web_app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+timings = {"import": imported - started}
+with TestClient(web_app.app) as client:
+    ready = time.perf_counter()
+    timings["startup"] = ready - imported
+    for path in %(paths)r:
+        t = time.perf_counter()
+        response = client.get(path)
+        timings[path] = time.perf_counter() - t
+        assert response.status_code < 500, (path, response.status_code, response.text)
+print(json.dumps(timings))
+"""
+
+
+def run_probe(paths, env):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE % {"paths": list(paths)}],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=300
+    )
+    if result.returncode != 0:
+        raise click.ClickException(result.stderr.strip().splitlines()[-1] if result.stderr else "計測に失敗しました")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def blackhole_host() -> str:
+    """接続を受け付けるだけで応答しないソケット（応答しないLangFuseの代わり）"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(128)
+    # 参照を保持してプロセス終了まで閉じない
+    blackhole_host.listener = listener
+    return f"http://127.0.0.1:{listener.getsockname()[1]}"
+
+
+@click.command()
+@click.option('--runs', default=5, show_default=True, help='計測回数（毎回新しいプロセス）')
+@click.option('--langfuse-host', default=None,
+              help='LangFuseのURL（省略時は応答しないローカルソケット）')
+@click.option('--path', 'paths', multiple=True, default=['/health', '/api/contracts'], show_default=True,
+              help='最初に送るリクエストのパス（複数指定可）')
+def main(runs, langfuse_host, paths):
+    """import web_app と最初のリクエストの所要時間を計測します"""
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env.setdefault("LANGFUSE_PUBLIC_KEY", "pk-lf-benchmark")
+    env.setdefault("LANGFUSE_SECRET_KEY", "sk-lf-benchmark")
+    langfuse_host = langfuse_host or blackhole_host()
+    env["LANGFUSE_HOST"] = langfuse_host
+
+    samples = [run_probe(paths, env) for _ in range(runs)]
+
+    click.echo(f"⏱️ コールドスタート計測 ({runs}回, LANGFUSE_HOST={langfuse_host})")
+    for key in samples[0]:
+        values = [sample[key] * 1000 for sample in samples]
+        click.echo(f"  {key:<20} 中央値 {statistics.median(values):8.1f} ms  最大 {max(values):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
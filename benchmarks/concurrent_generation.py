@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""非同期生成の同時実行の確認
+
+スタブサーバー（stub_server.py）を OpenAI / LangFuse の代わりにして、agenerate_rental_contract を
+1件だけ実行した所要時間と、--concurrency 件を asyncio.gather で同時に実行した所要時間を比べる。
+OpenAI呼び出しがイベントループを塞がなければ、同時に実行しても1件分に近い時間で終わる。
+同時実行の所要時間が1件の --tolerance 倍を超えたら終了コード1で終わる。
+
+    python benchmarks/concurrent_generation.py --concurrency 16 --latency-ms 500
+"""
+import os
+import sys
+import time
+import asyncio
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer, StubConfig
+
+
+def rental_params(i: int) -> dict:
+    # 生成キャッシュに当たらないよう1件ごとに変える
+    return {
+        'property_name': f"確認用マンション{i}号室",
+        'address': "東京都中央区1-1-1",
+        'rent': str(80000 + i),
+        'deposit': "160000",
+        'key_money': "80000",
+        'period': "2年",
+        'landlord_name': "貸主太郎",
+        'tenant_name': "借主花子"
+    }
+
+
+async def measure(agent, concurrency: int) -> dict:
+    # 接続の確立を計測に含めない
+    await agent.agenerate_rental_contract(rental_params(-1))
+
+    started = time.perf_counter()
+    await agent.agenerate_rental_contract(rental_params(0))
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(agent.agenerate_rental_contract(rental_params(i + 1))
+                                     for i in range(concurrency)))
+    concurrent = time.perf_counter() - started
+    await agent.aclose()
+    return {'single': single, 'concurrent': concurrent, 'completed': sum(1 for result in results if result)}
+
+
+@click.command()
+@click.option('--concurrency', default=16, show_default=True, help='同時に生成する件数（OPENAI_MAX_CONNECTIONS 以下）')
+@click.option('--latency-ms', default=500.0, show_default=True, help='スタブの応答までの待ち時間')
+@click.option('--tolerance', default=1.5, show_default=True, help='同時実行の所要時間の上限（1件の所要時間の倍数）')
+def main(concurrency, latency_ms, tolerance):
+    """N件の非同期生成が1件分に近い時間で終わることを確認します"""
+    stub = StubServer(StubConfig(latency_ms=latency_ms, jitter_ms=0, langfuse_latency_ms=0)).start()
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"{stub.url}/v1",
+        "LANGFUSE_HOST": stub.url,
+        "LANGFUSE_PUBLIC_KEY": "pk-lf-benchmark",
+        "LANGFUSE_SECRET_KEY": "sk-lf-benchmark",
+        "GENERATION_CACHE_ENABLED": "false",
+        "TELEMETRY_SPOOL_DIR": ""
+    })
+    from agent.document_agent import DocumentAgent
+    try:
+        result = asyncio.run(measure(DocumentAgent(), concurrency))
+    finally:
+        stub.stop()
+
+    ratio = result['concurrent'] / result['single']
+    click.echo(f"⏱️ 1件: {result['single']:.3f}秒 / {concurrency}件同時: {result['concurrent']:.3f}秒 "
+               f"（{ratio:.2f}倍、逐次なら約{concurrency}倍）")
+    if result['completed'] != concurrency:
+        click.echo(f"❌ 生成できたのは{result['completed']}/{concurrency}件です")
+        sys.exit(1)
+    if ratio > tolerance:
+        click.echo(f"❌ 同時実行が1件の{tolerance}倍を超えました（生成がイベントループを塞いでいる可能性があります）")
+        sys.exit(1)
+    click.echo("✅ 同時に実行した生成は1件分に近い時間で終わりました")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""計測用の合成契約書コーパスの生成
+
+賃貸・業務委託の契約書本文とメタデータを DocumentStorage と同じ形式
+（<種類>_contract_<日時>_<接尾辞>.txt と .metadata.json、保存先の配置に従ったディレクトリ）で書き出す。
+物件名・所在地・金額・当事者・条項の構成は乱数で変え、一部の契約書では更新・解約・秘密保持などの
+条項を省く（実際の生成結果と同じく、条項の有無や長さにばらつきがある）。
+同じ --seed からは同じコーパスができる。save_contract を通さずに直接書き、最後にカタログを再構築する。
+
+    python benchmarks/corpus.py --count 100000 --out /tmp/corpus_100k --layout hash
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, Any, Tuple
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.document_storage import DocumentStorage
+from agent.storage_layout import LAYOUTS
+
+# 作成日時はこの日から過去 days 日に分散させる（実行日によらず同じコーパスにする）
+CORPUS_END = datetime(2025, 6, 30)
+
+PREFECTURES = ("東京都", "大阪府", "神奈川県", "愛知県", "福岡県", "北海道", "京都府", "兵庫県", "埼玉県", "千葉県")
+CITIES = ("中央区", "北区", "港区", "西区", "南区", "青葉区", "緑区", "東区", "栄町", "本町")
+BUILDING_WORDS = ("サンライズ", "グランド", "パーク", "リバーサイド", "メゾン", "ハイツ", "レジデンス", "コート", "ヴィラ", "プラザ")
+BUILDING_SUFFIXES = ("マンション", "ハイツ", "コーポ", "レジデンス", "タワー", "荘")
+FAMILY_NAMES = ("佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林", "加藤", "吉田", "山田")
+GIVEN_NAMES = ("太郎", "花子", "一郎", "美咲", "健太", "陽子", "大輔", "直子", "翔", "由美")
+COMPANY_WORDS = ("テック", "ソリューションズ", "システム", "ネクスト", "クリエイト", "データ", "デザイン", "ロジック")
+SERVICES = ("Webサイトの設計・開発", "社内システムの保守運用", "経理業務の代行", "広告デザインの制作",
+            "データ分析レポートの作成", "翻訳業務", "人事労務コンサルティング", "スマートフォンアプリの開発")
+PAYMENT_TERMS = ("月末締め翌月末払い", "検収後30日以内に銀行振込", "着手時50%・納品時50%", "毎月20日締め翌月10日払い")
+
+
+def _person(rng: random.Random) -> str:
+    return rng.choice(FAMILY_NAMES) + rng.choice(GIVEN_NAMES)
+
+
+def _company(rng: random.Random) -> str:
+    return f"株式会社{rng.choice(FAMILY_NAMES)}{rng.choice(COMPANY_WORDS)}"
+
+
+def _address(rng: random.Random) -> str:
+    return f"{rng.choice(PREFECTURES)}{rng.choice(CITIES)}{rng.randint(1, 9)}-{rng.randint(1, 30)}-{rng.randint(1, 20)}"
+
+
+def _articles(titles_and_bodies) -> str:
+    return "\n\n".join(f"第{number}条（{title}）\n{body}" for number, (title, body) in enumerate(titles_and_bodies, 1))
+
+
+def rental_contract(rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    """賃貸契約書の本文と生成パラメータ"""
+    rent = rng.randrange(40000, 300000, 1000)
+    params = {
+        'property_name': f"{rng.choice(BUILDING_WORDS)}{rng.choice(BUILDING_SUFFIXES)}{rng.randint(1, 12)}0{rng.randint(1, 9)}号室",
+        'address': _address(rng),
+        'rent': str(rent),
+        'deposit': str(rent * rng.choice((0, 1, 2))),
+        'key_money': str(rent * rng.choice((0, 1, 2))),
+        'period': rng.choice(("2年", "1年", "3年")),
+        'landlord_name': _person(rng),
+        'tenant_name': _person(rng)
+    }
+    articles = [
+        ("目的", f"甲は、乙に対し、{params['address']}所在の{params['property_name']}（以下「本物件」という。）を住居として賃貸し、乙はこれを賃借する。"),
+        ("賃料", f"乙は、甲に対し、賃料として月額金{rent:,}円を毎月末日までに翌月分を甲の指定する口座に振り込んで支払う。"),
+        ("敷金", f"乙は、本契約締結時に敷金として金{int(params['deposit']):,}円を甲に預け入れる。甲は明渡し後、乙の債務を控除した残額を返還する。"),
+        ("礼金", f"乙は、本契約締結時に礼金として金{int(params['key_money']):,}円を甲に支払う。礼金は返還しない。"),
+        ("契約期間", f"本契約の期間は、契約開始日から{params['period']}とする。"),
+    ]
+    optional = [
+        ("更新", "本契約は、期間満了の1か月前までに甲乙いずれからも申出がないときは、同一条件で2年間更新されるものとし、乙は更新料として賃料の1か月分を支払う。"),
+        ("解約", "乙は、甲に対して少なくとも1か月前に書面で解約の申入れを行うことにより、本契約を解約することができる。"),
+        ("修繕", "甲は、本物件の使用に必要な修繕を行う。ただし、乙の故意又は過失により必要となった修繕の費用は乙が負担する。"),
+        ("禁止事項", "乙は、甲の書面による承諾を得ることなく、本物件の全部又は一部を転貸し、又は賃借権を譲渡してはならない。"),
+        ("原状回復", "乙は、本契約が終了したときは、通常の使用に伴い生じた損耗を除き、本物件を原状に回復して甲に明け渡す。"),
+        ("反社会的勢力の排除", "甲及び乙は、自らが暴力団その他の反社会的勢力に該当しないことを表明し、確約する。"),
+    ]
+    articles += [article for article in optional if rng.random() > 0.1]
+    articles.append(("協議", "本契約に定めのない事項及び本契約の解釈に疑義が生じた事項については、甲乙誠実に協議して解決する。"))
+    content = (
+        "賃貸借契約書\n\n"
+        f"貸主 {params['landlord_name']}（以下「甲」という。）と借主 {params['tenant_name']}（以下「乙」という。）は、"
+        "次のとおり賃貸借契約を締結する。\n\n"
+        + _articles(articles)
+        + f"\n\n以上、本契約の成立を証するため本書2通を作成し、甲乙記名押印の上、各1通を保有する。\n\n"
+        f"甲（貸主）：{params['landlord_name']}\n乙（借主）：{params['tenant_name']}\n"
+    )
+    return content, params
+
+
+def service_contract(rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    """業務委託契約書の本文と生成パラメータ"""
+    compensation = rng.randrange(100000, 3000000, 10000)
+    params = {
+        'service_description': rng.choice(SERVICES),
+        'period': rng.choice(("3ヶ月", "6ヶ月", "1年")),
+        'compensation': str(compensation),
+        'payment_terms': rng.choice(PAYMENT_TERMS),
+        'client_company': _company(rng),
+        'client_representative': _person(rng),
+        'contractor_name': rng.choice((_person(rng), _company(rng)))
+    }
+    articles = [
+        ("目的", f"甲は、乙に対し、{params['service_description']}（以下「本業務」という。）を委託し、乙はこれを受託する。"),
+        ("契約期間", f"本契約の有効期間は、契約締結日から{params['period']}とする。"),
+        ("報酬", f"甲は、本業務の対価として、乙に対し金{compensation:,}円（消費税別）を支払う。"),
+        ("支払条件", f"報酬の支払は{params['payment_terms']}とし、振込手数料は甲の負担とする。"),
+    ]
+    optional = [
+        ("成果物", "乙は、本業務の成果物を甲の定める期日までに納品し、甲は納品後10営業日以内に検収を行う。"),
+        ("知的財産権", "本業務により生じた成果物の著作権（著作権法第27条及び第28条の権利を含む。）は、報酬の支払完了時に乙から甲に移転する。"),
+        ("秘密保持", "甲及び乙は、本契約に関して知り得た相手方の技術上又は営業上の情報を、相手方の事前の書面による承諾なく第三者に開示してはならない。"),
+        ("再委託", "乙は、甲の事前の書面による承諾を得た場合に限り、本業務の一部を第三者に再委託することができる。"),
+        ("損害賠償", "甲又は乙は、本契約に違反して相手方に損害を与えたときは、直接かつ現実に生じた通常の損害を賠償する。"),
+        ("契約解除", "甲又は乙は、相手方が本契約に違反し、相当の期間を定めて催告しても是正されないときは、本契約を解除することができる。"),
+        ("管轄裁判所", "本契約に関する紛争については、甲の本店所在地を管轄する地方裁判所を第一審の専属的合意管轄裁判所とする。"),
+    ]
+    articles += [article for article in optional if rng.random() > 0.1]
+    articles.append(("協議", "本契約に定めのない事項については、甲乙誠実に協議の上、解決する。"))
+    content = (
+        "業務委託契約書\n\n"
+        f"{params['client_company']}（以下「甲」という。）と{params['contractor_name']}（以下「乙」という。）は、"
+        "本業務の委託に関し、次のとおり契約を締結する。\n\n"
+        + _articles(articles)
+        + f"\n\n甲：{params['client_company']} 代表取締役 {params['client_representative']}\n"
+        f"乙：{params['contractor_name']}\n"
+    )
+    return content, params
+
+
+def write_corpus(base_dir: str, count: int, layout: str = "flat", seed: int = 0, days: int = 730,
+                 progress=None) -> DocumentStorage:
+    """count 件の合成契約書を書き出してカタログを作り、開いた DocumentStorage を返す"""
+    # 空のカタログと配置の記録を先に作っておく
+    DocumentStorage(base_dir, layout=layout).catalog.close()
+    storage = DocumentStorage(base_dir)
+    rng = random.Random(seed)
+    span_seconds = days * 24 * 3600
+    made_dirs = set()
+    for i in range(count):
+        contract_type = "rental" if rng.random() < 0.5 else "service"
+        content, metadata = rental_contract(rng) if contract_type == "rental" else service_contract(rng)
+        created_at = CORPUS_END - timedelta(seconds=rng.randrange(span_seconds), microseconds=rng.randrange(1000000))
+        name = f"{contract_type}_contract_{created_at.strftime('%Y%m%d_%H%M%S_%f')}_{rng.getrandbits(24):06x}.txt"
+        file_path = storage.layout.path_for(storage.base_dir / contract_type, name)
+        if file_path.parent not in made_dirs:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            made_dirs.add(file_path.parent)
+        body = content.encode('utf-8')
+        file_path.write_bytes(body)
+        metadata.update({
+            'created_at': created_at.isoformat(),
+            'file_path': str(file_path),
+            'contract_type': contract_type,
+            'content_sha256': hashlib.sha256(body).hexdigest()
+        })
+        file_path.with_name(f"{name}.metadata.json").write_text(
+            json.dumps(metadata, ensure_ascii=False, indent=2), encoding='utf-8'
+        )
+        if progress and (i + 1) % 10000 == 0:
+            progress(i + 1)
+    storage.rebuild_catalog()
+    return storage
+
+
+@click.command()
+@click.option('--count', default=10000, show_default=True, help='生成する契約書の件数')
+@click.option('--out', 'out_dir', required=True, type=click.Path(file_okay=False), help='保存先（空のディレクトリ）')
+@click.option('--layout', default="flat", type=click.Choice(LAYOUTS), show_default=True, help='保存先の配置')
+@click.option('--seed', default=0, show_default=True, help='乱数の種（同じ種なら同じコーパス）')
+@click.option('--days', default=730, show_default=True, help='作成日時を分散させる日数')
+def main(count, out_dir, layout, seed, days):
+    """合成の契約書コーパスを DocumentStorage の形式で生成します"""
+    if Path(out_dir).exists() and any(Path(out_dir).iterdir()):
+        raise click.ClickException(f"{out_dir} は空ではありません")
+    started = time.perf_counter()
+    storage = write_corpus(out_dir, count, layout, seed, days,
+                           progress=lambda done: click.echo(f"  {done}/{count}件"))
+    storage.catalog.close()
+    click.echo(f"✅ {count}件を {out_dir} に生成しました（{time.perf_counter() - started:.1f}秒, 配置 {layout}）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""web_app のエンドツーエンド負荷試験
+
+OpenAI と LangFuse の代わりにローカルのスタブサーバー（stub_server.py）を起動し、
+一時ディレクトリに --seed 件の契約書を用意した上で web_app を uvicorn の別プロセスで起動する。
+シナリオごとに --concurrency 本の並列クライアントから --requests 件のリクエストを送り、
+レイテンシ（p50 / p95 / p99）とスループットをJSONで出力する。
+
+  - rental:         POST /api/rental
+  - rental-stream:  POST /api/rental/stream（最後のイベントまで読む。ttfb は最初のバイトまで）
+  - search:         GET  /api/search（関連度順の全文検索）
+  - contracts:      GET  /api/contracts（一覧の最初のページ）
+  - evaluate:       POST /api/evaluate（force=true で毎回AI評価。評価がイベントループを塞ぐと並列数を上げても伸びない）
+  - batch-evaluate: POST /api/batch-evaluate からジョブ完了まで（--batch-jobs 件）
+
+結果はコミットごとに保存しておき、--compare で前回の結果と比べられる。
+
+    python benchmarks/load_test.py --concurrency 16 --requests 200 --output before.json
+    python benchmarks/load_test.py --concurrency 16 --requests 200 --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import asyncio
+import tempfile
+import subprocess
+from datetime import datetime
+
+import click
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.document_storage import DocumentStorage
+from benchmarks.stub_server import StubServer, StubConfig, CONTRACT_BODY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("rental", "rental-stream", "search", "contracts", "evaluate", "batch-evaluate")
+SEARCH_TERMS = ("敷金", "更新", "解約", "サンプル", "条項7", "報酬", "存在しない語句")
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    """(ステータス, レイテンシ秒, 最初のバイトまでの秒, エラー) の一覧を集計する"""
+    latencies = sorted(sample[1] * 1000 for sample in samples)
+    statuses = {}
+    errors = 0
+    for status, _, _, error in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors += bool(error)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'status_counts': statuses,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'max': round(latencies[-1], 2) if latencies else 0.0
+        }
+    }
+    ttfb = sorted(sample[2] * 1000 for sample in samples if sample[2] is not None)
+    if ttfb:
+        summary['ttfb_ms'] = {p: round(percentile(ttfb, int(p[1:])), 2) for p in ('p50', 'p95', 'p99')}
+    return summary
+
+
+def rental_params(i: int) -> dict:
+    return {
+        "property_name": f"負荷試験マンション{i}号室",
+        "address": "東京都千代田区1-1-1",
+        "rent": str(80000 + i),
+        "deposit": "160000",
+        "key_money": "80000",
+        "period": "2年",
+        "landlord_name": "山田太郎",
+        "tenant_name": f"借主{i}"
+    }
+
+
+def seed_contracts(base_dir: str, count: int):
+    """カタログ込みで契約書を保存しておく（一覧・検索・一括評価の対象）"""
+    storage = DocumentStorage(base_dir)
+    for i in range(count):
+        contract_type = "rental" if i % 2 == 0 else "service"
+        content = f"{contract_type} 負荷試験用 {i}\n" + CONTRACT_BODY
+        storage.save_contract(contract_type, content, {"property_name": f"サンプル物件{i}", "rent": str(50000 + i)})
+    storage.catalog.close()
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_web_app(workdir: str, env: dict, workers: int) -> tuple:
+    """workdir をカレントディレクトリにして uvicorn で web_app を起動し、(プロセス, URL) を返す"""
+    port = free_port()
+    log = open(os.path.join(workdir, "web_app.log"), 'w')
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "web_app:app", "--app-dir", ROOT,
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f"web_app の起動に失敗しました（{log.name} を確認してください）")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise click.ClickException("web_app が60秒以内に起動しませんでした")
+
+
+async def timed(request) -> tuple:
+    """リクエストを送り、本文を最後まで読んで (ステータス, 秒, 最初のバイトまでの秒, エラー) を返す"""
+    started = time.perf_counter()
+    ttfb = None
+    try:
+        async with request as response:
+            body = b""
+            async for chunk in response.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+                body += chunk
+        elapsed = time.perf_counter() - started
+        # SSEはエラーでも200で返るため、error イベントを失敗として数える
+        error = response.status_code >= 400 or b"event: error" in body
+        return response.status_code, elapsed, ttfb, error
+    except httpx.HTTPError as e:
+        return type(e).__name__, time.perf_counter() - started, ttfb, True
+
+
+async def run_scenario(client: httpx.AsyncClient, make_request, requests: int, concurrency: int) -> dict:
+    """concurrency 本の並列クライアントで requests 件を送り、集計を返す"""
+    samples = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            samples.append(await timed(make_request(i)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started)
+
+
+async def run_batch_evaluate(client: httpx.AsyncClient, jobs: int, job_concurrency: int) -> dict:
+    """一括評価ジョブを同時に jobs 件登録し、それぞれ完了までの時間を測る"""
+
+    async def one_job(i: int) -> tuple:
+        started = time.perf_counter()
+        response = await client.post("/api/batch-evaluate",
+                                      params={"force": "true", "max_concurrency": job_concurrency})
+        if response.status_code != 200:
+            return response.status_code, time.perf_counter() - started, None, True, 0
+        submitted = time.perf_counter() - started
+        job_id = response.json()["job_id"]
+        while True:
+            await asyncio.sleep(0.2)
+            job = (await client.get(f"/api/jobs/{job_id}", params={"include_results": "false"})).json()["job"]
+            if job["status"] not in ("pending", "running"):
+                return job["status"], time.perf_counter() - started, submitted, job["status"] != "completed" or job["failed"] > 0, job["total"]
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(one_job(i) for i in range(jobs)))
+    elapsed = time.perf_counter() - started
+    summary = summarize([outcome[:4] for outcome in outcomes], elapsed)
+    # ttfb はジョブ登録APIの応答時間
+    summary['submit_ms'] = summary.pop('ttfb_ms', {})
+    evaluated = sum(outcome[4] for outcome in outcomes)
+    summary['contracts_evaluated'] = evaluated
+    summary['evaluations_per_second'] = round(evaluated / elapsed, 2) if elapsed else 0.0
+    return summary
+
+
+async def run_all(url: str, scenarios: list, requests: int, concurrency: int, batch_jobs: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=300) as client:
+        makers = {
+            "rental": lambda i: client.stream("POST", "/api/rental", json=rental_params(i)),
+            "rental-stream": lambda i: client.stream("POST", "/api/rental/stream", json=rental_params(i)),
+            "search": lambda i: client.stream("GET", "/api/search", params={
+                "query": SEARCH_TERMS[i % len(SEARCH_TERMS)], "sort": "relevance"}),
+            "contracts": lambda i: client.stream("GET", "/api/contracts", params=dict(
+                {"limit": 50}, **({"contract_type": ("rental", "service")[i % 3]} if i % 3 < 2 else {}))),
+        }
+        if "evaluate" in scenarios:
+            listed = (await client.get("/api/contracts", params={"limit": 50})).json()["contracts"]
+            names = [os.path.basename(contract["file_path"]) for contract in listed]
+            makers["evaluate"] = lambda i: client.stream("POST", "/api/evaluate", json={
+                "file_name": names[i % len(names)], "force": True})
+        results = {}
+        for name in scenarios:
+            click.echo(f"▶️ {name} ...", err=True)
+            if name == "batch-evaluate":
+                results[name] = await run_batch_evaluate(client, batch_jobs, concurrency)
+            else:
+                results[name] = await run_scenario(client, makers[name], requests, concurrency)
+        return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report: dict, baseline: dict = None):
+    click.echo(f"\n📊 負荷試験の結果 (commit {report['commit']}, 並列数 {report['config']['concurrency']})", err=True)
+    for name, result in report['scenarios'].items():
+        latency = result['latency_ms']
+        line = (f"  {name:<15} {result['throughput_rps']:8.2f} req/s  p50 {latency['p50']:8.1f}  "
+                f"p95 {latency['p95']:8.1f}  p99 {latency['p99']:8.1f} ms  エラー {result['errors']}/{result['requests']}")
+        previous = (baseline or {}).get('scenarios', {}).get(name)
+        if previous:
+            def change(now, before):
+                return f"{(now / before - 1) * 100:+.0f}%" if before else "n/a"
+            line += (f"  (前回比 スループット {change(result['throughput_rps'], previous['throughput_rps'])}, "
+                     f"p95 {change(latency['p95'], previous['latency_ms']['p95'])})")
+        click.echo(line, err=True)
+
+
+@click.command()
+@click.option('--scenario', 'scenarios', multiple=True, type=click.Choice(SCENARIOS),
+              help='実行するシナリオ（複数指定可、省略時は全て）')
+@click.option('--concurrency', default=8, show_default=True, help='並列クライアント数（一括評価ではジョブ内の並列数）')
+@click.option('--requests', default=200, show_default=True, help='シナリオごとのリクエスト数')
+@click.option('--batch-jobs', default=2, show_default=True, help='同時に登録する一括評価ジョブ数')
+@click.option('--seed', 'seed_count', default=200, show_default=True, help='事前に保存しておく契約書の件数')
+@click.option('--workers', default=1, show_default=True, help='web_app のワーカープロセス数')
+@click.option('--latency-ms', default=300.0, show_default=True, help='スタブのOpenAI応答までの待ち時間')
+@click.option('--jitter-ms', default=50.0, show_default=True, help='スタブの待ち時間のばらつき（±）')
+@click.option('--token-delay-ms', default=2.0, show_default=True, help='スタブのストリーミングのチャンク間隔')
+@click.option('--rate-429', default=0.0, show_default=True, help='スタブが429を返す割合（0〜1）')
+@click.option('--output', type=click.Path(dir_okay=False), help='結果JSONの保存先（省略時は標準出力）')
+@click.option('--compare', type=click.Path(exists=True, dir_okay=False), help='比較する前回の結果JSON')
+@click.option('--keep', is_flag=True, help='一時ディレクトリ（契約書・web_app.log）を削除しない')
+def main(scenarios, concurrency, requests, batch_jobs, seed_count, workers, latency_ms, jitter_ms,
+         token_delay_ms, rate_429, output, compare, keep):
+    """スタブのOpenAI/LangFuseに対して web_app の主要APIに負荷をかけ、レイテンシとスループットを計測します"""
+    scenarios = list(scenarios) or list(SCENARIOS)
+    stub_config = StubConfig(latency_ms=latency_ms, jitter_ms=jitter_ms, token_delay_ms=token_delay_ms,
+                             rate_429=rate_429)
+    stub = StubServer(stub_config).start()
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    os.symlink(os.path.join(ROOT, "templates"), os.path.join(workdir, "templates"))
+
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"{stub.url}/v1",
+        "LANGFUSE_HOST": stub.url,
+        "LANGFUSE_PUBLIC_KEY": "pk-lf-benchmark",
+        "LANGFUSE_SECRET_KEY": "sk-lf-benchmark",
+        "PYTHONPATH": ROOT
+    })
+    # 評価のレート制限はスタブ相手では不要（429の再試行は call_with_retry が担う）
+    env.setdefault("JUDGE_REQUESTS_PER_MINUTE", "1000000")
+    env.setdefault("JUDGE_TOKENS_PER_MINUTE", "1000000000")
+
+    process = None
+    try:
+        click.echo(f"🌱 契約書を{seed_count}件用意しています ({workdir})", err=True)
+        seed_contracts(os.path.join(workdir, "contracts"), seed_count)
+        process, url = start_web_app(workdir, env, workers)
+        started_at = datetime.now().isoformat()
+        results = asyncio.run(run_all(url, scenarios, requests, concurrency, batch_jobs))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        stub.stop()
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'started_at': started_at,
+        'config': {
+            'concurrency': concurrency,
+            'requests': requests,
+            'batch_jobs': batch_jobs,
+            'seed': seed_count,
+            'workers': workers,
+            'python': sys.version.split()[0],
+            'stub': stub_config.as_dict()
+        },
+        'scenarios': results,
+        'stub_requests': stub.stats()
+    }
+
+    baseline = None
+    if compare:
+        with open(compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        click.echo(f"📁 結果: {output}", err=True)
+    else:
+        click.echo(text)
+
+
+if __name__ == '__main__':
+    main()
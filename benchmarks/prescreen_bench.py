@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""ルールによる事前確認（agent/contract_screen.py）の所要時間と振り分けの割合
+
+合成コーパス（corpus.py）と同じ生成方法で契約書をメモリ上に作り、screen_contract の1件あたりの所要時間と、
+fail / borderline / pass の件数（= 一括評価で prescreen=true にしたときにLLMを呼ばずに済む件数）を出力する。
+--contracts-dir を指定すると、保存済みの契約書（DocumentStorage）を対象にする。
+
+    python benchmarks/prescreen_bench.py --count 10000
+    python benchmarks/prescreen_bench.py --contracts-dir contracts
+"""
+import os
+import sys
+import json
+import time
+import random
+import statistics
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.contract_screen import screen_contract
+from benchmarks.corpus import rental_contract, service_contract
+
+
+def synthetic_contracts(count: int, seed: int):
+    rng = random.Random(seed)
+    for _ in range(count):
+        contract_type = "rental" if rng.random() < 0.5 else "service"
+        content, metadata = rental_contract(rng) if contract_type == "rental" else service_contract(rng)
+        yield contract_type, content, metadata
+
+
+def stored_contracts(contracts_dir: str):
+    from agent.document_storage import DocumentStorage
+    storage = DocumentStorage(contracts_dir)
+    for contract in storage.list_contracts():
+        yield contract['type'], storage.read_content(contract), contract['metadata']
+
+
+@click.command()
+@click.option('--count', default=10000, show_default=True, help='合成する契約書の件数')
+@click.option('--seed', default=0, show_default=True, help='乱数の種')
+@click.option('--contracts-dir', type=click.Path(exists=True, file_okay=False), help='保存済みの契約書を対象にする')
+@click.option('--output', type=click.Path(dir_okay=False), help='結果JSONの保存先')
+def main(count, seed, contracts_dir, output):
+    """契約書1件あたりの事前確認の所要時間と、LLM評価に回す契約書の割合を計測します"""
+    contracts = list(stored_contracts(contracts_dir) if contracts_dir else synthetic_contracts(count, seed))
+    if not contracts:
+        raise click.ClickException("契約書がありません")
+
+    latencies = []
+    decisions = {'fail': 0, 'borderline': 0, 'pass': 0}
+    chars = 0
+    for contract_type, content, metadata in contracts:
+        started = time.perf_counter()
+        screen = screen_contract(content, contract_type, metadata)
+        latencies.append(time.perf_counter() - started)
+        decisions[screen['decision']] += 1
+        chars += len(content)
+    latencies.sort()
+
+    report = {
+        'source': contracts_dir or f"synthetic(seed={seed})",
+        'contracts': len(contracts),
+        'average_chars': round(chars / len(contracts)),
+        'median_us': round(statistics.median(latencies) * 1e6, 1),
+        'p99_us': round(latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1e6, 1),
+        'decisions': decisions,
+        'llm_share': round(decisions['borderline'] / len(contracts), 3)
+    }
+    click.echo(f"🔎 {report['contracts']}件（平均 {report['average_chars']}文字）")
+    click.echo(f"  1件あたり: 中央値 {report['median_us']:.0f}µs / p99 {report['p99_us']:.0f}µs")
+    click.echo(f"  不備あり {decisions['fail']}件 / 要AI評価 {decisions['borderline']}件 / 条項あり {decisions['pass']}件"
+               f"（LLMに回す割合 {report['llm_share'] * 100:.1f}%）")
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        click.echo(f"📁 結果: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""一括評価のレート制限と再試行の確認
+
+スタブサーバー（stub_server.py）に OpenAI と同じ予算（直近 --window 秒の受付数・トークン数）を守らせ、
+一部のリクエストに429・503を返させた状態で ContractJudge.batch_evaluate_contracts を実行し、次を確かめる。
+  - 結果が入力と同じ順序で返り、すべて成功している
+  - スタブが受信したリクエストが、どの窓でも予算（リクエスト数・トークン数）を超えていない
+  - 429・503を返したリクエストが再試行されている（返した件数だけ受信が増えている）
+1つでも失敗すれば終了コード1で終わる。
+
+    python benchmarks/rate_limit_check.py --contracts 24 --rpm 90 --tpm 400000 --window 2
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.catalog_consistency import Checker
+from benchmarks.corpus import rental_contract, service_contract
+from benchmarks.stub_server import StubServer, StubConfig
+
+
+def write_contracts(directory: Path, count: int, seed: int) -> list:
+    """賃貸・業務委託の契約書を交互に count 件書き、パスを返す"""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        contract_type = "rental" if i % 2 == 0 else "service"
+        content, _ = rental_contract(rng) if contract_type == "rental" else service_contract(rng)
+        path = directory / f"{contract_type}_contract_{i:04d}.txt"
+        path.write_text(content, encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def window_peaks(requests: list, window: float) -> tuple:
+    """どの window 秒の窓でも受信したリクエスト数・トークン数の最大値"""
+    peak_requests = 0
+    peak_tokens = 0
+    start = 0
+    tokens = 0
+    for end, (received_at, request_tokens, _) in enumerate(requests):
+        tokens += request_tokens
+        while requests[start][0] <= received_at - window:
+            tokens -= requests[start][1]
+            start += 1
+        peak_requests = max(peak_requests, end - start + 1)
+        peak_tokens = max(peak_tokens, tokens)
+    return peak_requests, peak_tokens
+
+
+@click.command()
+@click.option('--contracts', 'count', default=24, show_default=True, help='一括評価する契約書の件数')
+@click.option('--rpm', default=90.0, show_default=True, help='1分あたりのリクエスト数の予算')
+@click.option('--tpm', default=400000.0, show_default=True, help='1分あたりのトークン数の予算')
+@click.option('--window', default=2.0, show_default=True, help='予算を判定する窓の長さ（秒）')
+@click.option('--concurrency', default=8, show_default=True, help='一括評価の並列度')
+@click.option('--rate-429', default=0.2, show_default=True, help='予算と関係なく429を返す割合（0〜1）')
+@click.option('--rate-5xx', default=0.2, show_default=True, help='503を返す割合（0〜1）')
+@click.option('--seed', default=0, show_default=True, help='乱数の種')
+def main(count, rpm, tpm, window, concurrency, rate_429, rate_5xx, seed):
+    """予算・429・503を返すスタブに対して一括評価を実行し、順序・送信ペース・再試行を確認します"""
+    checker = Checker()
+    workdir = Path(tempfile.mkdtemp(prefix="rate_limit_check_"))
+    stub = StubServer(StubConfig(latency_ms=50, jitter_ms=30, langfuse_latency_ms=0, rate_429=rate_429,
+                                 retry_after_seconds=0.2, rate_5xx=rate_5xx, rpm_limit=rpm, tpm_limit=tpm,
+                                 limit_window_seconds=window, seed=seed)).start()
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-rate-limit-check",
+        "OPENAI_BASE_URL": f"{stub.url}/v1",
+        "LANGFUSE_HOST": stub.url,
+        "EVALUATION_CACHE_DIR": str(workdir / "evaluations"),
+        "JUDGE_RATE_LIMIT_WINDOW_SECONDS": str(window),
+        # ローカルのスタブまでの到着時間のばらつきは数十ミリ秒
+        "JUDGE_RATE_LIMIT_MARGIN_SECONDS": "0.2",
+        # 429・503が続いても成功するまで再試行させる
+        "JUDGE_MAX_RETRIES": "10"
+    })
+    try:
+        from agent.contract_judge import ContractJudge
+
+        paths = write_contracts(workdir, count, seed)
+        judge = ContractJudge(max_concurrency=concurrency, requests_per_minute=rpm, tokens_per_minute=tpm)
+        click.echo(f"⚖️ {count}件を一括評価しています（予算 {rpm:g}件・{tpm:g}トークン/分、窓 {window:g}秒）")
+        started = time.monotonic()
+        results = judge.batch_evaluate_contracts(paths, force=True)
+        elapsed = time.monotonic() - started
+        requests = sorted(stub.chat_requests())
+    finally:
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    checker.check("順序: 結果が入力と同じ順序", [result.get("file_path") for result in results] == paths)
+    failed = [result for result in results if not result.get("success")]
+    checker.check(f"成功: {count}件すべて評価できる", not failed, [result.get("error") for result in failed[:3]])
+
+    max_requests = max(1, int(rpm * window / 60))
+    max_tokens = tpm * window / 60
+    peak_requests, peak_tokens = window_peaks(requests, window)
+    click.echo(f"  📈 {len(requests)}件を{elapsed:.1f}秒で送信、{window:g}秒あたり最大 {peak_requests}件・{peak_tokens}トークン")
+    checker.check(f"ペース: {window:g}秒あたり{max_requests}件以内", peak_requests <= max_requests, peak_requests)
+    checker.check(f"ペース: {window:g}秒あたり{max_tokens:g}トークン以内", peak_tokens <= max_tokens, peak_tokens)
+    stats = stub.stats()
+    checker.check("ペース: 予算超過の429を受けない", not stats.get("openai_429_budget"), stats)
+    rejected = stats.get("openai_429", 0) + stats.get("openai_429_budget", 0) + stats.get("openai_503", 0)
+    checker.check("再試行: 429と503が発生している",
+                  stats.get("openai_429", 0) > 0 and stats.get("openai_503", 0) > 0, stats)
+    accepted = sum(1 for _, _, status in requests if status == 200)
+    checker.check("再試行: 429・503の分だけ送り直して全件が受け付けられる",
+                  accepted == count and len(requests) == count + rejected,
+                  f"受付 {accepted} / 受信 {len(requests)} / 拒否 {rejected}")
+
+    if checker.failures:
+        click.echo(f"❌ {checker.failures}件の確認に失敗しました")
+        sys.exit(1)
+    click.echo("✅ 一括評価は予算内のペースで送信し、429・503を再試行して入力順に結果を返しました")
+
+
+if __name__ == '__main__':
+    main()
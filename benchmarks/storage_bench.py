@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""合成コーパス上での DocumentStorage のマイクロベンチマーク
+
+--sizes の件数ごとに合成コーパス（corpus.py）を用意し、次の操作を計測する。
+  - open:            DocumentStorage の作成（カタログを開いて一覧を読み込むまで）
+  - list_all / list_type:  list_contracts（全件 / 種類指定）
+  - list_page:       list_contracts_page（最初の50件）
+  - search_keyword:  search_contracts（キーワード、関連度順）
+  - search_date:     search_contracts（1か月の日付範囲）
+  - search_type:     search_contracts（種類指定＋キーワード）
+  - lookup:          get_contract（ファイル名で1件）
+  - save:            save_contract（既に件数分ある保存先への保存。計測後に削除する）
+操作ごとに新しいプロセスで実行し、1回あたりの所要時間（中央値・p95）、プロセスの最大RSS、
+操作前からのRSSの増分、1回あたりのシステムコール数（/proc/self/io の読み書き系の回数、Linuxのみ）を出力する。
+
+    python benchmarks/storage_bench.py --sizes 1000,10000,100000 --output storage.json
+    python benchmarks/storage_bench.py --sizes 1000000 --corpus-root /data/corpora   # 生成済みのコーパスを再利用
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import resource
+import tempfile
+import statistics
+import multiprocessing
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.document_storage import DocumentStorage
+from agent.storage_layout import LAYOUTS
+from benchmarks.corpus import write_corpus, rental_contract
+
+OPERATIONS = ("open", "list_all", "list_type", "list_page", "search_keyword", "search_date", "search_type",
+              "lookup", "save")
+SEARCH_TERMS = ("敷金", "秘密保持", "サンライズ", "佐藤", "データ分析", "存在しない語句")
+
+
+def syscall_counts() -> dict:
+    """読み込み系・書き込み系のシステムコールの累計回数（取得できなければ空）"""
+    try:
+        with open("/proc/self/io", 'r') as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return {'read': int(values['syscr']), 'write': int(values['syscw'])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+def max_rss_mb() -> float:
+    """プロセスの最大RSS（Linux は KB、macOS はバイト単位で返る）"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def sample_names(storage: DocumentStorage, count: int, seed: int = 0) -> list:
+    """契約書のファイル名を count 件選ぶ（全件をメモリに載せずにリザーバーサンプリング）"""
+    rng = random.Random(seed)
+    names = []
+    seen = 0
+    for directory in (storage.rental_dir, storage.service_dir):
+        for file_path in storage.layout.iter_contract_files(directory):
+            seen += 1
+            if len(names) < count:
+                names.append(file_path.name)
+            elif rng.randrange(seen) < count:
+                names[rng.randrange(count)] = file_path.name
+    return names
+
+
+def prepare(operation: str, base_dir: str, repeat: int):
+    """計測する1回分の処理を返す（準備の時間とメモリは計測に含めない）"""
+    if operation == "open":
+        def run(i):
+            DocumentStorage(base_dir).catalog.close()
+        return run, None
+
+    storage = DocumentStorage(base_dir)
+    if operation == "list_all":
+        return lambda i: storage.list_contracts(), storage
+    if operation == "list_type":
+        return lambda i: storage.list_contracts(("rental", "service")[i % 2]), storage
+    if operation == "list_page":
+        return lambda i: storage.list_contracts_page(limit=50), storage
+    if operation == "search_keyword":
+        return lambda i: storage.search_contracts(SEARCH_TERMS[i % len(SEARCH_TERMS)], sort="relevance"), storage
+    if operation == "search_date":
+        months = ["2024-%02d" % month for month in range(1, 13)]
+        return lambda i: storage.search_contracts(date_from=f"{months[i % 12]}-01",
+                                                  date_to=f"{months[i % 12]}-28"), storage
+    if operation == "search_type":
+        return lambda i: storage.search_contracts(SEARCH_TERMS[i % len(SEARCH_TERMS)],
+                                                  contract_type=("rental", "service")[i % 2]), storage
+    if operation == "lookup":
+        names = sample_names(storage, repeat)
+        return lambda i: storage.get_contract(names[i % len(names)]), storage
+    if operation == "save":
+        rng = random.Random(1)
+        bodies = [rental_contract(rng) for _ in range(min(repeat, 100))]
+        saved = []
+
+        def run(i):
+            content, params = bodies[i % len(bodies)]
+            saved.append(storage.save_contract("rental", content, dict(params)))
+        run.saved = saved
+        return run, storage
+    raise ValueError(f"Unknown operation: {operation}")
+
+
+def measure(operation: str, base_dir: str, repeat: int, queue):
+    """新しいプロセスで1つの操作を repeat 回計測し、結果を queue に入れる"""
+    run, storage = prepare(operation, base_dir, repeat)
+    rss_before = max_rss_mb()
+    calls_before = syscall_counts()
+    latencies = []
+    results = None
+    for i in range(repeat):
+        started = time.perf_counter()
+        results = run(i)
+        latencies.append(time.perf_counter() - started)
+    calls_after = syscall_counts()
+    result = {
+        'repeat': repeat,
+        'median_ms': round(statistics.median(latencies) * 1000, 4),
+        'p95_ms': round(sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 4),
+        'peak_rss_mb': round(max_rss_mb(), 1),
+        'rss_growth_mb': round(max_rss_mb() - rss_before, 1),
+        'syscalls_per_op': {key: round((calls_after[key] - calls_before[key]) / repeat, 1)
+                            for key in calls_after} or None
+    }
+    if isinstance(results, list):
+        result['result_count'] = len(results)
+    # 保存した契約書を消し、次の計測（と再利用するコーパス）に影響させない
+    for file_path in getattr(run, "saved", ()):
+        storage.delete_contract(Path(file_path).name)
+    if storage is not None:
+        storage.catalog.close()
+    queue.put(result)
+
+
+def run_isolated(operation: str, base_dir: str, repeat: int) -> dict:
+    # spawn で起動し、親プロセスのメモリを最大RSSに含めない
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(operation, base_dir, repeat, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def corpus_for(size: int, corpus_root: Path, layout: str) -> str:
+    """件数分のコーパス（corpus_root/<layout>-<件数> にあれば再利用）"""
+    base_dir = corpus_root / f"{layout}-{size}"
+    # 生成し終えたコーパスにだけ印を付け、途中で止まったものは作り直す
+    marker = base_dir / ".corpus.json"
+    if not marker.exists():
+        shutil.rmtree(base_dir, ignore_errors=True)
+        click.echo(f"🌱 {size}件のコーパスを生成しています ({base_dir})", err=True)
+        started = time.perf_counter()
+        write_corpus(str(base_dir), size, layout).catalog.close()
+        marker.write_text(json.dumps({'count': size, 'layout': layout}), encoding='utf-8')
+        click.echo(f"   {time.perf_counter() - started:.1f}秒", err=True)
+    return str(base_dir)
+
+
+@click.command()
+@click.option('--sizes', default="1000,10000", show_default=True, help='コーパスの件数（カンマ区切り）')
+@click.option('--operation', 'operations', multiple=True, type=click.Choice(OPERATIONS),
+              help='計測する操作（複数指定可、省略時は全て）')
+@click.option('--repeat', default=20, show_default=True, help='一覧・検索の計測回数')
+@click.option('--lookups', default=1000, show_default=True, help='get_contract の計測回数')
+@click.option('--saves', default=200, show_default=True, help='save_contract の計測回数')
+@click.option('--layout', default="flat", type=click.Choice(LAYOUTS), show_default=True, help='コーパスの配置')
+@click.option('--corpus-root', type=click.Path(file_okay=False), help='コーパスの置き場所（指定すると残して再利用する）')
+@click.option('--output', type=click.Path(dir_okay=False), help='結果JSONの保存先')
+def main(sizes, operations, repeat, lookups, saves, layout, corpus_root, output):
+    """合成コーパスの件数ごとに保存・一覧・検索・参照の所要時間、最大RSS、システムコール数を計測します"""
+    operations = list(operations) or list(OPERATIONS)
+    repeats = {'open': 3, 'lookup': lookups, 'save': saves}
+    root = Path(corpus_root) if corpus_root else Path(tempfile.mkdtemp(prefix="storage_bench_"))
+    root.mkdir(parents=True, exist_ok=True)
+    report = {'layout': layout, 'python': sys.version.split()[0], 'sizes': {}}
+    try:
+        for size in (int(value) for value in sizes.split(",")):
+            base_dir = corpus_for(size, root, layout)
+            results = report['sizes'][str(size)] = {}
+            click.echo(f"\n📦 {size}件 ({layout})", err=True)
+            click.echo(f"  {'operation':<16}{'中央値':>12}{'p95':>12}{'最大RSS':>10}{'RSS増分':>10}{'syscalls/op':>14}", err=True)
+            for operation in operations:
+                result = results[operation] = run_isolated(operation, base_dir, repeats.get(operation, repeat))
+                calls = result['syscalls_per_op']
+                calls_text = f"{calls['read']:.0f}r/{calls['write']:.0f}w" if calls else "-"
+                click.echo(
+                    f"  {operation:<16}{result['median_ms']:>10.3f}ms{result['p95_ms']:>10.3f}ms"
+                    f"{result['peak_rss_mb']:>8.1f}MB{result['rss_growth_mb']:>8.1f}MB{calls_text:>14}", err=True
+                )
+    finally:
+        if not corpus_root:
+            shutil.rmtree(root, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        click.echo(f"📁 結果: {output}", err=True)
+    else:
+        click.echo(text)
+
+
+if __name__ == '__main__':
+    main()
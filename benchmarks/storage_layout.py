@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""契約書ファイルの配置（flat / month / hash）ごとの一覧・検索・保存の計測
+
+配置ごとに一時ディレクトリへ --count 件の契約書（本文＋メタデータ）を直接書き込み、
+次の所要時間を比べる。
+  - list:   全契約書ファイルの列挙（カタログ再構築・整合性チェック・監視の起動時と同じ走査）
+  - lookup: ファイル名から配置で求めたパスへの stat（ファイル名で引くAPIと同じ解決）
+  - save:   既に --count 件ある保存先への save_contract（カタログ登録を含む）
+
+    python benchmarks/storage_layout.py --count 100000 --saves 1000
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import secrets
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.document_storage import DocumentStorage
+from agent.storage_layout import LAYOUTS
+
+BODY = "第1条（目的）本契約は計測用である。\n" * 20
+
+
+def populate(storage: DocumentStorage, count: int) -> list:
+    """カタログを通さずに count 件を配置どおりに書き込み、ファイル名を返す（2年分の日付に分散）"""
+    started = datetime(2024, 1, 1)
+    names = []
+    for i in range(count):
+        contract_type = "rental" if i % 2 == 0 else "service"
+        created_at = started + timedelta(minutes=i * 10)
+        name = f"{contract_type}_contract_{created_at.strftime('%Y%m%d_%H%M%S_%f')}_{secrets.token_hex(3)}.txt"
+        file_path = storage.layout.path_for(storage.base_dir / contract_type, name)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(BODY, encoding='utf-8')
+        metadata = {'created_at': created_at.isoformat(), 'file_path': str(file_path), 'contract_type': contract_type}
+        file_path.with_name(f"{name}.metadata.json").write_text(json.dumps(metadata), encoding='utf-8')
+        names.append(name)
+    return names
+
+
+def measure(layout: str, count: int, saves: int, lookups: int) -> dict:
+    base_dir = tempfile.mkdtemp(prefix=f"layout_{layout}_")
+    try:
+        # 空のカタログを作ってから書き込み、開き直したときに全件再構築されないようにする
+        DocumentStorage(base_dir, layout=layout).catalog.close()
+        storage = DocumentStorage(base_dir)
+        t = time.perf_counter()
+        names = populate(storage, count)
+        timings = {'populate': time.perf_counter() - t}
+
+        t = time.perf_counter()
+        listed = sum(1 for directory in (storage.rental_dir, storage.service_dir)
+                     for _ in storage.layout.iter_contract_files(directory))
+        timings['list'] = time.perf_counter() - t
+        assert listed == count, (listed, count)
+
+        sample = random.sample(names, min(lookups, len(names)))
+        t = time.perf_counter()
+        for name in sample:
+            directory = storage.rental_dir if name.startswith("rental") else storage.service_dir
+            os.stat(storage.layout.path_for(directory, name))
+        timings['lookup'] = (time.perf_counter() - t) / len(sample)
+
+        latencies = []
+        for i in range(saves):
+            t = time.perf_counter()
+            storage.save_contract("rental" if i % 2 == 0 else "service", BODY, {'index': i})
+            latencies.append(time.perf_counter() - t)
+        latencies.sort()
+        timings['save_median'] = statistics.median(latencies)
+        timings['save_p99'] = latencies[int(len(latencies) * 0.99) - 1]
+        storage.catalog.close()
+        return timings
+    finally:
+        shutil.rmtree(base_dir)
+
+
+@click.command()
+@click.option('--count', default=100000, show_default=True, help='事前に置く契約書の件数')
+@click.option('--saves', default=1000, show_default=True, help='計測する保存回数')
+@click.option('--lookups', default=10000, show_default=True, help='計測するファイル名での参照回数')
+@click.option('--layout', 'layouts', multiple=True, type=click.Choice(LAYOUTS), default=LAYOUTS, show_default=True,
+              help='計測する配置（複数指定可）')
+def main(count, saves, lookups, layouts):
+    """配置ごとに一覧・参照・保存の所要時間を計測します"""
+    click.echo(f"📂 配置ごとの計測 ({count}件, 保存{saves}回, 参照{lookups}回)")
+    click.echo(f"  {'layout':<8}{'populate':>12}{'list':>12}{'lookup':>12}{'save 中央値':>14}{'save p99':>12}")
+    for layout in layouts:
+        timings = measure(layout, count, saves, lookups)
+        click.echo(
+            f"  {layout:<8}{timings['populate']:>11.1f}s{timings['list'] * 1000:>10.0f}ms"
+            f"{timings['lookup'] * 1e6:>10.1f}µs{timings['save_median'] * 1000:>12.2f}ms"
+            f"{timings['save_p99'] * 1000:>10.2f}ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""複数プロセスからの同時保存の負荷試験
+
+多数のプロセスが同じ保存先に同時に契約書を保存し、
+ファイル・メタデータ・カタログのいずれも欠けたり上書きされたりしていないことを確認する。
+
+    python benchmarks/stress_save.py --processes 8 --per-process 50
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.document_storage import DocumentStorage
+
+
+def save_many(base_dir: str, worker: int, count: int, start_event) -> list:
+    storage = DocumentStorage(base_dir)
+    start_event.wait()
+    saved = []
+    for i in range(count):
+        contract_type = "rental" if i % 2 == 0 else "service"
+        content = f"worker={worker} index={i}\n" + "第1条（目的）本契約は検証用である。\n" * 20
+        file_path = storage.save_contract(contract_type, content, {"worker": worker, "index": i})
+        saved.append(file_path)
+    return saved
+
+
+@click.command()
+@click.option('--processes', default=8, show_default=True, help='同時に保存するプロセス数')
+@click.option('--per-process', default=50, show_default=True, help='1プロセスあたりの保存件数')
+@click.option('--keep', is_flag=True, help='保存先の一時ディレクトリを削除しない')
+def main(processes, per_process, keep):
+    """複数プロセスから同時に保存し、欠落や上書きがないことを確認します"""
+    base_dir = tempfile.mkdtemp(prefix="stress_save_")
+    # カタログを先に作っておき、全プロセスが同じ状態から始める
+    DocumentStorage(base_dir).catalog.close()
+
+    manager = multiprocessing.Manager()
+    start_event = manager.Event()
+    with multiprocessing.Pool(processes) as pool:
+        pending = [pool.apply_async(save_many, (base_dir, w, per_process, start_event)) for w in range(processes)]
+        time.sleep(1.0)
+        started = time.perf_counter()
+        start_event.set()
+        saved = [path for result in pending for path in result.get()]
+        elapsed = time.perf_counter() - started
+
+    expected = processes * per_process
+    storage = DocumentStorage(base_dir)
+    errors = []
+    if len(set(saved)) != expected:
+        errors.append(f"返されたパスの重複: {expected - len(set(saved))}件")
+
+    on_disk = [p for d in ("rental", "service") for p in (Path(base_dir) / d).rglob("*.txt")]
+    if len(on_disk) != expected:
+        errors.append(f"本文ファイル数 {len(on_disk)} != {expected}")
+
+    # 本文とメタデータの組み合わせが保存時のままか確認する
+    for contract in storage.list_contracts():
+        metadata = contract['metadata']
+        content = Path(contract['file_path']).read_text(encoding='utf-8')
+        if not content.startswith(f"worker={metadata['worker']} index={metadata['index']}\n"):
+            errors.append(f"本文とメタデータが一致しません: {contract['file_path']}")
+
+    if storage.catalog.count() != expected:
+        errors.append(f"カタログ件数 {storage.catalog.count()} != {expected}")
+    problems = storage.verify_catalog()
+    if any(problems.values()):
+        errors.append(f"カタログ不整合: {problems}")
+    leftovers = [p.name for d in ("rental", "service") for p in (Path(base_dir) / d).glob(".*.tmp")]
+    if leftovers:
+        errors.append(f"一時ファイルが残っています: {len(leftovers)}件")
+    storage.catalog.close()
+
+    click.echo(f"💾 {processes}プロセス × {per_process}件 = {expected}件を {elapsed:.2f}秒で保存 "
+               f"({expected / elapsed:.0f}件/秒)")
+    if not keep:
+        shutil.rmtree(base_dir)
+    if errors:
+        for error in errors[:20]:
+            click.echo(f"❌ {error}")
+        sys.exit(1)
+    click.echo("✅ 欠落・上書きなし")
+
+
+if __name__ == '__main__':
+    main()
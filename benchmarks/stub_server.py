@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""OpenAI chat completions と LangFuse の代わりをするローカルのスタブサーバー
+
+負荷試験で実際のAPIを呼ばずに済むよう、次のエンドポイントだけを実装する。
+  - POST /v1/chat/completions   契約書の本文または評価JSONを返す（stream=true ならSSE）
+  - GET  /api/public/projects   プロジェクト1件
+  - POST /api/public/ingestion  全件成功（207。ingestion_status で停止中の応答（503など）にできる）
+  - GET  /stats                 エンドポイントごとの受信数・429を返した数
+応答までの待ち時間、ストリーミングのトークン間隔、429・5xxを返す割合を指定できる。
+rpm_limit / tpm_limit を指定すると OpenAI と同じく直近 limit_window_seconds 秒の受付数・トークン数
+（プロンプトの文字数＋max_tokens）で予算を判定し、超えたリクエストには Retry-After 付きの429を返す。
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 と LANGFUSE_HOST=http://127.0.0.1:<port> を設定して使う。
+
+    python benchmarks/stub_server.py --port 8900 --latency-ms 800 --rate-429 0.05
+    python benchmarks/stub_server.py --rpm-limit 60 --tpm-limit 30000
+"""
+import json
+import time
+import random
+import socket
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import click
+
+CONTRACT_BODY = "\n".join(
+    f"第{i}条（条項{i}）甲及び乙は、本契約に定める事項を誠実に履行するものとする。" for i in range(1, 21)
+)
+
+EVALUATION_BODY = json.dumps({
+    "overall_score": 78,
+    "scores": {
+        "legal_compliance": 8,
+        "completeness": 7,
+        "clarity": 8,
+        "risk_management": 7,
+        "practicality": 8
+    },
+    "strengths": ["条項が網羅されている"],
+    "weaknesses": ["解約条件がやや曖昧"],
+    "recommendations": ["解約予告期間を明記する"],
+    "legal_issues": [],
+    "grade": "B",
+    "summary": "負荷試験用の固定の評価結果"
+}, ensure_ascii=False)
+
+
+def chunk_evaluation(prompt: str) -> str:
+    """チャンク評価のプロンプトなら、渡された評価項目をすべて記載ありとした評価JSONを返す"""
+    if "covered_items" not in prompt or "【評価項目】" not in prompt:
+        return ""
+    items = []
+    for line in prompt.split("【評価項目】", 1)[1].splitlines()[1:]:
+        if not line.startswith("- "):
+            break
+        items.append(line[2:])
+    return json.dumps({
+        "scores": {"legal_compliance": 8, "clarity": 8, "risk_management": 7, "practicality": 8},
+        "covered_items": items,
+        "strengths": ["条項が具体的"],
+        "weaknesses": [],
+        "recommendations": [],
+        "legal_issues": []
+    }, ensure_ascii=False)
+
+
+class StubConfig:
+    """スタブの応答の設定（実行中に書き換えてもよい）"""
+
+    def __init__(self, latency_ms: float = 500, jitter_ms: float = 100, token_delay_ms: float = 5,
+                 chunk_chars: int = 20, rate_429: float = 0.0, retry_after_seconds: float = 1,
+                 langfuse_latency_ms: float = 20, output_ms_per_token: float = 0, ingestion_status: int = 207,
+                 rpm_limit: float = 0, tpm_limit: float = 0, limit_window_seconds: float = 60,
+                 rate_5xx: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        # 出力トークン数に比例する生成時間（ストリーミングしない応答に加算する）
+        self.output_ms_per_token = output_ms_per_token
+        self.jitter_ms = jitter_ms
+        self.token_delay_ms = token_delay_ms
+        self.chunk_chars = chunk_chars
+        self.rate_429 = rate_429
+        self.retry_after_seconds = retry_after_seconds
+        # 1分あたりの予算（0は無制限）。直近 limit_window_seconds 秒の受付分を窓の長さに換算した予算と比べる
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.limit_window_seconds = limit_window_seconds
+        # 503を返す割合（0〜1）
+        self.rate_5xx = rate_5xx
+        self.langfuse_latency_ms = langfuse_latency_ms
+        # 取り込みAPIの応答ステータス（207以外は全件を受け付けずにそのステータスを返す）
+        self.ingestion_status = ingestion_status
+        self.random = random.Random(seed)
+
+    def as_dict(self) -> dict:
+        return {key: value for key, value in vars(self).items() if key != "random"}
+
+
+class SlidingWindowBudget:
+    """直近 limit_window_seconds 秒に受け付けたリクエスト数・トークン数で予算を判定する"""
+
+    def __init__(self):
+        self._accepted = deque()  # (受付時刻, トークン数)
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def admit(self, config: StubConfig, tokens: int) -> float:
+        """予算内なら受け付けて0を、超えるなら受け付けられるようになるまでの秒数を返す"""
+        window = config.limit_window_seconds
+        max_requests = config.rpm_limit * window / 60
+        max_tokens = config.tpm_limit * window / 60
+        with self._lock:
+            now = time.monotonic()
+            while self._accepted and self._accepted[0][0] <= now - window:
+                self._tokens -= self._accepted.popleft()[1]
+            wait = 0.0
+            if config.rpm_limit and len(self._accepted) + 1 > max(1, int(max_requests)):
+                wait = self._accepted[len(self._accepted) - max(1, int(max_requests))][0] + window - now
+            if config.tpm_limit and self._accepted and self._tokens + tokens > max_tokens:
+                excess = self._tokens + tokens - max_tokens
+                for accepted_at, accepted_tokens in self._accepted:
+                    excess -= accepted_tokens
+                    if excess <= 0:
+                        break
+                wait = max(wait, accepted_at + window - now)
+            if wait > 0:
+                return wait
+            self._accepted.append((now, tokens))
+            self._tokens += tokens
+            return 0.0
+
+
+class StubStats:
+    def __init__(self):
+        self._counts = {}
+        # chat completions の受信記録（受信時刻 time.monotonic(), 予算上のトークン数, 応答ステータス）
+        self._chat_requests = []
+        # 取り込みAPIで受け付けたイベントのID（body.id、なければイベント自体のID） -> 受け付けた回数
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key: str):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def accept_events(self, event_ids: list):
+        with self._lock:
+            for event_id in event_ids:
+                self._events[event_id] = self._events.get(event_id, 0) + 1
+
+    def record_chat(self, received_at: float, tokens: int, status: int):
+        with self._lock:
+            self._chat_requests.append((received_at, tokens, status))
+
+    def chat_requests(self) -> list:
+        with self._lock:
+            return list(self._chat_requests)
+
+    def events(self) -> dict:
+        with self._lock:
+            return dict(self._events)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "OpenAIStub/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self) -> StubConfig:
+        return self.server.config
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body) if body else {}
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/api/public/projects"):
+            self.server.stats.inc("langfuse_projects")
+            self._send_json(200, {"data": [{"id": "benchmark", "name": "benchmark"}]})
+        elif self.path == "/stats":
+            self._send_json(200, {"requests": self.server.stats.snapshot(), "config": self.config.as_dict()})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.endswith("/chat/completions"):
+            self._chat_completions(self._read_json())
+        elif self.path.startswith("/api/public/ingestion"):
+            batch = self._read_json().get("batch", [])
+            self.server.stats.inc("langfuse_ingestion")
+            time.sleep(self.config.langfuse_latency_ms / 1000)
+            if self.config.ingestion_status != 207:
+                self.server.stats.inc(f"langfuse_ingestion_{self.config.ingestion_status}")
+                self._send_json(self.config.ingestion_status, {"message": "ingestion unavailable (stub)"})
+                return
+            self.server.stats.accept_events([(event.get("body") or {}).get("id") or event.get("id") for event in batch])
+            self._send_json(207, {"successes": [{"id": event.get("id"), "status": 201} for event in batch], "errors": []})
+        else:
+            self._read_json()
+            self._send_json(404, {"error": "not found"})
+
+    def _rate_limited(self, retry_after: float):
+        self._send_json(429, {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_exceeded",
+                                        "code": "rate_limit_exceeded"}},
+                        {"Retry-After": f"{retry_after:.3f}"})
+
+    def _chat_completions(self, request: dict):
+        config = self.config
+        received_at = time.monotonic()
+        self.server.stats.inc("openai_chat")
+        messages = request.get("messages") or [{}]
+        # 予算は OpenAI と同じく、受信時点のプロンプトの量＋最大出力トークン数で数える
+        budget_tokens = (sum(len(str(message.get("content", ""))) for message in messages)
+                         + (request.get("max_tokens") or 0))
+        if config.random.random() < config.rate_429:
+            self.server.stats.inc("openai_429")
+            self.server.stats.record_chat(received_at, budget_tokens, 429)
+            self._rate_limited(config.retry_after_seconds)
+            return
+        if config.rate_5xx and config.random.random() < config.rate_5xx:
+            self.server.stats.inc("openai_503")
+            self.server.stats.record_chat(received_at, budget_tokens, 503)
+            self._send_json(503, {"error": {"message": "Service unavailable (stub)", "type": "server_error"}})
+            return
+        if config.rpm_limit or config.tpm_limit:
+            retry_after = self.server.budget.admit(config, budget_tokens)
+            if retry_after:
+                self.server.stats.inc("openai_429_budget")
+                self.server.stats.record_chat(received_at, budget_tokens, 429)
+                self._rate_limited(retry_after)
+                return
+        self.server.stats.record_chat(received_at, budget_tokens, 200)
+
+        # 評価（システムプロンプトが「評価」）ならJSON、それ以外は契約書の本文を返す
+        if "評価" in str(messages[0].get("content", "")):
+            content = chunk_evaluation(messages[-1].get("content", "")) or EVALUATION_BODY
+        else:
+            content = CONTRACT_BODY
+        # トークン数は文字数で近似する（日本語はおおむね1文字1トークン）
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content),
+                 "total_tokens": prompt_tokens + len(content)}
+        delay_ms = config.latency_ms + config.random.uniform(-1, 1) * config.jitter_ms
+        if not request.get("stream"):
+            delay_ms += len(content) * config.output_ms_per_token
+        time.sleep(max(0.0, delay_ms) / 1000)
+
+        completion_id = f"chatcmpl-stub-{time.time_ns()}"
+        model = request.get("model", "stub")
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        self.server.stats.inc("openai_stream")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None, chunk_usage=None):
+            return json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                "usage": chunk_usage
+            }, ensure_ascii=False)
+
+        try:
+            event(chunk({"role": "assistant", "content": ""}))
+            for start in range(0, len(content), config.chunk_chars):
+                time.sleep(config.token_delay_ms / 1000)
+                event(chunk({"content": content[start:start + config.chunk_chars]}))
+            event(chunk({}, "stop"))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                event(chunk(None, chunk_usage=usage))
+            event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # 受信側がストリーミングの途中で切断した
+            self.server.stats.inc("openai_stream_cancelled")
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 既定の listen のバックログ（5）では同時接続が溢れ、SYNの再送で約1秒遅れる接続が出る
+    request_queue_size = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._connections_lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def close_connections(self):
+        """keep-alive の接続を切る（停止後に古い接続で応答し続けないようにする）"""
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class StubServer:
+    """スタブサーバーをバックグラウンドのスレッドで動かす"""
+
+    def __init__(self, config: StubConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = StubHTTPServer((host, port), StubHandler)
+        self.httpd.config = config or StubConfig()
+        self.httpd.stats = StubStats()
+        self.httpd.budget = SlidingWindowBudget()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def config(self) -> StubConfig:
+        return self.httpd.config
+
+    def stats(self) -> dict:
+        return self.httpd.stats.snapshot()
+
+    def chat_requests(self) -> list:
+        """chat completions の受信記録（受信時刻, 予算上のトークン数, 応答ステータス）"""
+        return self.httpd.stats.chat_requests()
+
+    def ingested_events(self) -> dict:
+        """取り込みAPIで受け付けたイベントID -> 受け付けた回数"""
+        return self.httpd.stats.events()
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="openai-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止する（以後の接続は拒否される）"""
+        self.httpd.shutdown()
+        self.httpd.close_connections()
+        self.httpd.server_close()
+
+
+@click.command()
+@click.option('--port', default=8900, show_default=True)
+@click.option('--latency-ms', default=500.0, show_default=True, help='応答（ストリーミングは最初のチャンク）までの待ち時間')
+@click.option('--jitter-ms', default=100.0, show_default=True, help='待ち時間のばらつき（±）')
+@click.option('--token-delay-ms', default=5.0, show_default=True, help='ストリーミングのチャンク間隔')
+@click.option('--rate-429', default=0.0, show_default=True, help='429を返す割合（0〜1）')
+@click.option('--retry-after', default=1.0, show_default=True, help='429の Retry-After（秒）')
+@click.option('--rate-5xx', default=0.0, show_default=True, help='503を返す割合（0〜1）')
+@click.option('--rpm-limit', default=0.0, show_default=True, help='1分あたりのリクエスト数の予算（0は無制限）')
+@click.option('--tpm-limit', default=0.0, show_default=True, help='1分あたりのトークン数の予算（0は無制限）')
+@click.option('--limit-window-seconds', default=60.0, show_default=True, help='予算を判定する窓の長さ（秒）')
+def main(port, latency_ms, jitter_ms, token_delay_ms, rate_429, retry_after, rate_5xx, rpm_limit, tpm_limit,
+         limit_window_seconds):
+    """OpenAI / LangFuse のスタブサーバーを起動します"""
+    config = StubConfig(latency_ms=latency_ms, jitter_ms=jitter_ms, token_delay_ms=token_delay_ms,
+                        rate_429=rate_429, retry_after_seconds=retry_after, rate_5xx=rate_5xx,
+                        rpm_limit=rpm_limit, tpm_limit=tpm_limit, limit_window_seconds=limit_window_seconds)
+    server = StubServer(config, port=port)
+    click.echo(f"🧪 スタブサーバー: {server.url}")
+    click.echo(f"   OPENAI_BASE_URL={server.url}/v1")
+    click.echo(f"   LANGFUSE_HOST={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""LangFuse停止中のテレメトリ保存と復旧後の再送の確認
+
+スタブサーバー（stub_server.py）を LangFuse の代わりにして、一時ディレクトリの spool を使う
+LangfuseExporter に次の順でトレースを送り、スタブが受け付けたトレースIDを確かめる。
+  - online:    正常時はそのまま送信され、spool に何も残らない
+  - outage:    取り込みAPIが503を返す間と、スタブを止めて接続を拒否する間のイベントは spool に保存される
+  - recovery:  スタブを同じポートで起動し直すと、保存したイベントがすべて1回ずつ再送される
+  - restart:   別プロセスが書き込み中（.active）・再送中（.replaying）のセグメントを残したまま、
+               動いている間は取り上げず、強制終了した後に起動した exporter が残りを再送する
+1つでも失敗すれば終了コード1で終わる。
+
+    python benchmarks/telemetry_spool.py --events 200
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import telemetry
+from agent.telemetry import LangfuseExporter, TelemetrySpool
+from benchmarks.catalog_consistency import Checker
+from benchmarks.stub_server import StubServer, StubConfig
+
+
+def wait_until(predicate, timeout: float = 15.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+def make_exporter(url: str, spool_dir: Path) -> LangfuseExporter:
+    # 再送の間隔を短くし、送信失敗は1回で spool に回す
+    return LangfuseExporter(url, "pk-lf-check", "sk-lf-check", batch_size=20, flush_interval=0.05,
+                            timeout=1.0, max_retries=1, spool=TelemetrySpool(str(spool_dir)),
+                            replay_min_interval=0.2)
+
+
+def send_events(exporter: LangfuseExporter, count: int) -> list:
+    trace_ids = [str(uuid.uuid4()) for _ in range(count)]
+    for trace_id in trace_ids:
+        exporter.trace(trace_id, "telemetry-spool-check")
+    exporter.flush(timeout=30)
+    return trace_ids
+
+
+def segments(spool_dir: Path, pattern: str) -> list:
+    return sorted(path.name for path in spool_dir.glob(pattern))
+
+
+def leave_segments(spool_dir: str, active_ids: list, replaying_ids: list, ready):
+    """書き込み中と再送中のセグメントを1つずつ持ったまま、強制終了されるまで待つ"""
+    spool = TelemetrySpool(spool_dir)
+    spool.append([{"id": event_id, "type": "trace-create", "body": {"id": event_id}} for event_id in replaying_ids])
+    spool.claim()
+    spool.append([{"id": event_id, "type": "trace-create", "body": {"id": event_id}} for event_id in active_ids])
+    ready.set()
+    time.sleep(3600)
+
+
+def run_restart(checker: Checker, stub: StubServer, spool_dir: Path, count: int):
+    active_ids = [str(uuid.uuid4()) for _ in range(count)]
+    replaying_ids = [str(uuid.uuid4()) for _ in range(count)]
+    ready = multiprocessing.Event()
+    owner = multiprocessing.Process(target=leave_segments,
+                                    args=(str(spool_dir), active_ids, replaying_ids, ready))
+    owner.start()
+    ready.wait(30)
+    left = segments(spool_dir, "*.active") + segments(spool_dir, "*.replaying")
+    checker.check("restart: 別プロセスの .active と .replaying がある", len(left) == 2, left)
+
+    if telemetry.fcntl is not None:
+        exporter = make_exporter(stub.url, spool_dir)
+        exporter.start()
+        time.sleep(1.0)
+        still = segments(spool_dir, "*.active") + segments(spool_dir, "*.replaying")
+        checker.check("restart: 動いているプロセスのセグメントは取り上げない", still == left, still)
+        exporter.close()
+    else:
+        click.echo("  ⏭️ ファイルロックのない環境（Windows）では単一プロセスでのみ使うため、動作中のプロセスの確認を省きます")
+
+    owner.kill()
+    owner.join()
+    exporter = make_exporter(stub.url, spool_dir)
+    exporter.start()
+    received = lambda: stub.ingested_events()
+    checker.check("restart: 強制終了したプロセスの残りを再送",
+                  wait_until(lambda: all(event_id in received() for event_id in active_ids + replaying_ids)),
+                  f"{sum(event_id in received() for event_id in active_ids + replaying_ids)}/{2 * count}")
+    checker.check("restart: 再送後にセグメントとロックファイルが残らない",
+                  wait_until(lambda: not any(spool_dir.iterdir())), sorted(path.name for path in spool_dir.iterdir()))
+    exporter.close()
+
+
+@click.command()
+@click.option('--events', 'count', default=100, show_default=True, help='段階ごとに送るイベント数')
+def main(count):
+    """LangFuse停止中のテレメトリが保存され、復旧後・再起動後に1回ずつ再送されることを確認します"""
+    checker = Checker()
+    spool_dir = Path(tempfile.mkdtemp(prefix="telemetry_spool_"))
+    stub = StubServer(StubConfig(langfuse_latency_ms=0)).start()
+    port = stub.httpd.server_address[1]
+    try:
+        exporter = make_exporter(stub.url, spool_dir)
+        click.echo("📡 online")
+        online = send_events(exporter, count)
+        checker.check(f"online: {count}件を送信", all(event_id in stub.ingested_events() for event_id in online))
+        checker.check("online: spool は空", exporter.stats()['spool']['segments'] == 0, exporter.stats())
+
+        click.echo("📴 outage")
+        stub.config.ingestion_status = 503
+        unavailable = send_events(exporter, count)
+        checker.check("outage(503): 送れなかった分を spool に保存",
+                      exporter.stats()['spilled'] == count and exporter.stats()['offline'], exporter.stats())
+        stub.stop()
+        refused = send_events(exporter, count)
+        checker.check("outage(接続拒否): 送れなかった分を spool に保存",
+                      exporter.stats()['spilled'] == 2 * count, exporter.stats())
+        received = stub.ingested_events()
+        checker.check("outage: 停止中のイベントは受け付けられていない",
+                      not any(event_id in received for event_id in unavailable + refused))
+
+        click.echo("🔁 recovery")
+        stub = StubServer(StubConfig(langfuse_latency_ms=0), port=port).start()
+        expected = unavailable + refused
+        checker.check(f"recovery: 保存した{len(expected)}件を再送",
+                      wait_until(lambda: all(event_id in stub.ingested_events() for event_id in expected)),
+                      exporter.stats())
+        checker.check("recovery: 送信が復旧したと判断する", wait_until(lambda: not exporter.stats()['offline']),
+                      exporter.stats())
+        duplicated = [event_id for event_id, times in stub.ingested_events().items() if times > 1]
+        checker.check("recovery: 二重送信なし", not duplicated, duplicated[:3])
+        checker.check("recovery: spool は空", wait_until(lambda: exporter.stats()['spool']['segments'] == 0),
+                      exporter.stats())
+        exporter.close()
+
+        click.echo("♻️ restart")
+        run_restart(checker, stub, spool_dir, count)
+        duplicated = [event_id for event_id, times in stub.ingested_events().items() if times > 1]
+        checker.check("restart: 二重送信なし", not duplicated, duplicated[:3])
+    finally:
+        stub.stop()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    if checker.failures:
+        click.echo(f"❌ {checker.failures}件の確認に失敗しました")
+        sys.exit(1)
+    click.echo("✅ 停止中のテレメトリは保存され、復旧後に1回ずつ再送されました")
+
+
+if __name__ == '__main__':
+    main()
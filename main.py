@@ -2,6 +2,7 @@
 import click
 import os
 import sys
+import time
 from dotenv import load_dotenv
 
 # 環境変数をロード
@@ -12,6 +13,9 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from agent.document_agent import DocumentAgent
 from agent.document_storage import DocumentStorage
+from agent.storage_layout import LAYOUTS
+from agent.bulk_generation import BulkGenerator
+from agent.contract_screen import screen_contract, missing_items
 
 
 @click.group()
@@ -100,6 +104,71 @@ def service():
         click.echo(f"❌ エラーが発生しました: {e}")
 
 
+@cli.command()
+@click.option('--input', 'input_path', required=True, type=click.Path(exists=True, dir_okay=False),
+              help='1行1件のパラメータ（.jsonl または ヘッダー付き .csv）')
+@click.option('--type', 'contract_type', required=True, type=click.Choice(['rental', 'service']), help='契約書の種類')
+@click.option('--concurrency', default=4, show_default=True, help='同時に生成する件数')
+@click.option('--results', 'results_path', default=None, help='結果の出力先（省略時は <input>.results.jsonl）')
+def bulk(input_path, contract_type, concurrency, results_path):
+    """ファイルの各行から契約書をまとめて生成します（中断しても再実行で続きから再開）
+
+    パラメータのキーは rental / service コマンドの入力と同じです
+    （例: property_name, address, rent, deposit, key_money, period, landlord_name, tenant_name）。
+    """
+    results_path = results_path or f"{input_path}.results.jsonl"
+    agent = DocumentAgent()
+    storage = DocumentStorage()
+    generator = BulkGenerator(agent, storage, contract_type, concurrency)
+    
+    def report(entry):
+        if entry['success']:
+            click.echo(f"  ✅ {entry['index']}行目 {entry['latency_seconds']:.2f}秒 → {entry['file_path']}")
+        else:
+            click.echo(f"  ❌ {entry['index']}行目 {entry['error']}")
+    
+    click.echo(f"📋 {input_path} から{contract_type}契約書を生成します（同時実行数 {concurrency}）...")
+    summary = generator.run(input_path, results_path, progress=report)
+    
+    click.echo(f"\n📊 成功 {summary['succeeded']}件 / 失敗 {summary['failed']}件 / 生成済みのため省略 {summary['skipped']}件")
+    if summary['latency_median_seconds'] is not None:
+        click.echo(f"⏱️ 1件あたりの所要時間（中央値）: {summary['latency_median_seconds']:.2f}秒")
+    click.echo(f"🔢 トークン使用量: 入力 {summary['prompt_tokens']} / 出力 {summary['completion_tokens']}")
+    click.echo(f"📁 結果: {results_path}")
+    if summary['failed']:
+        sys.exit(1)
+
+
+@cli.command()
+@click.option('--type', 'contract_type', type=click.Choice(['rental', 'service']), help='契約書の種類（省略時は全件）')
+@click.option('--verbose', is_flag=True, help='条項が揃っている契約書も表示する')
+def prescreen(contract_type, verbose):
+    """保存された契約書の条項・金額の記載をルールで確認し、AI評価が必要な契約書を振り分けます（APIは呼びません）"""
+    storage = DocumentStorage()
+    contracts = storage.list_contracts(contract_type)
+    if not contracts:
+        click.echo("📭 保存された契約書はありません。")
+        return
+    
+    counts = {'fail': 0, 'borderline': 0, 'pass': 0}
+    labels = {'fail': "❌ 不備あり", 'borderline': "🔍 要AI評価", 'pass': "✅ 条項あり"}
+    started = time.perf_counter()
+    for contract in contracts:
+        screen = screen_contract(storage.read_content(contract), contract['type'], contract['metadata'])
+        counts[screen['decision']] += 1
+        if screen['decision'] == 'pass' and not verbose:
+            continue
+        click.echo(f"{labels[screen['decision']]} {screen['score']:>3}点 {os.path.basename(contract['file_path'])}")
+        for item, missing in missing_items(screen):
+            click.echo(f"    - {item}: {'、'.join(missing)}")
+        for mismatch in screen['amount_mismatches']:
+            click.echo(f"    - {mismatch}")
+    elapsed = time.perf_counter() - started
+    
+    click.echo(f"\n📊 不備あり {counts['fail']}件 / 要AI評価 {counts['borderline']}件 / 条項あり {counts['pass']}件 "
+               f"（{len(contracts)}件、1件あたり {elapsed / len(contracts) * 1000:.2f}ms）")
+
+
 @cli.command()
 def list_contracts():
     """保存された契約書一覧を表示します"""
@@ -127,5 +196,100 @@ def list_contracts():
         click.echo("-" * 60)
 
 
+@cli.command()
+@click.option('--check', is_flag=True, help='再構築せず整合性のみ確認')
+def rebuild_catalog(check):
+    """契約書カタログを既存ファイルから再構築します"""
+    storage = DocumentStorage()
+    
+    if not check:
+        count = storage.rebuild_catalog()
+        click.echo(f"✅ カタログを再構築しました ({count}件)")
+    
+    report = storage.verify_catalog()
+    if any(report.values()):
+        click.echo("⚠️ カタログとファイルに不整合があります:")
+        for key, label in [('missing', '未登録'), ('orphaned', 'ファイルなし'), ('stale', '更新あり')]:
+            for name in report[key]:
+                click.echo(f"  [{label}] {name}")
+        sys.exit(1)
+    
+    click.echo("✅ カタログはディスク上のファイルと一致しています")
+
+
+@cli.command()
+@click.argument('layout', type=click.Choice(LAYOUTS))
+def migrate_layout(layout):
+    """契約書ファイルの配置を変更します（flat / month / hash）
+
+    移行中はWebサーバーを停止してください。中断しても再実行すれば続きから移行します。
+    """
+    storage = DocumentStorage()
+    click.echo(f"📦 配置を {storage.layout.name} から {layout} へ移行します...")
+    result = storage.migrate_layout(layout, progress=lambda moved: click.echo(f"  {moved}件移動"))
+    click.echo(f"✅ 移行しました (移動 {result['moved']}件, 移動不要 {result['skipped']}件)")
+    
+    report = storage.verify_catalog()
+    if any(report.values()):
+        click.echo("⚠️ カタログとファイルに不整合があります。`python main.py rebuild-catalog` を実行してください")
+        sys.exit(1)
+
+
+@cli.command()
+@click.option('--older-than-days', default=180, show_default=True, help='作成からこの日数より前の契約書をアーカイブする')
+def archive(older_than_days):
+    """古い契約書を圧縮したアーカイブにまとめます
+
+    アーカイブ済みの契約書も一覧・検索・評価では通常の契約書と同じように扱われます。
+    """
+    storage = DocumentStorage()
+    click.echo(f"🗜️ {older_than_days}日より前の契約書をアーカイブします（{storage.archive.codec}）...")
+    result = storage.archive_contracts(older_than_days, progress=lambda done: click.echo(f"  {done}件アーカイブ"))
+    if not result['archived']:
+        click.echo("📭 アーカイブ対象の契約書はありません。")
+        return
+    click.echo(f"✅ {result['archived']}件をアーカイブしました "
+               f"({result['original_bytes'] / 1024:.0f}KB → {result['packed_bytes'] / 1024:.0f}KB)")
+
+
+@cli.command()
+def dedup_contracts():
+    """既存の契約書本文を内容アドレスの保存先にまとめ、参照を記録し直します
+
+    以前の版でハードリンクにしていた本文ファイルは契約書ごとの複製に置き換えます。
+    """
+    storage = DocumentStorage()
+    result = storage.dedup_contracts(progress=lambda done: click.echo(f"  {done}件確認"))
+    stats = storage.blobs.stats()
+    click.echo(f"✅ {result['checked']}件を確認し、{result['deduplicated']}件の重複をまとめました "
+               f"(本文 {stats['blobs']}種類, {stats['bytes'] / 1024:.0f}KB, 参照 {stats['references']}件)")
+    if result['privatized']:
+        click.echo(f"🔗 ハードリンクを共有していた{result['privatized']}件の本文ファイルを個別の複製にしました")
+
+
+@cli.command()
+@click.option('--grace-seconds', default=300, show_default=True, help='参照がなくなってからこの秒数たった本文だけを削除する')
+def gc_blobs(grace_seconds):
+    """どの契約書からも参照されていない本文を削除します"""
+    storage = DocumentStorage()
+    result = storage.blobs.gc(grace_seconds)
+    click.echo(f"🧹 {result['removed']}件の本文を削除しました ({result['freed_bytes'] / 1024:.0f}KB)")
+
+
+@cli.command()
+def verify_contents():
+    """本文を読み直してハッシュを確認します"""
+    storage = DocumentStorage()
+    report = storage.verify_contents()
+    for path in report['corrupted']:
+        click.echo(f"  [破損] {path}")
+    for name in report['modified']:
+        click.echo(f"  [保存後に変更] {name}")
+    if report['corrupted']:
+        click.echo("❌ 内容がハッシュと一致しない本文があります")
+        sys.exit(1)
+    click.echo("✅ 本文はすべてハッシュと一致しています")
+
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
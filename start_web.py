@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import os
 import socket
 import uvicorn
 from web_app import app
@@ -23,6 +24,10 @@ if __name__ == "__main__":
         print(f"   http://localhost:{port}")
         print(f"   http://127.0.0.1:{port}")
         print("🔄 サーバーを停止するには Ctrl+C を押してください")
-        uvicorn.run(app, host="127.0.0.1", port=port)
+        workers = int(os.getenv("WEB_WORKERS", "1"))
+        if workers > 1:
+            uvicorn.run("web_app:app", host="127.0.0.1", port=port, workers=workers)
+        else:
+            uvicorn.run(app, host="127.0.0.1", port=port)
     else:
         print("❌ 利用可能なポートが見つかりません")
\ No newline at end of file
@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from fastapi import FastAPI, Request, Form, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, Form, HTTPException, Query, Depends
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 import os
 import sys
-from typing import Dict, Any, Optional
-from pydantic import BaseModel
+import json
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Literal
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from datetime import datetime
 
@@ -20,14 +26,124 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from agent.document_agent import DocumentAgent
 from agent.document_storage import DocumentStorage
 from agent.contract_judge import ContractJudge
+from agent.job_queue import EvaluationJobQueue
+from agent.telemetry import get_exporter
+from agent.storage_watcher import watcher_from_env
+from agent.metrics import REGISTRY, HTTP_REQUESTS, HTTP_LATENCY
+
+# エージェントとストレージのインスタンスは初回利用時に作る
+# （import時・起動時にネットワークやディスクの走査を待たない）
+_services: Dict[str, Any] = {}
+_services_lock = threading.RLock()
+
+def _service(name: str, factory):
+    service = _services.get(name)
+    if service is None:
+        with _services_lock:
+            service = _services.get(name)
+            if service is None:
+                service = factory()
+                _services[name] = service
+    return service
+
+def get_agent() -> DocumentAgent:
+    try:
+        return _service("agent", DocumentAgent)
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def get_storage() -> DocumentStorage:
+    return _service("storage", DocumentStorage)
+
+def get_judge() -> ContractJudge:
+    return _service("judge", lambda: ContractJudge(storage=get_storage()))
+
+def get_evaluation_jobs() -> EvaluationJobQueue:
+    return _service("evaluation_jobs", lambda: EvaluationJobQueue(get_judge()))
+
+def start_storage_watcher():
+    """契約書ディレクトリの外部での変更をカタログに反映する監視を始める（STORAGE_WATCH=off で無効）"""
+    watcher = watcher_from_env(get_storage())
+    if watcher is not None:
+        watcher.start()
+        _services["storage_watcher"] = watcher
+
+def warm_up():
+    """保存済みテレメトリの再送と中断された評価ジョブの再開を始め、ストレージを準備する"""
+    for name, getter in (("telemetry", get_exporter), ("storage", get_storage),
+                         ("storage_watcher", start_storage_watcher), ("evaluation_jobs", get_evaluation_jobs)):
+        try:
+            getter()
+        except Exception as e:
+            print(f"⚠️ {name}の初期化に失敗しました: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 起動を待たせないよう、準備はバックグラウンドで行う
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    yield
+    await warm_up_task
+    watcher = _services.get("storage_watcher")
+    if watcher is not None:
+        await run_in_threadpool(watcher.stop)
+    # OpenAIクライアントの接続プールを閉じ、未送信のテレメトリを送り切る
+    agent = _services.get("agent")
+    if agent is not None:
+        await agent.aclose()
+    await run_in_threadpool(get_exporter().close)
 
 # FastAPIアプリケーション作成
 app = FastAPI(
     title="ドキュメント管理AI Agent",
     description="OpenAI Agent SDKとLangFuseを使った契約書生成・管理システム",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+class MetricsMiddleware:
+    """ルートごとのリクエスト数と処理時間を記録する（ストリーミングは本文の送信完了まで）
+
+    ラベルにはURLではなくルートのパターン（/api/contracts/{file_name} など）を使い、系列数を抑える。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # ルーティング後は scope にルートが入る（どのルートにも一致しなければ unmatched）
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(scope["method"], route, str(status["code"]))
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route)
+
+app.add_middleware(MetricsMiddleware)
+
+def _telemetry_stat(key: str):
+    return lambda: float(get_exporter().stats().get(key) or 0)
+
+def _index_lag():
+    watcher = _services.get("storage_watcher")
+    return watcher.stats()['index_lag_seconds'] if watcher is not None else None
+
+# 他のコンポーネントの統計は /metrics の出力時に読む
+REGISTRY.gauge_callback("telemetry_queued_events", "LangFuseへの送信待ちイベント数", _telemetry_stat("queued"))
+REGISTRY.gauge_callback("telemetry_dropped_events", "起動後に破棄したテレメトリイベント数", _telemetry_stat("dropped"))
+REGISTRY.gauge_callback("telemetry_offline", "LangFuseに接続できずスプールに保存中なら1", _telemetry_stat("offline"))
+REGISTRY.gauge_callback("storage_index_lag_seconds", "外部での契約書の変更がカタログに反映されるまでの遅れ", _index_lag)
+
 # テンプレートとスタティックファイルの設定
 templates = Jinja2Templates(directory="templates")
 
@@ -35,6 +151,16 @@ templates = Jinja2Templates(directory="templates")
 if os.path.exists("static"):
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# ページングの既定値
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def parse_fields(fields: Optional[str]) -> Optional[list]:
+    """fields=type,file_path,metadata.rent 形式の指定をリストにする"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
 # Pydanticモデル
 class RentalContractRequest(BaseModel):
     property_name: str
@@ -67,22 +193,24 @@ class SearchRequest(BaseModel):
     contract_type: Optional[str] = None
     date_from: Optional[str] = None
     date_to: Optional[str] = None
+    sort: Literal["relevance", "date"] = "date"
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+    cursor: Optional[str] = None
+    fields: Optional[str] = None
 
 class EvaluationRequest(BaseModel):
     file_name: str
+    force: bool = False  # True なら保存済みの評価を使わず再評価する
+    mode: Optional[Literal["single", "chunked", "auto"]] = None  # 省略時は JUDGE_EVALUATION_MODE
 
 class EvaluationResponse(BaseModel):
     success: bool
     message: str
     trace_id: Optional[str] = None
     evaluation: Optional[Dict[str, Any]] = None
+    cached: bool = False
     error: Optional[str] = None
 
-# エージェントとストレージのインスタンス
-agent = DocumentAgent()
-storage = DocumentStorage()
-judge = ContractJudge()
-
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """ホームページ"""
@@ -99,12 +227,21 @@ async def service_form(request: Request):
     return templates.TemplateResponse("service_form.html", {"request": request})
 
 @app.get("/contracts", response_class=HTMLResponse)
-async def contracts_list(request: Request):
+async def contracts_list(
+    request: Request,
+    cursor: Optional[str] = None,
+    storage: DocumentStorage = Depends(get_storage)
+):
     """契約書一覧ページ"""
-    contracts = storage.list_contracts()
+    try:
+        page = await run_in_threadpool(storage.list_contracts_page, limit=DEFAULT_PAGE_SIZE, cursor=cursor)
+    except ValueError:
+        page = await run_in_threadpool(storage.list_contracts_page, limit=DEFAULT_PAGE_SIZE)
     return templates.TemplateResponse("contracts_list.html", {
         "request": request, 
-        "contracts": contracts
+        "contracts": page["contracts"],
+        "next_cursor": page["next_cursor"],
+        "is_first_page": not cursor
     })
 
 @app.get("/search", response_class=HTMLResponse)
@@ -118,16 +255,25 @@ async def search_contracts_web(
     query: str = Form(None),
     contract_type: str = Form(None),
     date_from: str = Form(None),
-    date_to: str = Form(None)
+    date_to: str = Form(None),
+    sort: str = Form("date"),
+    cursor: str = Form(None),
+    storage: DocumentStorage = Depends(get_storage)
 ):
     """検索結果表示"""
     try:
-        contracts = storage.search_contracts(
+        page = await run_in_threadpool(
+            storage.search_contracts_page,
             query=query if query else None,
             contract_type=contract_type if contract_type != "all" else None,
             date_from=date_from if date_from else None,
-            date_to=date_to if date_to else None
+            date_to=date_to if date_to else None,
+            sort=sort if sort == "relevance" else "date",
+            snippets=bool(query),
+            limit=DEFAULT_PAGE_SIZE,
+            cursor=cursor if cursor else None
         )
+        contracts = page["contracts"]
         
         return templates.TemplateResponse("search_results.html", {
             "request": request,
@@ -136,6 +282,9 @@ async def search_contracts_web(
             "contract_type": contract_type,
             "date_from": date_from,
             "date_to": date_to,
+            "sort": sort,
+            "next_cursor": page["next_cursor"],
+            "is_first_page": not cursor,
             "total_count": len(contracts)
         })
         
@@ -151,16 +300,20 @@ async def search_contracts_web(
 # REST API エンドポイント
 
 @app.post("/api/rental", response_model=ContractResponse)
-async def create_rental_contract(contract_request: RentalContractRequest):
+async def create_rental_contract(
+    contract_request: RentalContractRequest,
+    agent: DocumentAgent = Depends(get_agent),
+    storage: DocumentStorage = Depends(get_storage)
+):
     """賃貸契約書生成API"""
     try:
         params = contract_request.dict()
         
         # 契約書生成
-        contract_content = agent.generate_rental_contract(params)
+        contract_content = await agent.agenerate_rental_contract(params)
         
         # ファイル保存
-        file_path = storage.save_contract('rental', contract_content, params)
+        file_path = await run_in_threadpool(storage.save_contract, 'rental', contract_content, params)
         
         return ContractResponse(
             success=True,
@@ -173,16 +326,20 @@ async def create_rental_contract(contract_request: RentalContractRequest):
         raise HTTPException(status_code=500, detail=f"契約書生成エラー: {str(e)}")
 
 @app.post("/api/service", response_model=ContractResponse)
-async def create_service_contract(contract_request: ServiceContractRequest):
+async def create_service_contract(
+    contract_request: ServiceContractRequest,
+    agent: DocumentAgent = Depends(get_agent),
+    storage: DocumentStorage = Depends(get_storage)
+):
     """業務委託契約書生成API"""
     try:
         params = contract_request.dict()
         
         # 契約書生成
-        contract_content = agent.generate_service_contract(params)
+        contract_content = await agent.agenerate_service_contract(params)
         
         # ファイル保存
-        file_path = storage.save_contract('service', contract_content, params)
+        file_path = await run_in_threadpool(storage.save_contract, 'service', contract_content, params)
         
         return ContractResponse(
             success=True,
@@ -194,70 +351,133 @@ async def create_service_contract(contract_request: ServiceContractRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"契約書生成エラー: {str(e)}")
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Server-Sent Events形式の1イベント"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_contract(contract_type: str, params: Dict[str, Any], agent: DocumentAgent,
+                    storage: DocumentStorage) -> StreamingResponse:
+    """契約書をトークン単位でSSE配信し、生成完了後に保存する"""
+    async def events():
+        # 最初のバイトをすぐに返し、接続が確立したことをクライアントに伝える
+        yield sse_event("start", {"contract_type": contract_type})
+        
+        chunks = []
+        try:
+            if contract_type == "rental":
+                tokens = await agent.agenerate_rental_contract(params, stream=True)
+            else:
+                tokens = await agent.agenerate_service_contract(params, stream=True)
+            
+            async for token in tokens:
+                chunks.append(token)
+                yield sse_event("token", {"text": token})
+            
+            file_path = await run_in_threadpool(storage.save_contract, contract_type, "".join(chunks), params)
+            yield sse_event("done", {"file_path": file_path})
+            
+        except Exception as e:
+            yield sse_event("error", {"message": f"契約書生成エラー: {str(e)}"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.post("/api/rental/stream")
+async def stream_rental_contract(
+    contract_request: RentalContractRequest,
+    agent: DocumentAgent = Depends(get_agent),
+    storage: DocumentStorage = Depends(get_storage)
+):
+    """賃貸契約書生成API（SSEストリーミング）"""
+    return stream_contract('rental', contract_request.dict(), agent, storage)
+
+@app.post("/api/service/stream")
+async def stream_service_contract(
+    contract_request: ServiceContractRequest,
+    agent: DocumentAgent = Depends(get_agent),
+    storage: DocumentStorage = Depends(get_storage)
+):
+    """業務委託契約書生成API（SSEストリーミング）"""
+    return stream_contract('service', contract_request.dict(), agent, storage)
+
 @app.get("/api/contracts")
-async def get_contracts(contract_type: Optional[str] = None):
-    """契約書一覧取得API"""
+async def get_contracts(
+    contract_type: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    storage: DocumentStorage = Depends(get_storage)
+):
+    """契約書一覧取得API（作成日時の降順、カーソルでページング）"""
     try:
-        contracts = storage.list_contracts(contract_type)
+        page = await run_in_threadpool(
+            storage.list_contracts_page, contract_type, limit=limit, cursor=cursor, fields=parse_fields(fields)
+        )
         return {
             "success": True,
-            "contracts": contracts,
-            "count": len(contracts)
+            "contracts": page["contracts"],
+            "count": len(page["contracts"]),
+            "next_cursor": page["next_cursor"]
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"契約書一覧取得エラー: {str(e)}")
 
 @app.get("/api/contracts/{file_name}")
-async def get_contract_content(file_name: str):
+async def get_contract_content(file_name: str, storage: DocumentStorage = Depends(get_storage)):
     """契約書内容取得API"""
     try:
-        # ファイルパスを構築
-        for contract_type in ['rental', 'service']:
-            file_path = f"contracts/{contract_type}/{file_name}"
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # メタデータも取得
-                metadata_path = f"{file_path}.metadata.json"
-                metadata = {}
-                if os.path.exists(metadata_path):
-                    import json
-                    with open(metadata_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                
-                return {
-                    "success": True,
-                    "content": content,
-                    "metadata": metadata
-                }
+        contract = await run_in_threadpool(storage.get_contract, file_name)
+        if contract is None:
+            raise HTTPException(status_code=404, detail="契約書が見つかりません")
         
-        raise HTTPException(status_code=404, detail="契約書が見つかりません")
+        content = await run_in_threadpool(storage.read_content, contract)
         
+        return {
+            "success": True,
+            "content": content,
+            "metadata": contract["metadata"]
+        }
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"契約書取得エラー: {str(e)}")
 
 @app.post("/api/search")
-async def search_contracts(search_request: SearchRequest):
+async def search_contracts(search_request: SearchRequest, storage: DocumentStorage = Depends(get_storage)):
     """契約書検索API"""
     try:
-        contracts = storage.search_contracts(
+        page = await run_in_threadpool(
+            storage.search_contracts_page,
             query=search_request.query,
             contract_type=search_request.contract_type,
             date_from=search_request.date_from,
-            date_to=search_request.date_to
+            date_to=search_request.date_to,
+            sort=search_request.sort,
+            snippets=bool(search_request.query),
+            limit=search_request.limit,
+            cursor=search_request.cursor,
+            fields=parse_fields(search_request.fields)
         )
         return {
             "success": True,
-            "contracts": contracts,
-            "count": len(contracts),
+            "contracts": page["contracts"],
+            "count": len(page["contracts"]),
+            "next_cursor": page["next_cursor"],
             "query": search_request.query,
+            "sort": search_request.sort,
             "filters": {
                 "contract_type": search_request.contract_type,
                 "date_from": search_request.date_from,
                 "date_to": search_request.date_to
             }
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"検索エラー: {str(e)}")
 
@@ -266,82 +486,87 @@ async def search_contracts_get(
     query: Optional[str] = None,
     contract_type: Optional[str] = None,
     date_from: Optional[str] = None,
-    date_to: Optional[str] = None
+    date_to: Optional[str] = None,
+    sort: Literal["relevance", "date"] = "date",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    storage: DocumentStorage = Depends(get_storage)
 ):
     """契約書検索API (GET版)"""
     try:
-        contracts = storage.search_contracts(
+        page = await run_in_threadpool(
+            storage.search_contracts_page,
             query=query,
             contract_type=contract_type,
             date_from=date_from,
-            date_to=date_to
+            date_to=date_to,
+            sort=sort,
+            snippets=bool(query),
+            limit=limit,
+            cursor=cursor,
+            fields=parse_fields(fields)
         )
         return {
             "success": True,
-            "contracts": contracts,
-            "count": len(contracts),
+            "contracts": page["contracts"],
+            "count": len(page["contracts"]),
+            "next_cursor": page["next_cursor"],
             "query": query,
+            "sort": sort,
             "filters": {
                 "contract_type": contract_type,
                 "date_from": date_from,
                 "date_to": date_to
             }
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"検索エラー: {str(e)}")
 
 @app.post("/api/evaluate", response_model=EvaluationResponse)
-async def evaluate_contract(evaluation_request: EvaluationRequest):
+async def evaluate_contract(
+    evaluation_request: EvaluationRequest,
+    storage: DocumentStorage = Depends(get_storage),
+    judge: ContractJudge = Depends(get_judge)
+):
     """契約書品質評価API"""
     try:
-        # ファイルを探して読み込み
+        # ファイル名で契約書を探して読み込み
         file_name = evaluation_request.file_name
         contract_content = None
         metadata = {}
         contract_type = None
         
-        # 利用可能な契約書から正確なパスを見つける
-        found_contract = None
-        all_contracts = storage.list_contracts()
-        
-        for contract in all_contracts:
-            contract_file_name = contract["file_path"].split('/')[-1]
-            if contract_file_name == file_name:
-                found_contract = contract
-                break
+        found_contract = await run_in_threadpool(storage.get_contract, file_name)
         
         if found_contract:
-            file_path = found_contract["file_path"]
             contract_type = found_contract["type"]
+            metadata = found_contract["metadata"]
             
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    contract_content = f.read()
-                
-                # メタデータを読み込み
-                metadata_path = f"{file_path}.metadata.json"
-                if os.path.exists(metadata_path):
-                    import json
-                    with open(metadata_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                else:
-                    metadata = found_contract.get("metadata", {})
-                    
+                contract_content = await run_in_threadpool(storage.read_content, found_contract)
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"ファイル読み込みエラー: {str(e)}")
         
         if not contract_content:
             raise HTTPException(status_code=404, detail="契約書が見つかりません")
         
-        # LLM-as-a-Judgeで評価実行
-        result = judge.evaluate_contract_quality(contract_content, contract_type, metadata)
+        # LLM-as-a-Judgeで評価実行（OpenAI呼び出しと長文の分割評価の待ち合わせでイベントループを塞がない）
+        result = await run_in_threadpool(
+            judge.evaluate_contract_quality,
+            contract_content, contract_type, metadata, force=evaluation_request.force,
+            mode=evaluation_request.mode
+        )
         
         if result["success"]:
             return EvaluationResponse(
                 success=True,
-                message="契約書の品質評価が完了しました",
+                message="保存済みの評価結果を返しました" if result.get("cached") else "契約書の品質評価が完了しました",
                 trace_id=result["trace_id"],
-                evaluation=result["evaluation"]
+                evaluation=result["evaluation"],
+                cached=result.get("cached", False)
             )
         else:
             return EvaluationResponse(
@@ -351,30 +576,63 @@ async def evaluate_contract(evaluation_request: EvaluationRequest):
                 trace_id=result.get("trace_id")
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"評価エラー: {str(e)}")
 
 @app.post("/api/batch-evaluate")
-async def batch_evaluate_contracts(contract_type: Optional[str] = None):
-    """一括評価API"""
+async def batch_evaluate_contracts(
+    contract_type: Optional[str] = None,
+    max_concurrency: Optional[int] = Query(None, ge=1, le=32),
+    force: bool = False,
+    prescreen: bool = False,
+    storage: DocumentStorage = Depends(get_storage),
+    evaluation_jobs: EvaluationJobQueue = Depends(get_evaluation_jobs)
+):
+    """一括評価API（ジョブを登録してすぐに返す。進捗は /api/jobs/{job_id} で確認）
+
+    内容が変わっていない契約書は保存済みの評価を使う（force=true で全件再評価）。
+    prescreen=true なら先にルールで条項・金額の記載を確認し、境界上の契約書だけをAIで評価する。
+    """
     try:
         # 契約書一覧を取得
-        contracts = storage.list_contracts(contract_type)
+        contracts = await run_in_threadpool(storage.list_contracts, contract_type)
         file_paths = [contract["file_path"] for contract in contracts]
         
-        # 一括評価実行
-        results = judge.batch_evaluate_contracts(file_paths)
+        # バックグラウンドで一括評価を実行
+        job_id = await run_in_threadpool(
+            evaluation_jobs.submit, file_paths, contract_type, max_concurrency, force=force, prescreen=prescreen
+        )
         
         return {
             "success": True,
-            "message": f"{len(results)}件の契約書評価が完了しました",
-            "evaluations": results,
-            "total_count": len(results)
+            "message": f"{len(file_paths)}件の契約書評価を開始しました",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}",
+            "total_count": len(file_paths)
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"一括評価エラー: {str(e)}")
 
+@app.get("/api/jobs")
+async def list_jobs(evaluation_jobs: EvaluationJobQueue = Depends(get_evaluation_jobs)):
+    """評価ジョブ一覧API"""
+    return {"success": True, "jobs": await run_in_threadpool(evaluation_jobs.list_jobs)}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    include_results: bool = True,
+    evaluation_jobs: EvaluationJobQueue = Depends(get_evaluation_jobs)
+):
+    """評価ジョブの進捗・途中結果取得API"""
+    job = await run_in_threadpool(evaluation_jobs.get, job_id, include_results=include_results)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return {"success": True, "job": job}
+
 # Web フォーム処理エンドポイント
 
 @app.post("/rental", response_class=HTMLResponse)
@@ -387,7 +645,9 @@ async def create_rental_web(
     key_money: str = Form(...),
     period: str = Form("2年"),
     landlord_name: str = Form(...),
-    tenant_name: str = Form(...)
+    tenant_name: str = Form(...),
+    agent: DocumentAgent = Depends(get_agent),
+    storage: DocumentStorage = Depends(get_storage)
 ):
     """Webフォームからの賃貸契約書生成"""
     try:
@@ -402,8 +662,8 @@ async def create_rental_web(
             'tenant_name': tenant_name
         }
         
-        contract_content = agent.generate_rental_contract(params)
-        file_path = storage.save_contract('rental', contract_content, params)
+        contract_content = await agent.agenerate_rental_contract(params)
+        file_path = await run_in_threadpool(storage.save_contract, 'rental', contract_content, params)
         
         return templates.TemplateResponse("contract_result.html", {
             "request": request,
@@ -429,7 +689,9 @@ async def create_service_web(
     payment_terms: str = Form("月末締め翌月末支払い"),
     client_company: str = Form(...),
     client_representative: str = Form(...),
-    contractor_name: str = Form(...)
+    contractor_name: str = Form(...),
+    agent: DocumentAgent = Depends(get_agent),
+    storage: DocumentStorage = Depends(get_storage)
 ):
     """Webフォームからの業務委託契約書生成"""
     try:
@@ -443,8 +705,8 @@ async def create_service_web(
             'contractor_name': contractor_name
         }
         
-        contract_content = agent.generate_service_contract(params)
-        file_path = storage.save_contract('service', contract_content, params)
+        contract_content = await agent.agenerate_service_contract(params)
+        file_path = await run_in_threadpool(storage.save_contract, 'service', contract_content, params)
         
         return templates.TemplateResponse("contract_result.html", {
             "request": request,
@@ -462,10 +724,14 @@ async def create_service_web(
         })
 
 @app.get("/evaluate", response_class=HTMLResponse)
-async def evaluation_page(request: Request, file: Optional[str] = None):
+async def evaluation_page(
+    request: Request,
+    file: Optional[str] = None,
+    storage: DocumentStorage = Depends(get_storage)
+):
     """評価ページ"""
     try:
-        contracts = storage.list_contracts()
+        contracts = await run_in_threadpool(storage.list_contracts)
         return templates.TemplateResponse("evaluation.html", {
             "request": request,
             "contracts": contracts,
@@ -481,19 +747,23 @@ async def evaluation_page(request: Request, file: Optional[str] = None):
 @app.post("/evaluate", response_class=HTMLResponse)
 async def evaluate_contract_web(
     request: Request,
-    file_name: str = Form(...)
+    file_name: str = Form(...),
+    force: bool = Form(False),
+    storage: DocumentStorage = Depends(get_storage),
+    judge: ContractJudge = Depends(get_judge)
 ):
     """契約書評価実行"""
     try:
         # APIを呼び出し
-        eval_request = EvaluationRequest(file_name=file_name)
-        result = await evaluate_contract(eval_request)
+        eval_request = EvaluationRequest(file_name=file_name, force=force)
+        result = await evaluate_contract(eval_request, storage, judge)
         
         return templates.TemplateResponse("evaluation_result.html", {
             "request": request,
             "success": result.success,
             "evaluation": result.evaluation,
             "trace_id": result.trace_id,
+            "cached": result.cached,
             "file_name": file_name,
             "error": result.error
         })
@@ -507,47 +777,36 @@ async def evaluate_contract_web(
         })
 
 @app.get("/api/test/evaluate/{file_name}")
-async def test_evaluate(file_name: str):
+async def test_evaluate(file_name: str, storage: DocumentStorage = Depends(get_storage)):
     """テスト用評価API"""
     try:
         print(f"Test API: Looking for file: '{file_name}'")
         
-        # 単純にファイル存在確認
-        all_contracts = storage.list_contracts()
-        print(f"Test API: Found {len(all_contracts)} contracts")
-        
-        found = None
-        for i, contract in enumerate(all_contracts):
-            contract_file_name = contract["file_path"].split('/')[-1]
-            print(f"Test API: Contract {i}: '{contract_file_name}' == '{file_name}' ? {contract_file_name == file_name}")
-            if contract_file_name == file_name:
-                found = contract
-                break
+        found = await run_in_threadpool(storage.get_contract, file_name)
         
         if not found:
             return {
                 "success": False,
                 "error": f"File not found: {file_name}",
-                "available_files": [c["file_path"].split('/')[-1] for c in all_contracts[:5]],
-                "search_term": file_name,
-                "exact_matches": [c["file_path"].split('/')[-1] for c in all_contracts if c["file_path"].split('/')[-1] == file_name]
+                "search_term": file_name
             }
         
         return {
             "success": True,
             "found_file": found["file_path"],
             "type": found["type"],
-            "exists": os.path.exists(found["file_path"])
+            "archived": found.get("archived", False),
+            "exists": found.get("archived", False) or os.path.exists(found["file_path"])
         }
     except Exception as e:
         import traceback
         return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
 
 @app.get("/api/debug/contracts")
-async def debug_contracts():
+async def debug_contracts(storage: DocumentStorage = Depends(get_storage)):
     """デバッグ用契約書一覧API"""
     try:
-        contracts = storage.list_contracts()
+        contracts = await run_in_threadpool(storage.list_contracts)
         return {
             "success": True,
             "contracts": [
@@ -555,7 +814,8 @@ async def debug_contracts():
                     "file_name": contract["file_path"].split('/')[-1],
                     "full_path": contract["file_path"],
                     "type": contract["type"],
-                    "exists": os.path.exists(contract["file_path"])
+                    "archived": contract.get("archived", False),
+                    "exists": contract.get("archived", False) or os.path.exists(contract["file_path"])
                 }
                 for contract in contracts
             ]
@@ -563,10 +823,28 @@ async def debug_contracts():
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus形式のメトリクス（ルート別のリクエスト数・処理時間、段階別の処理時間、トークン使用量）
+
+    値はワーカープロセスごとに集計する。
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health_check():
     """ヘルスチェック"""
-    return {"status": "healthy", "message": "ドキュメント管理AI Agent is running"}
+    health = {"status": "healthy", "message": "ドキュメント管理AI Agent is running"}
+    # ヘルスチェックのためにエージェントを作ることはしない
+    agent = _services.get("agent")
+    if agent is not None and agent.cache is not None:
+        health["generation_cache"] = agent.cache.stats()
+    health["telemetry"] = get_exporter().stats()
+    watcher = _services.get("storage_watcher")
+    if watcher is not None:
+        # 外部で追加・変更された契約書がカタログに反映されるまでの遅れ
+        health["storage_index"] = watcher.stats()
+    return health
 
 if __name__ == "__main__":
     import uvicorn
@@ -583,14 +861,23 @@ if __name__ == "__main__":
                 continue
         return None
     
+    # WEB_WORKERS=2 以上で複数プロセス起動（保存・カタログ・評価ジョブはプロセス間で共有される）
+    workers = int(os.getenv("WEB_WORKERS", "1"))
+    
     port = find_free_port()
     if port:
         print("🌐 Webサーバーを起動しています...")
         print("📍 アクセスURL:")
         print(f"   http://localhost:{port}")
         print(f"   http://127.0.0.1:{port}")
+        if workers > 1:
+            print(f"👥 ワーカープロセス数: {workers}")
         print("🔄 サーバーを停止するには Ctrl+C を押してください")
-        uvicorn.run(app, host="127.0.0.1", port=port)
+        if workers > 1:
+            # 複数ワーカーではアプリをインポート文字列で渡す必要がある
+            uvicorn.run("web_app:app", host="127.0.0.1", port=port, workers=workers)
+        else:
+            uvicorn.run(app, host="127.0.0.1", port=port)
     else:
         print("❌ 利用可能なポートが見つかりません")
         print("💡 他のアプリケーションを終了してから再試行してください")
\ No newline at end of file